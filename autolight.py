@@ -1,91 +1,113 @@
-import requests
-import subprocess
-import time
+"""自动亮度调节（无界面版）
+
+与托盘版使用同一个 BrightnessController 和同一份配置文件，不加载 tkinter / pystray，
+适合 Linux 或信息亭等不需要图形界面的机器长期运行。
+
+用法:
+    python autolight.py                                   # 使用 ~/AutoDisplayLight_config.json
+    python autolight.py -c /etc/autolight.json
+    python autolight.py --backend sysfs --sensor-url http://temt6000-sensor.local/sensor/temt6000_percentage
+
+Ctrl+C / SIGTERM 停止；配置文件被修改后自动生效，SIGHUP 立即重新读取（Linux）。
+"""
+import argparse
+import logging
+import signal
 import sys
+import threading
+from pathlib import Path
+
+from autolight_tray import CONFIG_FILE, LOG_FILE, BrightnessController, ConfigManager, ConfigWatcher, setup_logging
+
+log = logging.getLogger("autolight")
+
+# 检查配置文件是否被修改的间隔（秒）
+CONFIG_WATCH_INTERVAL = 2.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="自动亮度调节（无界面版）")
+    parser.add_argument('-c', '--config', default=str(CONFIG_FILE), help="配置文件（JSON），默认与托盘版相同")
+    # 以下参数覆盖配置文件中的同名项
+    parser.add_argument('--sensor-url', dest='sensor_url', help="传感器地址")
+    parser.add_argument('--source', dest='sensor_source', choices=['http', 'udp', 'sse', 'relay'], help="数据来源")
+    parser.add_argument('--udp-port', dest='udp_port', type=int, help="UDP 广播端口")
+    parser.add_argument('--backend', choices=['twinkle_tray', 'sysfs', 'ddcutil'], help="亮度后端")
+    parser.add_argument('--tt-path', dest='tt_path', help="Twinkle Tray 路径")
+    parser.add_argument('--interval', type=float, help="轮询间隔（秒）")
+    parser.add_argument('--min', dest='min_brightness', type=int, help="最低亮度 (%%)")
+    parser.add_argument('--max', dest='max_brightness', type=int, help="最高亮度 (%%)")
+    parser.add_argument('--threshold', type=float, help="灵敏度阈值 (%%)")
+    parser.add_argument('--no-smooth', dest='smooth_transition', action='store_false', default=None,
+                        help="关闭平滑过渡")
+    parser.add_argument('--relay', dest='relay_enabled', action='store_true', default=None,
+                        help="作为局域网中继转发传感器读数")
+    parser.add_argument('--metrics-port', dest='metrics_port', type=int, help="启用本机指标端点")
+    parser.add_argument('--no-history', dest='history_enabled', action='store_false', default=None,
+                        help="不记录历史")
+    parser.add_argument('-q', '--quiet', action='store_true', help="只输出警告和错误")
+    return parser.parse_args()
+
+
+def load_config(args, config=None):
+    """读取配置文件（或使用已读取的 config）并叠加命令行参数"""
+    if config is None:
+        config = ConfigManager.load(args.config)
+    overrides = {key: value for key, value in vars(args).items()
+                 if key not in ('config', 'quiet') and value is not None}
+    if 'metrics_port' in overrides:
+        overrides['metrics_enabled'] = True
+    # 命令行启动即表示要运行，忽略托盘版的“启用”开关
+    return {**config, **overrides, 'enabled': True}
 
-# ================= 配置区域 =================
-
-# 传感器地址
-SENSOR_URL = "http://temt6000-sensor.local/sensor/temt6000_percentage"
-
-# Twinkle Tray 的安装路径 (请根据实际情况修改)
-# 如果是默认安装，通常是这个:
-TT_PATH = r"C:\Users\13963\AppData\Local\Programs\twinkle-tray\Twinkle Tray.exe"
-
-# 刷新间隔 (秒)
-INTERVAL = 5
-
-# 屏幕亮度限制
-# MIN_BRIGHTNESS: 哪怕传感器是 0%，屏幕最低也保持在这个亮度，防止黑屏
-MIN_BRIGHTNESS = 10 
-MAX_BRIGHTNESS = 100
-
-# 灵敏度阈值：只有变化超过这个值才调节，避免屏幕忽明忽暗
-THRESHOLD = 3 
-
-# ===========================================
-
-def get_sensor_value():
-    """解析 ESPHome JSON 数据"""
-    try:
-        response = requests.get(SENSOR_URL, timeout=3)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        # 针对你的数据格式 {"id":..., "value":0.836364, ...}
-        if 'value' in data:
-            val = float(data['value'])
-            print(f"当前环境亮度: {val:.2f}%") # 打印出来方便调试
-            return val
-            
-    except Exception as e:
-        print(f"获取数据失败: {e}")
-        return None
-    
-    return None
-
-def set_screen_brightness(level):
-    """调用 Twinkle Tray"""
-    # 限制范围：确保数值在 10 - 100 之间
-    safe_level = max(MIN_BRIGHTNESS, min(MAX_BRIGHTNESS, level))
-    safe_level = int(safe_level)
-
-    # 这里的 --Set=XX 会同步调节所有连接的显示器
-    cmd = [TT_PATH,"--All", f"--Set={safe_level}"]
-    
-    try:
-        # 隐藏 CMD 黑框
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        
-        subprocess.run(cmd, startupinfo=startupinfo)
-        print(f"-> 执行调节: 屏幕已设为 {safe_level}%")
-    except FileNotFoundError:
-        print(f"错误: 找不到文件 {TT_PATH}")
 
 def main():
-    print("--- 自动亮度脚本运行中 (按 Ctrl+C 停止) ---")
-    last_brightness = -1
-
-    while True:
-        sensor_val = get_sensor_value()
-
-        if sensor_val is not None:
-            # 逻辑：直接把环境亮度的百分比给屏幕
-            # 例如环境 0.8%，屏幕会触发 MIN_BRIGHTNESS (10%)
-            # 例如环境 50%，屏幕设为 50%
-            target_brightness = sensor_val
-
-            # 防抖动判断
-            if abs(target_brightness - last_brightness) > THRESHOLD:
-                set_screen_brightness(target_brightness)
-                last_brightness = target_brightness
-            else:
-                # 变化太小，不调节
-                pass
-        
-        time.sleep(INTERVAL)
+    args = parse_args()
+    # 日志文件放在配置文件所在目录；打包成无控制台程序时只有文件可写
+    setup_logging(logging.WARNING if args.quiet else logging.INFO,
+                  Path(args.config).expanduser().parent / LOG_FILE.name)
+
+    controller = BrightnessController(load_config(args))
+    last_status = [None]
+
+    def log_status(message):
+        # 状态行可能多行，合并为一行输出；相同内容不重复输出
+        line = " | ".join(part for part in message.splitlines() if part)
+        if line != last_status[0]:
+            last_status[0] = line
+            log.info(line)
+    controller.set_status_callback(log_status)
+
+    stop = threading.Event()
+
+    def handle_stop(signum, frame):
+        log.info("收到信号 %s，正在停止", signal.Signals(signum).name)
+        stop.set()
+
+    def handle_reload(signum, frame):
+        log.info("重新读取配置 %s", args.config)
+        controller.reload_config(load_config(args))
+
+    signal.signal(signal.SIGINT, handle_stop)
+    signal.signal(signal.SIGTERM, handle_stop)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, handle_reload)
+
+    watcher = ConfigWatcher(args.config)
+    controller.start()
+    # 定时醒来检查配置文件；Windows 下无超时的等待也无法被 Ctrl+C 打断
+    while not stop.wait(CONFIG_WATCH_INTERVAL):
+        try:
+            config = watcher.poll()
+        except Exception as e:
+            log.warning("配置文件有误，沿用当前配置: %s", e)
+            continue
+        if config is not None:
+            log.info("配置文件已修改，重新载入")
+            controller.reload_config(load_config(args, config))
+    controller.stop()
+    return 0
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -11,7 +11,8 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # 无界面版不需要图形界面相关的库
+    excludes=['tkinter', 'pystray', 'PIL'],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
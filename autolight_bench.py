@@ -0,0 +1,435 @@
+"""控制循环离线基准测试
+
+无需 ESP32 和 Windows：
+- 在子进程中启动模拟的 ESPHome 设备，按脚本波形提供 /sensor/temt6000_percentage、
+  /events 事件流和 UDP 广播，可设置响应延迟和失败率
+- 用记录调用时间的桩程序代替 Twinkle Tray
+- 驱动 BrightnessController 运行各个场景，输出 JSON 结果
+- --startup 测量冷启动：导入耗时，以及从启动程序到第一次设置亮度的耗时
+
+用法:
+    python autolight_bench.py                          # 运行全部场景
+    python autolight_bench.py -s http_step -d 20       # 只运行一个场景，每个 20 秒
+    python autolight_bench.py -o result.json --baseline base.json
+                                                       # 与基线比较，变慢时退出码为 1
+    python autolight_bench.py --startup                # 只测量启动耗时
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 场景：sensor 为模拟设备的参数，config 覆盖控制器配置
+SCENARIOS = {
+    'http_steady': {
+        'description': "HTTP 轮询，读数稳定（空闲开销）",
+        'sensor': {'waveform': 'constant', 'level': 50, 'latency': 0.005},
+        'config': {'sensor_source': 'http'},
+    },
+    'http_step': {
+        'description': "HTTP 轮询，读数在第 3 秒从 20% 跳到 80%",
+        'sensor': {'waveform': 'step', 'low': 20, 'high': 80, 'at': 3, 'latency': 0.02},
+        'config': {'sensor_source': 'http', 'interval_max': 5},
+    },
+    'http_flaky': {
+        'description': "HTTP 轮询，正弦波读数，50ms 延迟，20% 请求失败",
+        'sensor': {'waveform': 'sine', 'level': 50, 'amplitude': 30, 'period': 6,
+                   'latency': 0.05, 'failure_rate': 0.2},
+        'config': {'sensor_source': 'http', 'interval_max': 2},
+    },
+    'sse_step': {
+        'description': "SSE 事件流，每 0.5 秒推送，第 3 秒阶跃",
+        'sensor': {'waveform': 'step', 'low': 20, 'high': 80, 'at': 3, 'push_interval': 0.5},
+        'config': {'sensor_source': 'sse'},
+    },
+    'udp_step': {
+        'description': "UDP 广播，每 0.1 秒一包，第 3 秒阶跃",
+        'sensor': {'waveform': 'step', 'low': 20, 'high': 80, 'at': 3, 'push_interval': 0.1},
+        'config': {'sensor_source': 'udp'},
+    },
+}
+
+# 与基线比较时，绝对值小于此值的差异不算变慢（秒）
+ABSOLUTE_SLACK = 0.05
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STUB_SOURCE = '''import os, sys, time
+with open(os.environ["AUTOLIGHT_STUB_LOG"], "a") as f:
+    f.write("%.6f %s\\n" % (time.time(), " ".join(sys.argv[1:])))
+'''
+
+
+def waveform_value(sensor, t):
+    """模拟传感器在第 t 秒的读数 (0-100)"""
+    kind = sensor.get('waveform', 'constant')
+    if kind == 'step':
+        value = sensor['low'] if t < sensor['at'] else sensor['high']
+    elif kind == 'sine':
+        value = sensor['level'] + sensor['amplitude'] * math.sin(2 * math.pi * t / sensor['period'])
+    else:
+        value = sensor.get('level', 50)
+    return round(max(0.0, min(100.0, value)), 1)
+
+
+def state_json(sensor, t):
+    """ESPHome 实体状态 JSON"""
+    value = waveform_value(sensor, t)
+    return json.dumps({"id": "sensor-temt6000_percentage", "value": value, "state": f"{value:.1f} %"})
+
+
+def run_fake_esphome(sensor, t0, udp_port, ready_queue, stop_event):
+    """模拟的 ESPHome 设备（在子进程中运行，不计入控制器的 CPU 时间）"""
+    requests_seen = [0]
+    lock = threading.Lock()
+    push_interval = sensor.get('push_interval', 0.5)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == '/events':
+                self.send_events()
+                return
+            time.sleep(sensor.get('latency', 0))
+            if not self.path.startswith('/sensor/') or self.should_fail():
+                self.send_error(503 if self.path.startswith('/sensor/') else 404)
+                return
+            body = state_json(sensor, time.time() - t0).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def should_fail(self):
+            """按 failure_rate 均匀地让部分请求失败，每次运行结果相同"""
+            rate = sensor.get('failure_rate', 0)
+            with lock:
+                n = requests_seen[0]
+                requests_seen[0] += 1
+            return int((n + 1) * rate) != int(n * rate)
+
+        def send_events(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            try:
+                while not stop_event.is_set():
+                    data = state_json(sensor, time.time() - t0)
+                    self.wfile.write(f"event: state\ndata: {data}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(push_interval)
+            except OSError:
+                pass
+            self.close_connection = True
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    ready_queue.put(server.server_address[1])
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    seq = 0
+    while not stop_event.wait(push_interval):
+        t = time.time() - t0
+        packet = {"device": "temt6000", "percentage": waveform_value(sensor, t), "seq": seq}
+        sock.sendto(json.dumps(packet).encode(), ('127.0.0.1', udp_port))
+        seq += 1
+    server.shutdown()
+
+
+def free_udp_port():
+    """找一个空闲的 UDP 端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def read_invocations(path):
+    """读取桩程序记录的调用，返回 [(时间, 参数)]"""
+    if not os.path.exists(path):
+        return []
+    calls = []
+    with open(path) as f:
+        for line in f:
+            stamp, _, args = line.strip().partition(' ')
+            calls.append((float(stamp), args))
+    return calls
+
+
+def write_stub(workdir):
+    """写出桩程序脚本，返回路径"""
+    stub_path = os.path.join(workdir, "stub_backend.py")
+    with open(stub_path, 'w') as f:
+        f.write(STUB_SOURCE)
+    return stub_path
+
+
+def write_stub_executable(workdir):
+    """写出可直接执行的桩程序（代替 Twinkle Tray.exe 写入配置文件）"""
+    stub_path = write_stub(workdir)
+    if os.name == 'nt':
+        path = os.path.join(workdir, "stub_backend.cmd")
+        with open(path, 'w') as f:
+            f.write(f'@"{sys.executable}" "{stub_path}" %*\n')
+    else:
+        path = os.path.join(workdir, "stub_backend")
+        with open(path, 'w') as f:
+            f.write(f"#!{sys.executable}\n{STUB_SOURCE}")
+        os.chmod(path, 0o755)
+    return path
+
+
+def start_fake_esphome(sensor, t0):
+    """在子进程中启动模拟设备，返回 (进程, 停止事件, HTTP 端口, UDP 端口)"""
+    udp_port = free_udp_port()
+    ready_queue = multiprocessing.Queue()
+    stop_event = multiprocessing.Event()
+    server = multiprocessing.Process(target=run_fake_esphome,
+                                     args=(sensor, t0, udp_port, ready_queue, stop_event), daemon=True)
+    server.start()
+    return server, stop_event, ready_queue.get(timeout=10), udp_port
+
+
+def run_scenario(name, scenario, duration, base_config, workdir):
+    """运行一个场景并返回结果"""
+    import autolight_tray as app
+
+    class StubBackend(app.TwinkleTrayBackend):
+        """以当前解释器运行桩程序，参数与 Twinkle Tray 相同"""
+
+        name = "stub"
+
+        def _set_args(self, level, display):
+            return [sys.executable, self.tt_path, *super()._set_args(level, display)[1:]]
+
+    stub_path = write_stub(workdir)
+    log_path = os.path.join(workdir, f"{name}.log")
+    os.environ['AUTOLIGHT_STUB_LOG'] = log_path
+
+    sensor = scenario['sensor']
+    t0 = time.time() + 1.0
+    server, stop_event, http_port, udp_port = start_fake_esphome(sensor, t0)
+
+    config = {**base_config, **scenario['config'],
+              'sensor_url': f"http://127.0.0.1:{http_port}/sensor/temt6000_percentage",
+              'udp_port': udp_port, 'tt_path': stub_path, 'enabled': True,
+              'sensors': [], 'monitors': [], 'metrics_enabled': False, 'history_enabled': False}
+    controller = app.BrightnessController(config)
+    controller.backend = StubBackend(stub_path)
+    statuses = []
+    controller.set_status_callback(statuses.append)
+
+    time.sleep(max(0.0, t0 - time.time()))
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    controller.start()
+    time.sleep(duration)
+    controller.stop()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    stop_event.set()
+    server.join(timeout=5)
+    time.sleep(0.2)  # 等待最后一次桩程序写完日志
+
+    metrics = controller.metrics
+    calls = read_invocations(log_path)
+    adjustments = metrics.value('adjustments')
+    samples = adjustments + metrics.value('adjustments_skipped')
+    reaction = None
+    if sensor.get('waveform') == 'step':
+        step_time = t0 + sensor['at']
+        after = [stamp for stamp, _ in calls if stamp >= step_time]
+        if after:
+            reaction = round(after[0] - step_time, 4)
+
+    return {
+        'name': name,
+        'description': scenario['description'],
+        'duration': round(wall, 3),
+        'samples': samples,
+        'throughput': round(samples / wall, 3),
+        'adjustments': adjustments,
+        'spawns': len(calls),
+        'spawns_per_ramp': round(len(calls) / adjustments, 2) if adjustments else None,
+        'reaction_latency': reaction,
+        'reaction_p50': metrics.quantile('reaction', 0.5),
+        'reaction_p95': metrics.quantile('reaction', 0.95),
+        'sensor_read_p95': metrics.quantile('sensor_read', 0.95),
+        'backend_apply_p95': metrics.quantile('backend_apply', 0.95),
+        'sensor_errors': metrics.value('sensor_errors'),
+        'apply_errors': metrics.value('apply_errors'),
+        'cpu_seconds': round(cpu, 4),
+        'cpu_percent': round(100 * cpu / wall, 2),
+        'last_status': statuses[-1] if statuses else "",
+    }
+
+
+def measure_import(runs):
+    """在新的解释器中导入 autolight_tray，返回每次的耗时（秒）"""
+    code = "import time; t = time.perf_counter(); import autolight_tray; print(time.perf_counter() - t)"
+    times = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR,
+                                capture_output=True, text=True, check=True)
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+    return times
+
+
+def measure_first_adjustment(runs, workdir, timeout=30):
+    """启动完整的托盘程序，返回每次从启动进程到第一次设置亮度的耗时（秒）
+    
+    所有运行共用一个临时用户目录：第一次运行时托盘图标缓存尚不存在（冷启动），
+    之后的运行使用缓存。
+    """
+    stub = write_stub_executable(workdir)
+    home = os.path.join(workdir, "home")
+    os.makedirs(home, exist_ok=True)
+    server, stop_event, http_port, _ = start_fake_esphome({'waveform': 'constant', 'level': 50}, time.time())
+    with open(os.path.join(home, "AutoDisplayLight_config.json"), 'w', encoding='utf-8') as f:
+        json.dump({'sensor_url': f"http://127.0.0.1:{http_port}/sensor/temt6000_percentage",
+                   'tt_path': stub, 'enabled': True, 'start_minimized': True}, f)
+
+    times = []
+    try:
+        for i in range(runs):
+            log_path = os.path.join(workdir, f"startup{i}.log")
+            env = {**os.environ, 'HOME': home, 'USERPROFILE': home, 'AUTOLIGHT_STUB_LOG': log_path}
+            started = time.time()
+            proc = subprocess.Popen([sys.executable, os.path.join(APP_DIR, "autolight_tray.py")],
+                                    cwd=APP_DIR, env=env,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            first = None
+            while first is None and time.time() - started < timeout and proc.poll() is None:
+                calls = read_invocations(log_path)
+                if calls:
+                    first = calls[0][0] - started
+                else:
+                    time.sleep(0.01)
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            times.append(first)
+    finally:
+        stop_event.set()
+        server.join(timeout=5)
+    return times
+
+
+def run_startup(runs, workdir):
+    """冷启动基准，返回结果（毫秒）"""
+    imports = measure_import(runs)
+    adjustments = measure_first_adjustment(runs, workdir)
+    warm = [t for t in adjustments[1:] if t is not None]
+    return {
+        'runs': runs,
+        'import_ms': round(statistics.median(imports) * 1000, 1),
+        'first_adjust_cold_ms': None if adjustments[0] is None else round(adjustments[0] * 1000, 1),
+        'first_adjust_ms': round(statistics.median(warm) * 1000, 1) if warm else None,
+        'first_adjust_failures': adjustments.count(None),
+    }
+
+
+def compare(report, baseline, tolerance):
+    """与基线比较，返回变慢项的描述列表"""
+    failures = []
+    startup, old_startup = report.get('startup'), baseline.get('startup')
+    if startup and old_startup:
+        for key in ('import_ms', 'first_adjust_ms'):
+            if startup.get(key) is None or old_startup.get(key) is None:
+                continue
+            if startup[key] > old_startup[key] * (1 + tolerance) + ABSOLUTE_SLACK * 1000:
+                failures.append(f"启动: {key} {startup[key]} > 基线 {old_startup[key]}")
+
+    base = {r['name']: r for r in baseline.get('scenarios', [])}
+    for result in report.get('scenarios', []):
+        old = base.get(result['name'])
+        if not old:
+            continue
+        if old['throughput'] and result['throughput'] < old['throughput'] * (1 - tolerance):
+            failures.append(f"{result['name']}: 吞吐量 {result['throughput']} < 基线 {old['throughput']}")
+        for key in ('reaction_latency', 'cpu_seconds'):
+            if result.get(key) is None or old.get(key) is None:
+                continue
+            if result[key] > old[key] * (1 + tolerance) + ABSOLUTE_SLACK:
+                failures.append(f"{result['name']}: {key} {result[key]} > 基线 {old[key]}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="自动亮度控制循环离线基准测试")
+    parser.add_argument('-s', '--scenario', action='append', choices=sorted(SCENARIOS),
+                        help="只运行指定场景（可重复）")
+    parser.add_argument('-d', '--duration', type=float, default=10, help="每个场景运行秒数")
+    parser.add_argument('-c', '--config', help="在默认配置上叠加的配置文件（JSON）")
+    parser.add_argument('-o', '--output', help="结果写入文件，默认输出到标准输出")
+    parser.add_argument('--baseline', help="基线结果文件，变慢超过容差时退出码为 1")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="允许的相对变慢比例")
+    parser.add_argument('--startup', action='store_true', help="只测量导入和启动到第一次调节的耗时")
+    parser.add_argument('--startup-runs', type=int, default=5, help="启动测量的次数")
+    parser.add_argument('--list', action='store_true', help="列出场景")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, scenario in SCENARIOS.items():
+            print(f"{name:12} {scenario['description']}")
+        return 0
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+    with tempfile.TemporaryDirectory(prefix="autolight_bench_") as workdir:
+        if args.startup:
+            print("测量启动耗时 ...", file=sys.stderr)
+            report['startup'] = run_startup(args.startup_runs, workdir)
+        else:
+            import autolight_tray as app
+            base_config = dict(app.DEFAULT_CONFIG)
+            if args.config:
+                with open(args.config, encoding='utf-8') as f:
+                    base_config.update(json.load(f))
+            results = []
+            for name in args.scenario or list(SCENARIOS):
+                print(f"运行 {name} ...", file=sys.stderr)
+                results.append(run_scenario(name, SCENARIOS[name], args.duration, base_config, workdir))
+            report['duration'] = args.duration
+            report['scenarios'] = results
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            failures = compare(report, json.load(f), args.tolerance)
+        for failure in failures:
+            print(f"变慢: {failure}", file=sys.stderr)
+        if failures:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
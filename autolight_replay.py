@@ -0,0 +1,296 @@
+"""控制器离线回放与加速仿真
+
+把录制的或合成的环境亮度序列送入未经修改的 BrightnessController：
+- 事件循环运行在虚拟时钟上，等待时不休眠而是直接把时钟拨到下一个定时器，
+  轮询间隔、滤波、平滑过渡、限速和断路器都按虚拟时间运行，结果可重复
+- 用记录命令的后端代替真实显示器，输出亮度命令流
+- 一天的每秒读数在一秒内回放完，可用于测试和比较不同参数
+
+用法:
+    python autolight_replay.py --synthetic                     # 回放合成的一天
+    python autolight_replay.py trace.csv -c my.json            # CSV：时间(秒),环境亮度(%)
+    python autolight_replay.py --history 24 --set threshold=5  # 回放最近 24 小时的历史记录
+    python autolight_replay.py --synthetic -o commands.csv     # 输出亮度命令流
+"""
+import argparse
+import asyncio
+import bisect
+import csv
+import json
+import math
+import random
+import selectors
+import sys
+import time
+
+from autolight_tray import (DEFAULT_CONFIG, HISTORY_DIR, BrightnessBackend, BrightnessController,
+                            ConfigManager)
+
+# 回放时固定的配置：只从序列读数，不启动网络服务，不写历史记录
+REPLAY_OVERRIDES = {
+    'enabled': True,
+    'sensor_source': 'http',
+    'sensors': [],
+    'metrics_enabled': False,
+    'history_enabled': False,
+    'relay_enabled': False,
+}
+
+
+class Trace:
+    """环境亮度序列，按时间取值为阶梯函数；读数为 None 表示该时刻读取失败"""
+
+    def __init__(self, samples):
+        samples = sorted(samples, key=lambda sample: sample[0])
+        if not samples:
+            raise ValueError("序列为空")
+        self.times = [float(t) for t, _ in samples]
+        self.values = [None if v is None else float(v) for _, v in samples]
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def start(self):
+        return self.times[0]
+
+    @property
+    def end(self):
+        return self.times[-1]
+
+    def value_at(self, t):
+        """t 时刻的读数（不晚于 t 的最后一个样本）"""
+        index = bisect.bisect_right(self.times, t) - 1
+        return self.values[index] if index >= 0 else None
+
+    @classmethod
+    def from_csv(cls, path):
+        """读取 "时间(秒),环境亮度" 两列的 CSV，首行为表头时跳过，空值表示读取失败"""
+        samples = []
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if len(row) < 2:
+                    continue
+                try:
+                    t = float(row[0])
+                except ValueError:
+                    continue
+                samples.append((t, float(row[1]) if row[1].strip() else None))
+        return cls(samples)
+
+    @classmethod
+    def from_history(cls, hours, directory=HISTORY_DIR):
+        """读取最近 hours 小时的历史记录（见 history.py）"""
+        from history import HistoryStore
+        store = HistoryStore(directory)
+        try:
+            end = int(time.time())
+            records = store.read_range(end - int(hours * 3600), end)
+        finally:
+            store.close()
+        return cls([(ts, ambient) for ts, ambient, _, _ in records])
+
+    @classmethod
+    def synthetic_day(cls, step=1.0, seed=0):
+        """合成一天的读数：日出日落、云层起伏和偶尔路过的人影，同一 seed 结果相同"""
+        rng = random.Random(seed)
+        samples = []
+        cloud = 0.0
+        shadow_until = -1.0
+        t = 0.0
+        while t < 86400:
+            hour = t / 3600
+            sun = max(0.0, math.sin(math.pi * (hour - 6) / 12)) ** 1.5 if 6 < hour < 18 else 0.0
+            # 云层：有界的随机游走
+            cloud = min(0.6, max(0.0, cloud + rng.gauss(0, 0.01 * math.sqrt(step))))
+            if t > shadow_until and rng.random() < 0.0005 * step:
+                shadow_until = t + rng.uniform(2, 8)
+            value = 5 + 90 * sun * (1 - cloud)
+            if t <= shadow_until:
+                value *= 0.5
+            samples.append((t, round(value, 2)))
+            t += step
+        return cls(samples)
+
+
+class VirtualClock:
+    """手动推进的时钟"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+
+
+class VirtualSelector(selectors.DefaultSelector):
+    """不等待 I/O：事件循环要等多久，就把虚拟时钟拨快多久"""
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout=None):
+        events = super().select(0)
+        if not events and timeout:
+            self.clock.advance(timeout)
+        return events
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    """以虚拟时钟计时的事件循环，asyncio.sleep / wait_for 不会真正等待"""
+
+    def __init__(self, clock):
+        super().__init__(VirtualSelector(clock))
+        self.clock = clock
+
+    def time(self):
+        return self.clock.now
+
+
+class RecordingBackend(BrightnessBackend):
+    """记录每条亮度命令的后端，读回时返回最后写入的亮度"""
+
+    name = "记录"
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.commands = []  # (时间, 显示器, 亮度)
+        self.levels = {}
+
+    def apply(self, level, display=None):
+        self.commands.append((self.clock(), display, level))
+        self.levels[display] = level
+
+    async def apply_async(self, level, display=None):
+        self.apply(level, display)
+
+    def read(self, display=None):
+        return self.levels.get(display, self.levels.get(None))
+
+    def list_displays(self):
+        return sorted(d for d in self.levels if d is not None)
+
+
+class ReplayController(BrightnessController):
+    """从序列读取传感器的控制器，其余逻辑与实际运行相同"""
+
+    def __init__(self, config, trace, clock):
+        super().__init__(config, clock)
+        self.trace = trace
+
+    async def read_sensor(self):
+        value = self.trace.value_at(self.clock())
+        if value is None:
+            self.metrics.inc('sensor_errors')
+            return None
+        self.current_sensor_value = value
+        # 对数曲线需要 Lux 读数，此时序列中的读数按 Lux 解释
+        self.current_lux = value if self.curve.needs_lux else None
+        self.current_voltage = None
+        self.source_info = "回放"
+        return value
+
+    async def read_display(self, display):
+        # 不经过工作线程，保证结果可重复
+        return self.backend.read(display)
+
+    def log_hourly_stats(self):
+        # 每小时统计只面向实际运行
+        pass
+
+
+def replay(config, trace, start=None, end=None, seed=0):
+    """在虚拟时间中回放 trace，返回 (亮度命令列表, 统计)"""
+    start = trace.start if start is None else start
+    end = trace.end if end is None else end
+    clock = VirtualClock(start)
+    loop = VirtualEventLoop(clock)
+    backend = RecordingBackend(clock)
+    controller = ReplayController({**DEFAULT_CONFIG, **config, **REPLAY_OVERRIDES}, trace, clock)
+    controller.backend = backend
+    # 断路器的退避抖动也固定下来
+    controller.breaker.random = random.Random(seed).random
+    controller.loop = loop
+    controller.running = True
+
+    wall_start = time.perf_counter()
+    try:
+        loop.call_at(end, controller._cancel)
+        loop.run_until_complete(controller._main())
+    finally:
+        loop.close()
+        controller.io_executor.shutdown(wait=False)
+    wall = time.perf_counter() - wall_start
+
+    metrics = controller.metrics
+    simulated = clock.now - start
+    stats = {
+        'samples': metrics.value('adjustments') + metrics.value('adjustments_skipped'),
+        'adjustments': metrics.value('adjustments'),
+        'commands': len(backend.commands),
+        'commands_dropped': metrics.value('commands_dropped'),
+        'commands_merged': metrics.value('commands_merged'),
+        'apply_skipped': metrics.value('apply_skipped'),
+        'sensor_errors': metrics.value('sensor_errors'),
+        'final_level': backend.commands[-1][2] if backend.commands else None,
+        'simulated_seconds': round(simulated, 3),
+        'wall_seconds': round(wall, 4),
+        'speedup': round(simulated / wall) if wall > 0 else None,
+    }
+    return backend.commands, stats
+
+
+def parse_overrides(items):
+    """解析 --set 键=值，值按 JSON 解析，失败时作为字符串"""
+    overrides = {}
+    for item in items:
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError(f"应为 键=值: {item}")
+        try:
+            overrides[key] = json.loads(value)
+        except ValueError:
+            overrides[key] = value
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description="自动亮度控制器离线回放")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('trace', nargs='?', help="CSV 序列：时间(秒),环境亮度(%%)")
+    source.add_argument('--synthetic', action='store_true', help="回放合成的一天（每秒一个读数）")
+    source.add_argument('--history', type=float, metavar='HOURS', help="回放最近若干小时的历史记录")
+    parser.add_argument('--seed', type=int, default=0, help="合成序列与退避抖动的随机种子")
+    parser.add_argument('-c', '--config', help="配置文件（JSON），默认为程序当前配置")
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE', help="覆盖配置项（可重复）")
+    parser.add_argument('-o', '--output', help="亮度命令流写入 CSV：时间(秒),显示器,亮度")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        trace = Trace.synthetic_day(seed=args.seed)
+    elif args.history:
+        trace = Trace.from_history(args.history)
+    else:
+        trace = Trace.from_csv(args.trace)
+    config = ConfigManager.load(args.config)
+    config.update(parse_overrides(args.set))
+
+    commands, stats = replay(config, trace, seed=args.seed)
+    stats['trace_samples'] = len(trace)
+    if args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['time', 'display', 'level'])
+            for t, display, level in commands:
+                writer.writerow([round(t - trace.start, 3), '' if display is None else display, level])
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,32 +1,130 @@
+import abc
+import asyncio
 import json
+import logging
+import math
 import os
+import random
+import re
+import socket
+import statistics
+import struct
 import subprocess
 import sys
 import threading
 import time
-import tkinter as tk
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from tkinter import filedialog, messagebox, ttk
+from urllib.parse import urlsplit
 
-import pystray
-import requests
-from PIL import Image, ImageDraw
-from pystray import MenuItem as item
+from history import HistoryStore
+from metrics import Metrics, serve_metrics
+from relay import DEFAULT_GROUP, DEFAULT_GROUP_PORT, DEFAULT_HTTP_PORT, SensorRelay
+from sensor_client import SensorClient, SseParser, iter_stream_chunks
+
+log = logging.getLogger("autolight")
 
 # ================= 配置文件路径 =================
 CONFIG_FILE = Path.home() / "AutoDisplayLight_config.json"
+HISTORY_DIR = Path.home() / "AutoDisplayLight_history"
+ICON_CACHE = Path.home() / "AutoDisplayLight_icon.png"
+LOG_FILE = Path.home() / "AutoDisplayLight.log"
+
+def setup_logging(level=logging.INFO, path=LOG_FILE):
+    """日志写入按大小轮转的文件，有控制台时同时输出到控制台
+    
+    打包成无控制台的程序时 sys.stderr 为 None，只能写文件。
+    """
+    from logging.handlers import RotatingFileHandler
+    handlers = []
+    try:
+        handlers.append(RotatingFileHandler(path, maxBytes=1024 * 1024, backupCount=2, encoding='utf-8'))
+    except OSError:
+        pass
+    if sys.stderr is not None:
+        handlers.append(logging.StreamHandler())
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S", handlers=handlers or [logging.NullHandler()])
+
+# 界面与托盘模块在第一次需要时才导入：开机自启动时先让控制器和托盘图标运行起来
+tk = ttk = filedialog = messagebox = None
+pystray = item = Image = None
+
+def load_gui_modules():
+    """导入 tkinter（创建窗口前调用）"""
+    global tk, ttk, filedialog, messagebox
+    if tk is None:
+        import tkinter as tk
+        from tkinter import filedialog, messagebox, ttk
+
+def load_tray_modules():
+    """导入 pystray 与 Pillow（创建托盘图标前调用）"""
+    global pystray, item, Image
+    if pystray is None:
+        import pystray
+        from PIL import Image
+        from pystray import MenuItem as item
 
 # ================= 默认配置 =================
 DEFAULT_CONFIG = {
     "sensor_url": "http://temt6000-sensor.local/sensor/temt6000_percentage",
+    "sensor_source": "http",
+    "sensors": [],
+    "fusion_method": "weighted_mean",
+    "fusion_outlier": 20,
+    "sensor_stale_after": 30,
+    "breaker_failures": 3,
+    "breaker_backoff_min": 5,
+    "breaker_backoff_max": 300,
+    "fallback_brightness": 50,
+    "fallback_ramp": 900,
+    "udp_port": 8888,
+    "udp_timeout": 5,
+    "sse_timeout": 15,
+    "relay_enabled": False,
+    "relay_port": DEFAULT_HTTP_PORT,
+    "relay_group": DEFAULT_GROUP,
+    "relay_group_port": DEFAULT_GROUP_PORT,
+    "relay_max_age": 10,
+    "backend": "twinkle_tray",
     "tt_path": r"C:\Users\13963\AppData\Local\Programs\twinkle-tray\Twinkle Tray.exe",
+    "sysfs_path": "/sys/class/backlight",
+    "ddcutil_path": "ddcutil",
+    "readback_interval": 60,
     "interval": 5,
+    "adaptive_interval": True,
+    "interval_min": 1,
+    "interval_max": 30,
+    "interval_backoff": 1.5,
+    "dns_cache_ttl": 300,
+    "metrics_enabled": False,
+    "metrics_port": 9731,
+    "history_enabled": True,
+    "history_max_mb": 16,
     "min_brightness": 0,
     "max_brightness": 100,
+    "monitors": [],
     "threshold": 3,
+    "curve_mode": "gamma",
+    "curve_gamma": 1.0,
+    "curve_points": [[0, 0], [100, 100]],
+    "curve_lux_min": 1,
+    "curve_lux_max": 10000,
+    "lux_entity": "temt6000_lux",
+    "filter_median_window": 3,
+    "filter_ema_alpha": 0.5,
+    "filter_settle_time": 30,
+    "min_change_interval": 1,
     "smooth_transition": True,
     "transition_step": 2,
     "transition_delay": 0.05,
+    "transition_duration": 1.5,
+    "transition_max_frames": 10,
+    "transition_easing": "ease_in_out",
+    "command_rate": 5,
+    "command_burst": 5,
     "enabled": True,
     "start_minimized": True
 }
@@ -85,7 +183,7 @@ Register-ScheduledTask -TaskName '{AutostartManager.TASK_NAME}' -Action $action
             )
             return result.returncode == 0
         except Exception as e:
-            print(f"启用自启动失败: {e}")
+            log.warning("启用自启动失败: %s", e)
             return False
     
     @staticmethod
@@ -101,47 +199,1567 @@ Register-ScheduledTask -TaskName '{AutostartManager.TASK_NAME}' -Action $action
             )
             return result.returncode == 0
         except Exception as e:
-            print(f"禁用自启动失败: {e}")
+            log.warning("禁用自启动失败: %s", e)
             return False
 
 class ConfigManager:
     """配置管理器"""
     
     @staticmethod
-    def load():
-        """加载配置"""
-        if CONFIG_FILE.exists():
+    def read(path=None):
+        """读取配置文件并补全默认值，文件不存在或格式错误时抛出异常"""
+        with open(path or CONFIG_FILE, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        if not isinstance(config, dict):
+            raise ValueError("配置文件顶层应为对象")
+        return {**DEFAULT_CONFIG, **config}
+    
+    @staticmethod
+    def load(path=None):
+        """加载配置，path 默认为 CONFIG_FILE"""
+        path = Path(path or CONFIG_FILE)
+        if path.exists():
             try:
-                with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    return {**DEFAULT_CONFIG, **config}
+                return ConfigManager.read(path)
             except Exception as e:
-                print(f"加载配置失败: {e}")
+                log.warning("加载配置失败: %s", e)
         return DEFAULT_CONFIG.copy()
     
     @staticmethod
-    def save(config):
-        """保存配置"""
+    def save(config, path=None):
+        """保存配置，path 默认为 CONFIG_FILE
+        
+        先写入同目录的临时文件并落盘，再整体替换原文件，写入中途崩溃不会留下半个文件。
+        """
+        path = Path(path or CONFIG_FILE)
+        tmp_path = path.with_name(path.name + ".tmp")
         try:
-            with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
                 json.dump(config, f, indent=2, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
             return True
         except Exception as e:
-            print(f"保存配置失败: {e}")
+            log.error("保存配置失败: %s", e)
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
             return False
 
-class BrightnessController:
-    """亮度控制器"""
+class ConfigWatcher:
+    """配置文件变化检测
+    
+    只比较文件的修改时间和大小，每次检查是一次 stat，由调用方定时调用 poll。
+    本程序自己保存后调用 mark_saved，不会把自己的写入当成外部修改。
+    """
+    
+    def __init__(self, path=None):
+        self.path = Path(path or CONFIG_FILE)
+        self.signature = self.stat()
+    
+    def stat(self):
+        try:
+            st = self.path.stat()
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+    
+    def mark_saved(self):
+        """记录当前文件状态为已知"""
+        self.signature = self.stat()
+    
+    def poll(self):
+        """文件有变化时返回新配置；未变化或文件已删除时返回 None，格式错误时抛出异常"""
+        signature = self.stat()
+        if signature == self.signature or signature is None:
+            return None
+        # 无论能否解析都记下本次状态，编辑器写到一半的文件会在写完后再次触发
+        self.signature = signature
+        return ConfigManager.read(self.path)
+
+class PushSensorSource(abc.ABC):
+    """推送式传感器数据源基类（数据到达即通知控制器的事件循环）"""
+    
+    label = "推送"
+    # 数据源需要阻塞读取时在独立线程中运行 _run，否则 _run 为在事件循环中注册接收的协程
+    uses_thread = True
+    
+    def __init__(self):
+        self.thread = None
+        self.running = False
+        self.loop = None
+        self.ready = None
+        self.lock = threading.Lock()
+        self.latest = None
+        self.latest_source = None
+        self.last_packet_time = 0.0
+        # 同一数据源附带的其他实体读数，如 temt6000_lux / temt6000_voltage
+        self.readings = {}
+    
+    async def start(self):
+        """在当前事件循环中启动，需要阻塞读取的数据源另开接收线程"""
+        self.loop = asyncio.get_running_loop()
+        self.ready = asyncio.Event()
+        self.last_packet_time = time.monotonic()
+        self.running = True
+        if self.uses_thread:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        else:
+            await self._run()
+    
+    def stop(self):
+        """停止接收（不等待接收线程，避免阻塞事件循环）"""
+        self.running = False
+        if self.ready is not None:
+            self.ready.set()
+    
+    @abc.abstractmethod
+    def _run(self):
+        """接收读数，收到后调用 publish"""
+    
+    def touch(self):
+        """记录数据源仍然存活"""
+        self.last_packet_time = time.monotonic()
+    
+    def publish(self, value, source):
+        """发布新读数并唤醒等待者，可在任意线程调用"""
+        with self.lock:
+            self.last_packet_time = time.monotonic()
+            self.latest = value
+            self.latest_source = source
+        try:
+            self.loop.call_soon_threadsafe(self.ready.set)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+    
+    def packet_age(self):
+        """距上一次收到数据的秒数"""
+        return time.monotonic() - self.last_packet_time
+    
+    def take(self):
+        """取出最新读数，没有新读数时返回 None"""
+        with self.lock:
+            value, self.latest = self.latest, None
+            return value
+    
+    async def get(self, timeout):
+        """等待新读数，超时返回 None"""
+        self.ready.clear()
+        value = self.take()
+        if value is None and self.running:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            value = self.take()
+        return value
+
+class UdpSensorListener(PushSensorSource, asyncio.DatagramProtocol):
+    """UDP 广播监听器（接收 esp32c3.yaml 中的 JSON 广播）
+    
+    直接注册在事件循环上，数据包到达时才唤醒，不占用线程也不定时轮询。
+    """
+    
+    label = "UDP 推送"
+    uses_thread = False
+    
+    # 序号回退时，距同一来源上一个被接受的包超过此秒数，或回退超过 SEQ_RESET_WINDOW，
+    # 视为传感器重启（重启要几秒才能重新联网），否则视为乱序或重复
+    SEQ_RESTART_GAP = 2
+    SEQ_RESET_WINDOW = 1000
+    
+    def __init__(self, port, device="temt6000"):
+        super().__init__()
+        self.port = port
+        self.key = ('udp', port)
+        self.device = device
+        self.transport = None
+        self.sock = None
+        self.last_seq = {}
+        self.last_accepted = {}
+        self.last_payload = {}
+        self.dropped = 0
+    
+    def open_socket(self):
+        """创建并绑定接收套接字"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind(("0.0.0.0", self.port))
+        except OSError:
+            sock.close()
+            raise
+        return sock
+    
+    async def start(self):
+        """绑定端口并开始监听"""
+        self.sock = self.open_socket()
+        await super().start()
+    
+    async def _run(self):
+        """把已绑定的套接字注册到事件循环，数据包由 datagram_received 处理"""
+        sock, self.sock = self.sock, None
+        self.transport, _ = await self.loop.create_datagram_endpoint(lambda: self, sock=sock)
+    
+    def stop(self):
+        """停止监听"""
+        super().stop()
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+    
+    def datagram_received(self, payload, addr):
+        """事件循环回调：收到一个数据包
+        
+        只有被接受的读数才刷新数据源的存活时间，丢弃的、格式错误的和其他设备的包
+        不会让控制器以为数据源仍然在线而不回退到 HTTP 轮询。
+        """
+        value = self.parse_packet(payload, addr[0])
+        if value is not None:
+            self.publish(value, addr[0])
+    
+    def parse_packet(self, payload, source, now=None):
+        """解析数据包，重复或乱序的包返回 None"""
+        now = time.monotonic() if now is None else now
+        try:
+            data = json.loads(payload.decode('utf-8'))
+            if data.get('device') != self.device:
+                return None
+            value = float(data['percentage'])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.dropped += 1
+            return None
+        
+        seq = data.get('seq')
+        if isinstance(seq, int):
+            last = self.last_seq.get(source)
+            if (last is not None and seq <= last and last - seq < self.SEQ_RESET_WINDOW
+                    and now - self.last_accepted[source] < self.SEQ_RESTART_GAP):
+                self.dropped += 1
+                return None
+            self.last_seq[source] = seq
+        elif self.last_payload.get(source) == payload:
+            # 旧固件没有序号，只能丢弃完全相同的重复包
+            self.dropped += 1
+            return None
+        
+        self.last_payload[source] = payload
+        self.last_accepted[source] = now
+        for field in ('lux', 'voltage'):
+            if isinstance(data.get(field), (int, float)):
+                self.readings[f"{self.device}_{field}"] = float(data[field])
+        return value
+
+class RelaySubscriber(UdpSensorListener):
+    """订阅局域网中继的组播读数（见 relay.py）
+    
+    中继的数据包与 ESP32 的 UDP 广播格式相同，另带读数年龄：超过 max_age 的读数
+    丢弃；心跳重发的旧读数只用来确认中继在线。收到第一个包即发现中继的 HTTP 地址，
+    组播中断时控制器改为轮询这个地址，而不是每个客户端各自去读 ESP32。
+    启动标识 boot 变化说明中继已重启，该来源的序号重新开始记录。
+    """
+    
+    label = "中继"
+    
+    def __init__(self, group, port, max_age=10, device="temt6000"):
+        super().__init__(port, device)
+        self.group = group
+        self.key = ('relay', group, port)
+        self.max_age = max_age
+        self.relay_url = None
+        self.relay_boot = {}
+        self.stale = 0
+    
+    def open_socket(self):
+        """绑定端口并加入组播组"""
+        sock = super().open_socket()
+        try:
+            membership = struct.pack("4s4s", socket.inet_aton(self.group), socket.inet_aton("0.0.0.0"))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+    
+    def parse_packet(self, payload, source, now=None):
+        """解析中继数据包，过期读数和心跳返回 None；读数未过期的心跳确认中继在线"""
+        try:
+            data = json.loads(payload.decode('utf-8'))
+            age = float(data['age'])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.dropped += 1
+            return None
+        if isinstance(data.get('http_port'), int):
+            self.relay_url = f"http://{source}:{data['http_port']}"
+        boot = data.get('boot')
+        if boot != self.relay_boot.get(source):
+            self.relay_boot[source] = boot
+            for state in (self.last_seq, self.last_accepted, self.last_payload):
+                state.pop(source, None)
+        if data.get('seq') == self.last_seq.get(source):
+            if age <= self.max_age:
+                self.touch()
+            return None
+        if age > self.max_age:
+            self.stale += 1
+            return None
+        return super().parse_packet(payload, source, now)
+
+class SseSensorStream(PushSensorSource):
+    """ESPHome web_server /events 事件流订阅，一个长连接接收所有实体的状态"""
+    
+    label = "SSE 事件流"
+    BACKOFF_MIN = 1
+    BACKOFF_MAX = 30
+    
+    def __init__(self, client, sensor_url, read_timeout=30):
+        super().__init__()
+        parts = urlsplit(sensor_url)
+        self.url = f"{parts.scheme}://{parts.netloc}/events"
+        self.key = ('sse', sensor_url)
+        # 主实体取自传感器地址，如 /sensor/temt6000_percentage
+        self.entity = parts.path.rstrip('/').rsplit('/', 1)[-1]
+        self.client = client
+        self.read_timeout = read_timeout
+        self.response = None
+        self.stop_event = threading.Event()
+        self.error = None
+        self.reconnects = 0
+    
+    @staticmethod
+    def entity_key(entity_id):
+        """统一实体 ID：sensor-temt6000_lux 与 sensor/TEMT6000 Lux 都得到 temt6000_lux"""
+        name = re.split(r'[-/]', entity_id, 1)[-1]
+        return name.strip().lower().replace(' ', '_')
+    
+    def stop(self):
+        """停止订阅并断开连接"""
+        super().stop()
+        self.stop_event.set()
+        response = self.response
+        if response is not None:
+            response.close()
+    
+    def _run(self):
+        """接收线程，断线后按指数退避重连"""
+        backoff = self.BACKOFF_MIN
+        while self.running:
+            parser = SseParser()
+            try:
+                self.response = self.client.open_stream(self.url, self.read_timeout)
+                backoff = self.BACKOFF_MIN
+                self.error = None
+                for chunk in iter_stream_chunks(self.response):
+                    self.touch()
+                    for event, data in parser.feed(chunk):
+                        if event == 'state':
+                            self.handle_state(data)
+                    if not self.running:
+                        break
+            except Exception as e:
+                self.error = str(e)
+            finally:
+                if self.response is not None:
+                    self.response.close()
+                    self.response = None
+            
+            if not self.running:
+                break
+            self.reconnects += 1
+            self.stop_event.wait(max(backoff, parser.retry or 0))
+            backoff = min(backoff * 2, self.BACKOFF_MAX)
+    
+    def handle_state(self, data):
+        """处理 state 事件"""
+        try:
+            state = json.loads(data)
+            key = self.entity_key(state['id'])
+            value = float(state['value'])
+        except (ValueError, KeyError, TypeError):
+            return
+        if value != value:  # NaN：传感器尚无读数
+            return
+        
+        self.readings[key] = value
+        if key == self.entity:
+            self.publish(value, urlsplit(self.url).hostname)
+
+class BrightnessBackend(abc.ABC):
+    """屏幕亮度后端基类"""
+    
+    name = "亮度后端"
+    
+    @abc.abstractmethod
+    def apply(self, level, display=None):
+        """设置亮度 (0-100)，display 为 None 时设置所有显示器"""
+    
+    async def apply_async(self, level, display=None):
+        """在事件循环中设置亮度，默认放到线程池执行同步实现"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.apply, level, display)
+    
+    @abc.abstractmethod
+    def read(self, display=None):
+        """读取当前亮度 (0-100)，无法读取时返回 None"""
+    
+    @abc.abstractmethod
+    def list_displays(self):
+        """列出可控制的显示器标识"""
+
+def _hidden_window_kwargs():
+    """Windows 下隐藏子进程窗口的参数，其他平台为空"""
+    if sys.platform != 'win32':
+        return {}
+    startupinfo = subprocess.STARTUPINFO()
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    return {'startupinfo': startupinfo}
+
+async def _run_process(args, timeout):
+    """异步运行子进程，返回 (退出码, 标准输出, 标准错误)
+    
+    超时或任务被取消时结束子进程，不留下孤儿进程。
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        **_hidden_window_kwargs())
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+        if proc.returncode is None:
+            proc.kill()
+            try:
+                # 子进程派生的进程可能仍占着管道，最多等 1 秒回收
+                await asyncio.wait_for(asyncio.shield(proc.wait()), 1)
+            except asyncio.TimeoutError:
+                pass
+        if isinstance(e, asyncio.TimeoutError):
+            raise subprocess.TimeoutExpired(args, timeout) from None
+        raise
+    return (proc.returncode, stdout.decode(errors='replace'), stderr.decode(errors='replace'))
+
+class TwinkleTrayBackend(BrightnessBackend):
+    """通过 Twinkle Tray 命令行设置亮度（每次调用启动一个进程）"""
+    
+    name = "Twinkle Tray"
+    
+    def __init__(self, tt_path):
+        self.tt_path = tt_path
+    
+    @staticmethod
+    def _selector_key(display):
+        """显示器在命令行参数和 --List 输出中的键：纯数字为显示器编号，否则为 Twinkle Tray 的显示器 ID"""
+        return 'MonitorNum' if str(display).isdigit() else 'MonitorID'
+    
+    def _set_args(self, level, display):
+        """设置亮度的命令行参数"""
+        selector = "--All" if display is None else f"--{self._selector_key(display)}={display}"
+        return [self.tt_path, selector, f"--Set={level}"]
+    
+    def apply(self, level, display=None):
+        subprocess.run(self._set_args(level, display), timeout=2, **_hidden_window_kwargs())
+    
+    async def apply_async(self, level, display=None):
+        await _run_process(self._set_args(level, display), timeout=2)
+    
+    def _list(self):
+        """解析 --List 输出，每个显示器一段 "键: 值" 文本"""
+        result = subprocess.run([self.tt_path, "--List"], capture_output=True, text=True,
+                                timeout=5, **_hidden_window_kwargs())
+        monitors = []
+        for block in re.split(r'\n\s*\n', result.stdout):
+            info = {}
+            for line in block.splitlines():
+                key, sep, value = line.partition(':')
+                if sep:
+                    info[key.strip()] = value.strip().strip('"')
+            if info:
+                monitors.append(info)
+        return monitors
+    
+    def read(self, display=None):
+        for info in self._list():
+            # 与设置时选择显示器的方式相同
+            if display is None or info.get(self._selector_key(display)) == str(display):
+                try:
+                    return int(info['Brightness'])
+                except (KeyError, ValueError):
+                    return None
+        return None
+    
+    def list_displays(self):
+        return [info['MonitorNum'] for info in self._list() if 'MonitorNum' in info]
+
+class SysfsBacklightBackend(BrightnessBackend):
+    """直接写 /sys/class/backlight 文件（Linux 笔记本内屏，无需启动进程）"""
+    
+    name = "sysfs 背光"
+    
+    def __init__(self, root="/sys/class/backlight"):
+        self.root = Path(root)
+        self._max = {}
+    
+    def list_displays(self):
+        if not self.root.is_dir():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if (p / "brightness").exists())
+    
+    def max_brightness(self, display):
+        """读取并缓存 max_brightness"""
+        if display not in self._max:
+            self._max[display] = int((self.root / display / "max_brightness").read_text().strip())
+        return self._max[display]
+    
+    def apply(self, level, display=None):
+        displays = self.list_displays() if display is None else [display]
+        if not displays:
+            raise FileNotFoundError(f"{self.root} 下没有背光设备")
+        for name in displays:
+            raw = round(level * self.max_brightness(name) / 100)
+            (self.root / name / "brightness").write_text(str(raw))
+    
+    async def apply_async(self, level, display=None):
+        # 写 sysfs 只需几十微秒，直接在事件循环中完成
+        self.apply(level, display)
+    
+    def read(self, display=None):
+        if display is None:
+            displays = self.list_displays()
+            if not displays:
+                return None
+            display = displays[0]
+        # actual_brightness 反映硬件实际值，brightness 只是上次写入的值
+        path = self.root / display / "actual_brightness"
+        if not path.exists():
+            path = self.root / display / "brightness"
+        return round(int(path.read_text().strip()) * 100 / self.max_brightness(display))
+
+class DdcutilBackend(BrightnessBackend):
+    """通过 ddcutil 以 DDC/CI 设置外接显示器亮度 (VCP 0x10)"""
+    
+    name = "ddcutil"
+    
+    def __init__(self, ddcutil_path="ddcutil"):
+        self.ddcutil_path = ddcutil_path
+    
+    def _run(self, *args):
+        result = subprocess.run([self.ddcutil_path, *args], capture_output=True, text=True, timeout=10)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or f"ddcutil 退出码 {result.returncode}")
+        return result.stdout
+    
+    async def _run_async(self, *args):
+        returncode, stdout, stderr = await _run_process([self.ddcutil_path, *args], timeout=10)
+        if returncode != 0:
+            raise RuntimeError(stderr.strip() or f"ddcutil 退出码 {returncode}")
+        return stdout
+    
+    @staticmethod
+    def _parse_displays(output):
+        return re.findall(r'^Display (\d+)', output, re.MULTILINE)
+    
+    def list_displays(self):
+        return self._parse_displays(self._run("detect", "--brief"))
+    
+    def apply(self, level, display=None):
+        displays = self.list_displays() if display is None else [display]
+        for number in displays:
+            self._run("setvcp", "10", str(level), "--display", str(number))
+    
+    async def apply_async(self, level, display=None):
+        if display is None:
+            displays = self._parse_displays(await self._run_async("detect", "--brief"))
+        else:
+            displays = [display]
+        for number in displays:
+            await self._run_async("setvcp", "10", str(level), "--display", str(number))
+    
+    def read(self, display=None):
+        args = ["getvcp", "10", "--brief"]
+        if display is not None:
+            args += ["--display", str(display)]
+        # 输出形如 "VCP 10 C 50 100"：当前值 50，最大值 100
+        match = re.search(r'VCP 10 C (\d+) (\d+)', self._run(*args))
+        if not match:
+            return None
+        current, maximum = int(match.group(1)), int(match.group(2))
+        return round(current * 100 / maximum) if maximum else None
+
+def create_backend(config):
+    """根据配置创建亮度后端"""
+    backend = config.get('backend', 'twinkle_tray')
+    if backend == 'sysfs':
+        return SysfsBacklightBackend(config.get('sysfs_path', '/sys/class/backlight'))
+    if backend == 'ddcutil':
+        return DdcutilBackend(config.get('ddcutil_path', 'ddcutil'))
+    return TwinkleTrayBackend(config['tt_path'])
+
+# 缓动函数：输入 0-1 的时间进度，输出 0-1 的亮度进度
+EASINGS = {
+    'linear': lambda t: t,
+    'ease_in_out': lambda t: t * t * (3 - 2 * t),
+    'ease_out': lambda t: 1 - (1 - t) * (1 - t),
+}
+
+class TokenBucket:
+    """令牌桶：平均每秒 rate 个令牌，最多积累 burst 个；rate 为 0 时不限速"""
+    
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.clock = clock
+        self.tokens = 0.0
+        self.configure(rate, burst)
+        self.tokens = self.burst
+        self.updated = clock()
+    
+    def configure(self, rate, burst):
+        self.rate = max(0.0, rate)
+        self.burst = max(1.0, burst)
+        self.tokens = min(self.tokens, self.burst)
+    
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def delay(self, count=1):
+        """距 count 个令牌可用的秒数，0 表示现在就有；count 超过 burst 时按 burst 计"""
+        if self.rate <= 0:
+            return 0.0
+        count = min(count, self.burst)
+        self._refill()
+        # 容许浮点累积误差，否则会得到小于时钟精度的等待时间而空转
+        return 0.0 if self.tokens >= count - 1e-9 else (count - self.tokens) / self.rate
+    
+    def take(self, count=1):
+        """取走 count 个令牌"""
+        if self.rate > 0:
+            self._refill()
+            self.tokens -= min(count, self.burst)
+
+class TransitionEngine:
+    """亮度过渡引擎
+    
+    作为事件循环中的任务按时间推进过渡，不阻塞主循环。每个过渡按时长规划，帧间隔
+    受帧预算限制；设置亮度耗时超过帧预算时，下一帧直接跳到当前时刻应有的亮度。
+    新目标到达时立即唤醒并从当前亮度重新规划。
+    
+    所有亮度命令都经过这里，由令牌桶限制每秒命令数（command_rate / command_burst）。
+    每帧按实际要发出的后端命令数（多显示器时为需要改变的显示器数）取令牌。
+    没有令牌时本帧不发，等到有令牌或新目标时按最新的目标重新计算，读数再怎么抖动，
+    命令频率也有上限，而最终目标在预算允许时一定会下发。
+    
+    设置失败时保留当前过渡，按 RETRY_MIN 起、每次加倍到 RETRY_MAX 的间隔重试；
+    迟滞滤波的输出已经等于目标，不会再有新目标来纠正屏幕亮度。
+    """
+    
+    RETRY_MIN = 0.5
+    RETRY_MAX = 30
+    
+    def __init__(self, apply_func, clock=time.monotonic):
+        # apply_func 为协程函数，返回是否设置成功
+        self.apply_func = apply_func
+        self.clock = clock
+        self.wakeup = None
+        # 保证同一时刻只有一次亮度设置
+        self.apply_lock = None
+        self.task = None
+        self.applied = None
+        self.ramp = None  # (起始亮度, 目标亮度, 开始时间, 时长)
+        self.duration = 1.5
+        self.frame_interval = 0.15
+        self.min_step = 1
+        self.easing = EASINGS['ease_in_out']
+        self.limiter = TokenBucket(0, 1, clock)
+        # 以亮度调用，返回这一帧要发出的后端命令数；未设置时每帧一条
+        self.command_cost = None
+        # 每次有新目标时加一，用来判断等待令牌期间目标是否已被替换
+        self.generation = 0
+        # 是否有一帧因预算用完正在等待令牌
+        self.waiting_token = False
+        # 上次设置失败后的重试间隔，成功后清空
+        self.retry_delay = None
+        self.frames_applied = 0
+        self.frames_skipped = 0
+        self.commands_dropped = 0
+        self.commands_merged = 0
+        # 过渡完成时以实际耗时（秒）调用
+        self.on_ramp_done = None
+        # 命令因限速未发送或被新目标合并时以计数名称调用
+        self.on_count = None
+    
+    def configure(self, config):
+        """从配置读取过渡参数"""
+        self.duration = config.get('transition_duration', 1.5)
+        max_frames = max(1, config.get('transition_max_frames', 10))
+        self.frame_interval = max(config.get('transition_delay', 0.05), self.duration / max_frames)
+        self.min_step = max(1, config.get('transition_step', 2))
+        self.easing = EASINGS.get(config.get('transition_easing', 'ease_in_out'), EASINGS['linear'])
+        self.limiter.configure(config.get('command_rate', 5), config.get('command_burst', 5))
+    
+    def _count(self, name):
+        setattr(self, name, getattr(self, name) + 1)
+        if self.on_count:
+            self.on_count(name)
+    
+    def _cost(self, level):
+        return self.command_cost(level) if self.command_cost else 1
+    
+    def start(self):
+        """在当前事件循环中启动过渡任务"""
+        if self.task is None:
+            self.wakeup = asyncio.Event()
+            self.apply_lock = asyncio.Lock()
+            self.task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        """取消过渡任务，未完成的过渡被丢弃"""
+        self.ramp = None
+        task, self.task = self.task, None
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    
+    @property
+    def active(self):
+        """是否有过渡正在进行"""
+        return self.ramp is not None
+    
+    def set_target(self, level):
+        """以平滑过渡前往新目标，从当前亮度开始重新规划"""
+        if self.waiting_token:
+            # 因预算用完而推迟的一帧被新目标替换
+            self._count('commands_merged')
+        self.generation += 1
+        if self.applied is None or self.applied == level:
+            self.ramp = (level, level, self.clock(), 0.0)
+        else:
+            distance = abs(level - self.applied)
+            duration = max(self.frame_interval, self.duration * distance / 100)
+            self.ramp = (self.applied, level, self.clock(), duration)
+        if self.wakeup is not None:
+            self.wakeup.set()
+    
+    async def apply_now(self, level):
+        """取消过渡并立即设置亮度（受命令预算限制）
+        
+        等待令牌期间有更新的目标到达时，本次目标被合并、不再下发，返回 True。
+        """
+        self.ramp = None
+        self.generation += 1
+        generation = self.generation
+        async with self.apply_lock:
+            while True:
+                if self.generation != generation:
+                    self._count('commands_merged')
+                    return True
+                delay = self.limiter.delay(self._cost(level))
+                if delay <= 0:
+                    break
+                self._count('commands_dropped')
+                await asyncio.sleep(delay)
+            self.limiter.take(self._cost(level))
+            ok = await self.apply_func(level)
+            if ok:
+                self.applied = level
+            return ok
+    
+    def level_at(self, now):
+        """过渡在某一时刻应有的亮度，返回 (亮度, 是否结束)"""
+        start_level, target, start_time, duration = self.ramp
+        if duration <= 0 or now >= start_time + duration:
+            return target, True
+        progress = self.easing((now - start_time) / duration)
+        return start_level + (target - start_level) * progress, False
+    
+    async def _wait(self, timeout=None):
+        """等待下一帧或新目标"""
+        self.wakeup.clear()
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    
+    async def _run(self):
+        """过渡任务：每帧按当前时刻计算亮度，空闲时不唤醒"""
+        while True:
+            ramp = self.ramp
+            if ramp is None:
+                await self._wait()
+                continue
+            frame_start = self.clock()
+            value, done = self.level_at(frame_start)
+            level = int(round(value))
+            # 变化小于最小步长的中间帧不值得一次设置
+            if not done and self.applied is not None and abs(level - self.applied) < self.min_step:
+                level = None
+            
+            if level is not None and level != self.applied:
+                delay = self.limiter.delay(self._cost(level))
+                if delay > 0:
+                    # 超出命令预算：本帧不发，等令牌或新目标后按最新的目标重新计算
+                    self._count('commands_dropped')
+                    self.waiting_token = True
+                    try:
+                        await self._wait(delay)
+                    finally:
+                        self.waiting_token = False
+                    continue
+                async with self.apply_lock:
+                    if self.ramp is not ramp:
+                        continue
+                    self.limiter.take(self._cost(level))
+                    ok = await self.apply_func(level)
+                if not ok:
+                    self.retry_delay = (min(self.RETRY_MAX, self.retry_delay * 2) if self.retry_delay
+                                        else self.RETRY_MIN)
+                    # 新目标会提前唤醒；否则到时按当前时刻重新计算（过渡已结束时即为最终目标）
+                    if self.ramp is ramp:
+                        await self._wait(self.retry_delay)
+                    continue
+                self.retry_delay = None
+                self.applied = level
+                self.frames_applied += 1
+            
+            if done:
+                if self.ramp is ramp:
+                    self.ramp = None
+                    if self.on_ramp_done:
+                        self.on_ramp_done(self.clock() - ramp[2])
+                continue
+            elapsed = self.clock() - frame_start
+            if elapsed > self.frame_interval:
+                # 设置耗时超出帧预算，跳过的帧不再补发
+                self.frames_skipped += int(elapsed // self.frame_interval)
+                continue
+            if self.ramp is ramp:
+                await self._wait(self.frame_interval - elapsed)
+
+class AdaptivePoller:
+    """自适应轮询调度：读数变化时快速轮询，稳定时按倍数退避到上限"""
+    
+    def __init__(self, config):
+        self.configure(config)
+        self.interval = self.min_interval
+        self.last_reading = None
+        self.reason = "首次读取"
+    
+    def configure(self, config):
+        """从配置读取调度参数"""
+        self.min_interval = config.get('interval_min', 1)
+        self.max_interval = max(self.min_interval, config.get('interval_max', 30))
+        self.backoff = max(1.0, config.get('interval_backoff', 1.5))
+        self.threshold = config['threshold']
+    
+    def next_interval(self, reading):
+        """根据本次读数计算下次轮询间隔，返回 (秒, 原因)"""
+        if reading is None:
+            # 读取失败时不改变节奏
+            self.reason = "读取失败"
+        elif self.last_reading is None:
+            self.interval = self.min_interval
+            self.reason = "首次读取"
+        else:
+            delta = abs(reading - self.last_reading)
+            if delta > self.threshold:
+                self.interval = self.min_interval
+                self.reason = f"变化 {delta:.1f}%"
+            elif delta > self.threshold / 2:
+                # 缓慢变化，保持当前节奏
+                self.reason = f"缓变 {delta:.1f}%"
+            else:
+                self.interval = min(self.interval * self.backoff, self.max_interval)
+                self.reason = "稳定"
+        
+        if reading is not None:
+            self.last_reading = reading
+        return self.interval, self.reason
+
+class SensorBreaker:
+    """传感器断路器
+    
+    连续失败 breaker_failures 次后断开，断开期间不再请求传感器，避免对离线的主机
+    反复建连、每轮都等满超时。退避到期后放行一次试探请求（半开）：成功则恢复，
+    失败则退避时长加倍（带随机抖动，上限 breaker_backoff_max）后再次断开。
+    断开期间亮度从最后一次有效读数时的亮度，在 fallback_ramp 秒内线性回落到
+    fallback_brightness。
+    """
+    
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+    LABELS = {CLOSED: "正常", OPEN: "离线", HALF_OPEN: "重试中"}
+    
+    def __init__(self, config, clock=time.monotonic, rng=random.random):
+        self.clock = clock
+        self.random = rng
+        self.configure(config)
+        self.reset()
+    
+    def configure(self, config):
+        """从配置读取断路与回落参数"""
+        self.max_failures = max(1, config.get('breaker_failures', 3))
+        self.backoff_min = max(0.1, config.get('breaker_backoff_min', 5))
+        self.backoff_max = max(self.backoff_min, config.get('breaker_backoff_max', 300))
+        self.fallback = config.get('fallback_brightness', 50)
+        self.fallback_ramp = max(0, config.get('fallback_ramp', 900))
+    
+    def reset(self):
+        """回到正常状态"""
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0  # 连续断开次数，决定退避时长
+        self.retry_at = None
+        self.last_success = self.clock()
+    
+    @property
+    def label(self):
+        return self.LABELS[self.state]
+    
+    def allow(self):
+        """是否请求传感器；断开且退避到期时转为半开，放行一次试探"""
+        if self.state == self.OPEN and self.clock() >= self.retry_at:
+            self.state = self.HALF_OPEN
+        return self.state != self.OPEN
+    
+    def record_success(self):
+        """记录一次成功读取，返回是否从断开中恢复"""
+        recovered = self.state != self.CLOSED
+        self.reset()
+        return recovered
+    
+    def record_failure(self):
+        """记录一次失败，返回是否因此断开（包括试探失败后再次断开）"""
+        self.failures += 1
+        if self.state != self.HALF_OPEN and self.failures < self.max_failures:
+            return False
+        self.trips += 1
+        delay = min(self.backoff_max, self.backoff_min * 2 ** (self.trips - 1))
+        # 抖动取 [delay/2, delay]，多台机器不会在同一时刻一起重试
+        delay *= 0.5 + 0.5 * self.random()
+        self.state = self.OPEN
+        self.retry_at = self.clock() + delay
+        return True
+    
+    def retry_in(self):
+        """距下次试探的秒数，未断开时为 0"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.retry_at - self.clock())
+    
+    def fallback_level(self, last_level):
+        """断开期间的目标亮度，last_level 为最后一次有效读数对应的亮度（未知时为 None）"""
+        if last_level is None or self.fallback_ramp <= 0:
+            return self.fallback
+        t = min(1.0, (self.clock() - self.last_success) / self.fallback_ramp)
+        return last_level + (self.fallback - last_level) * t
+
+class RingBuffer:
+    """固定容量的环形缓冲区，写满后覆盖最旧的数据"""
+    
+    def __init__(self, size):
+        self.data = [0.0] * size
+        self.size = size
+        self.count = 0
+        self.index = 0
+    
+    def append(self, value):
+        self.data[self.index] = value
+        self.index = (self.index + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+    
+    def values(self):
+        """按写入顺序返回有效数据"""
+        if self.count < self.size:
+            return self.data[:self.count]
+        return self.data[self.index:] + self.data[:self.index]
+
+class MedianFilter:
+    """中值滤波：剔除偶发尖峰（路过的人影、屏幕反光）"""
+    
+    def __init__(self, window):
+        self.buffer = RingBuffer(window)
+        self.rejected = 0
+    
+    def process(self, value, now):
+        if value is None:
+            return None
+        self.buffer.append(value)
+        window = sorted(self.buffer.values())
+        median = window[len(window) // 2]
+        if median != value:
+            self.rejected += 1
+        return median
+
+class EmaFilter:
+    """指数移动平均：平滑剩余噪声"""
+    
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.value = None
+    
+    def process(self, value, now):
+        if value is None:
+            return None
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+class HysteresisFilter:
+    """双向迟滞：超出带宽立即跟随；持续偏向同一侧超过半个带宽一段时间后也跟随，
+    避免缓慢漂移卡在阈值以内"""
+    
+    def __init__(self, band, settle_time):
+        self.band = band
+        self.settle_time = settle_time
+        self.output = None
+        self.drift_side = 0
+        self.drift_since = None
+        self.held = 0
+    
+    def process(self, value, now):
+        if value is None:
+            return None
+        if self.output is None or abs(value - self.output) > self.band:
+            return self._emit(value)
+        
+        side = 1 if value > self.output else -1
+        if self.settle_time > 0 and abs(value - self.output) > self.band / 2:
+            if self.drift_side != side:
+                self.drift_side, self.drift_since = side, now
+            elif now - self.drift_since >= self.settle_time:
+                return self._emit(value)
+        else:
+            self.drift_side, self.drift_since = 0, None
+        
+        self.held += 1
+        return None
+    
+    def _emit(self, value):
+        self.output = value
+        self.drift_side, self.drift_since = 0, None
+        return value
+
+class MinIntervalGate:
+    """限制两次亮度变化之间的最短时间，期间只保留最新的待定值"""
+    
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self.last_change = None
+        self.pending = None
+        self.deferred = 0
+    
+    def process(self, value, now):
+        if value is not None:
+            if self.pending is not None:
+                self.deferred += 1
+            self.pending = value
+        if self.pending is None:
+            return None
+        if self.last_change is not None and now - self.last_change < self.min_interval:
+            return None
+        value, self.pending = self.pending, None
+        self.last_change = now
+        return value
+
+class SignalPipeline:
+    """传感器读数滤波流水线：中值 → EMA → 迟滞 → 最短间隔
+    
+    process 返回新的目标亮度；读数不足以引起调节时返回 None。
+    """
+    
+    def __init__(self, config, clock=time.monotonic):
+        self.clock = clock
+        self.stages = []
+        self.configure(config)
+        self.reset_stats()
+    
+    def configure(self, config):
+        """按配置更新各级滤波
+        
+        已有的级原地修改参数并保留内部状态（EMA 当前值、迟滞输出、待定值），
+        只有新增的级或中值窗口大小变化时才新建。
+        """
+        old = {type(stage): stage for stage in self.stages}
+        stages = []
+        median_window = config.get('filter_median_window', 3)
+        if median_window > 1:
+            median = old.get(MedianFilter)
+            if median is None or median.buffer.size != median_window:
+                median = MedianFilter(median_window)
+            stages.append(median)
+        ema_alpha = config.get('filter_ema_alpha', 0.5)
+        if ema_alpha < 1:
+            ema = old.get(EmaFilter) or EmaFilter(ema_alpha)
+            ema.alpha = ema_alpha
+            stages.append(ema)
+        settle_time = config.get('filter_settle_time', 30)
+        hysteresis = old.get(HysteresisFilter) or HysteresisFilter(config['threshold'], settle_time)
+        hysteresis.band, hysteresis.settle_time = config['threshold'], settle_time
+        stages.append(hysteresis)
+        min_interval = config.get('min_change_interval', 1)
+        gate = old.get(MinIntervalGate) or MinIntervalGate(min_interval)
+        gate.min_interval = min_interval
+        stages.append(gate)
+        self.stages = stages
+    
+    def reset_stats(self):
+        """清零各级计数"""
+        self.samples = 0
+        self.changes = 0
+        for stage in self.stages:
+            for counter in ('rejected', 'held', 'deferred'):
+                if hasattr(stage, counter):
+                    setattr(stage, counter, 0)
+    
+    def process(self, value):
+        """输入一个读数"""
+        now = self.clock()
+        self.samples += 1
+        for stage in self.stages:
+            value = stage.process(value, now)
+        if value is not None:
+            self.changes += 1
+        return value
+    
+    def stage(self, cls):
+        """按类型查找某一级滤波"""
+        return next((s for s in self.stages if isinstance(s, cls)), None)
+    
+    def summary(self):
+        """各级过滤计数"""
+        parts = [f"采样 {self.samples}", f"调节 {self.changes}"]
+        median = self.stage(MedianFilter)
+        if median:
+            parts.append(f"中值替换 {median.rejected}")
+        parts.append(f"迟滞 {self.stage(HysteresisFilter).held}")
+        parts.append(f"合并 {self.stage(MinIntervalGate).deferred}")
+        return " / ".join(parts)
+
+class ResponseCurve:
+    """环境亮度 → 屏幕亮度映射曲线
+    
+    配置变化时编译成查找表，每个读数只需一次下标访问。
+    - gamma：输入为光照百分比，输出 = 100 × (输入/100)^gamma
+    - points：输入为光照百分比，按控制点分段线性插值
+    - log_lux：输入为 Lux，按对数刻度映射到 0-100 后再应用 gamma；
+      查找表按 log10(Lux) 等分，暗处与亮处的分辨率相同，表的大小与 Lux 范围无关
+    """
+    
+    PERCENT_RESOLUTION = 10  # 百分比输入每 0.1% 一格
+    LUX_ENTRIES = 4096  # 对数刻度上的表项数
+    
+    def __init__(self, config):
+        self.mode = config.get('curve_mode', 'gamma')
+        self.gamma = max(0.1, config.get('curve_gamma', 1.0))
+        self.points = sorted((float(x), float(y)) for x, y in config.get('curve_points', [[0, 0], [100, 100]]))
+        self.lux_min = max(0.1, config.get('curve_lux_min', 1))
+        self.lux_max = max(self.lux_min + 1, config.get('curve_lux_max', 10000))
+        self.needs_lux = self.mode == 'log_lux'
+        self.compile()
+    
+    def shape(self, x):
+        """未查表的映射函数，x 为百分比或 Lux"""
+        if self.mode == 'log_lux':
+            lux = min(max(x, self.lux_min), self.lux_max)
+            t = math.log10(lux / self.lux_min) / math.log10(self.lux_max / self.lux_min)
+            return 100 * t ** self.gamma
+        if self.mode == 'points' and len(self.points) >= 2:
+            points = self.points
+            if x <= points[0][0]:
+                return points[0][1]
+            for (x0, y0), (x1, y1) in zip(points, points[1:]):
+                if x <= x1:
+                    return y0 if x1 == x0 else y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+            return points[-1][1]
+        return 100 * (min(max(x, 0), 100) / 100) ** self.gamma
+    
+    def compile(self):
+        """生成查找表"""
+        if self.needs_lux:
+            # 第 i 项对应 log10(Lux) = log_min + i / scale
+            self.log_min = math.log10(self.lux_min)
+            size = self.LUX_ENTRIES
+            self.scale = (size - 1) / math.log10(self.lux_max / self.lux_min)
+            self.table = array('f', (self.shape(10 ** (self.log_min + i / self.scale)) for i in range(size)))
+        else:
+            self.scale = self.PERCENT_RESOLUTION
+            size = 100 * self.scale + 1
+            self.table = array('f', (self.shape(i / self.scale) for i in range(size)))
+        self.last_index = size - 1
+    
+    def __call__(self, x):
+        if self.needs_lux:
+            # 0 Lux 及以下按最暗处理
+            x = math.log10(x) - self.log_min if x > 0 else -1.0
+        index = int(x * self.scale + 0.5)
+        if index < 0:
+            index = 0
+        elif index > self.last_index:
+            index = self.last_index
+        return self.table[index]
+
+class SensorFusion:
+    """多传感器并发读取与融合
+    
+    所有传感器同时请求，每个传感器有独立超时，一轮耗时约等于最慢的正常传感器。
+    本轮失败的传感器在 stale_after 秒内沿用上次读数，之后不再参与融合。
+    每个传感器使用独立的客户端，离线传感器重建连接不影响其他传感器的 keep-alive。
+    """
+    
+    def __init__(self, config):
+        self.executor = None
+        self.workers = 0
+        self.clients = {}  # url -> SensorClient
+        self.state = {}  # url -> {'value', 'time', 'latency', 'errors'}
+        self.configure(config)
+    
+    def configure(self, config):
+        """读取传感器列表与融合参数"""
+        self.sensors = [
+            {'url': s['url'], 'weight': s.get('weight', 1.0), 'timeout': s.get('timeout', 1.5)}
+            for s in config.get('sensors', []) if s.get('url')
+        ]
+        self.method = config.get('fusion_method', 'weighted_mean')
+        self.outlier = config.get('fusion_outlier', 20)
+        self.stale_after = config.get('sensor_stale_after', 30)
+        # 多留一倍线程，上一轮超时未返回的请求不会占住本轮；传感器数量不变时沿用线程池
+        workers = max(1, 2 * len(self.sensors))
+        if workers != self.workers:
+            if self.executor:
+                self.executor.shutdown(wait=False)
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sensor")
+            self.workers = workers
+        # 不再使用的传感器不保留旧读数和连接
+        urls = {sensor['url'] for sensor in self.sensors}
+        self.state = {url: state for url, state in self.state.items() if url in urls}
+        dns_ttl = config.get('dns_cache_ttl', 300)
+        clients = {}
+        for url in urls:
+            clients[url] = self.clients.pop(url, None) or SensorClient(dns_ttl=dns_ttl, pool_size=2)
+            clients[url].dns_ttl = dns_ttl
+        for client in self.clients.values():
+            client.close()
+        self.clients = clients
+        self.last_info = ""
+    
+    def close(self):
+        """关闭线程池和所有连接"""
+        if self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+            self.workers = 0
+        for client in self.clients.values():
+            client.close()
+        self.clients = {}
+    
+    @staticmethod
+    def _fetch(client, sensor):
+        start = time.perf_counter()
+        # 指定超时时客户端不做内部重试，离线传感器最多占用一个工作线程一个超时
+        data = client.get_json(sensor['url'], timeout=sensor['timeout'])
+        return float(data['value']), time.perf_counter() - start
+    
+    async def _read_one(self, sensor):
+        """读取单个传感器，只等到自己的超时为止"""
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, self._fetch, self.clients[sensor['url']], sensor)
+        return await asyncio.wait_for(future, sensor['timeout'])
+    
+    async def read(self):
+        """并发读取所有传感器并返回融合值，全部不可用时返回 None"""
+        now = time.monotonic()
+        results = await asyncio.gather(*(self._read_one(s) for s in self.sensors),
+                                       return_exceptions=True)
+        
+        samples = []
+        slowest = 0.0
+        for sensor, result in zip(self.sensors, results):
+            state = self.state.setdefault(sensor['url'], {'value': None, 'time': None, 'latency': None, 'errors': 0})
+            if not isinstance(result, BaseException):
+                value, latency = result
+                state.update(value=value, time=now, latency=latency)
+                slowest = max(slowest, latency)
+            else:
+                state['errors'] += 1
+            if state['time'] is not None and now - state['time'] <= self.stale_after:
+                samples.append((state['value'], sensor['weight']))
+        
+        samples = self.reject_outliers(samples)
+        value = self.fuse(samples)
+        self.last_info = (f"{len(samples)}/{len(self.sensors)} 个传感器 [{self.method}]"
+                          f" 最慢 {slowest * 1000:.0f}ms")
+        return value
+    
+    def reject_outliers(self, samples):
+        """剔除与中位数相差超过 outlier 的读数（至少 3 个读数时）"""
+        if len(samples) < 3 or self.outlier <= 0:
+            return samples
+        median = statistics.median(v for v, _ in samples)
+        return [(v, w) for v, w in samples if abs(v - median) <= self.outlier]
+    
+    def fuse(self, samples):
+        """按融合方式合并读数"""
+        if not samples:
+            return None
+        values = [v for v, _ in samples]
+        if self.method == 'median':
+            return statistics.median(values)
+        if self.method == 'max':
+            return max(values)
+        total = sum(w for _, w in samples)
+        if total <= 0:
+            return statistics.fmean(values)
+        return sum(v * w for v, w in samples) / total
+
+class MonitorDispatcher:
+    """多显示器亮度下发
+    
+    每台显示器由全局目标亮度换算出自己的亮度（偏移或控制点曲线），
+    只向数值有变化的显示器并行下发，总耗时接近单台显示器的耗时。
+    """
     
     def __init__(self, config):
+        self.configure(config)
+    
+    def configure(self, config):
+        """读取显示器列表"""
+        self.monitors = []
+        for monitor in config.get('monitors', []):
+            points = monitor.get('points')
+            curve = ResponseCurve({'curve_mode': 'points', 'curve_points': points}) if points else None
+            self.monitors.append({
+                'id': str(monitor['id']),
+                'offset': monitor.get('offset', 0),
+                'curve': curve,
+                'min': monitor.get('min', config['min_brightness']),
+                'max': monitor.get('max', config['max_brightness']),
+            })
+        # 保留仍在列表中的显示器的已设置亮度，未变化的显示器不会被重新下发
+        ids = {monitor['id'] for monitor in self.monitors}
+        self.applied = {mid: v for mid, v in getattr(self, 'applied', {}).items() if mid in ids}
+        self.last_info = ""
+    
+    def pending_count(self, level):
+        """设置为 level 时需要下发命令的显示器数"""
+        return sum(1 for mid, v in self.levels_for(level).items() if self.applied.get(mid) != v)
+    
+    def levels_for(self, level):
+        """全局亮度换算为各显示器亮度"""
+        levels = {}
+        for monitor in self.monitors:
+            value = monitor['curve'](level) if monitor['curve'] else level + monitor['offset']
+            levels[monitor['id']] = int(round(max(monitor['min'], min(monitor['max'], value))))
+        return levels
+    
+    async def apply(self, backend, level):
+        """并行设置有变化的显示器，任一失败时抛出异常（失败的显示器下次重试）"""
+        changed = {mid: v for mid, v in self.levels_for(level).items() if self.applied.get(mid) != v}
+        results = await asyncio.gather(*(backend.apply_async(v, mid) for mid, v in changed.items()),
+                                       return_exceptions=True)
+        
+        error = None
+        for (mid, value), result in zip(changed.items(), results):
+            if isinstance(result, Exception):
+                self.applied.pop(mid, None)
+                error = error or result
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                self.applied[mid] = value
+        self.last_info = f"{len(changed)}/{len(self.monitors)} 台显示器"
+        if error:
+            raise error
+    
+    def invalidate(self):
+        """清空已下发记录，下次全部重新设置"""
+        self.applied = {}
+
+class BrightnessReadback:
+    """显示器实际亮度缓存
+    
+    每隔 readback_interval 秒通过后端读回一次显示器的实际亮度，成功设置后按写入值
+    更新。计划设置的亮度与缓存相同时不再下发命令（DDC/CI 每次写入都是一次缓慢的
+    I²C 事务）。超过一个间隔没有更新的记录视为未知；间隔为 0 时关闭。
+    """
+    
+    def __init__(self, config, clock=time.monotonic):
+        self.clock = clock
+        self.values = {}  # 显示器 (None 为全部) -> (亮度, 更新时间)
+        self.last_refresh = None
+        self.configure(config)
+    
+    def configure(self, config):
+        """读取读回间隔"""
+        self.interval = max(0, config.get('readback_interval', 60))
+    
+    def due(self):
+        """是否到了读回时间"""
+        return self.interval > 0 and (self.last_refresh is None
+                                      or self.clock() - self.last_refresh >= self.interval)
+    
+    def mark_refreshed(self):
+        self.last_refresh = self.clock()
+    
+    def get(self, display=None):
+        """缓存中的亮度，未知或已过期时返回 None"""
+        entry = self.values.get(display)
+        if self.interval <= 0 or entry is None or self.clock() - entry[1] > self.interval:
+            return None
+        return entry[0]
+    
+    def store(self, display, level):
+        """记录显示器当前亮度（读回或成功写入）"""
+        self.values[display] = (level, self.clock())
+    
+    def invalidate(self):
+        """更换后端后清空缓存"""
+        self.values = {}
+        self.last_refresh = None
+
+class BrightnessController:
+    """亮度控制器
+    
+    传感器读取、亮度过渡、定时等待和后端调用都是同一个事件循环中的任务，
+    事件循环运行在独立线程中；界面线程只能通过 start / stop / reload_config
+    与之交互，这些方法把操作投递到事件循环中执行。
+    """
+    
+    def __init__(self, config, clock=time.monotonic):
         self.config = config
+        # 滤波、过渡、断路器等按此时钟计时，回放时替换为虚拟时钟
+        self.clock = clock
         self.running = False
         self.thread = None
+        self.loop = None
+        self.main_task = None
+        # requests 为阻塞调用，HTTP 读取放到少量工作线程中，由事件循环等待结果
+        self.io_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="sensor-io")
         self.last_brightness = -1
         self.status_callback = None
         self.current_sensor_value = None
         self.current_screen_value = None
+        self.sensor_client = SensorClient(dns_ttl=config.get('dns_cache_ttl', 300))
+        self.push_source = None
+        self.push_fallback = False
+        self.source_info = ""
+        self.current_lux = None
+        self.current_voltage = None
+        self.backend = create_backend(config)
+        self.last_apply_time = None
+        self.transition = TransitionEngine(self._set_brightness_direct, clock)
+        self.transition.configure(config)
+        self.transition.on_ramp_done = self.ramp_done
+        self.transition.on_count = lambda name: self.metrics.inc(name)
+        # 多显示器时一帧并行下发多条命令，按条数取令牌
+        self.transition.command_cost = lambda level: self.monitors.pending_count(level) if self.monitors.monitors else 1
+        self.poller = AdaptivePoller(config)
+        self.breaker = SensorBreaker(config, clock)
+        # 断路期间最后一次下发的回落亮度
+        self.fallback_applied = None
+        self.pipeline = SignalPipeline(config, clock)
+        self.curve = ResponseCurve(config)
+        self.fusion = SensorFusion(config) if config.get('sensors') else None
+        self.monitors = MonitorDispatcher(config)
+        self.readback = BrightnessReadback(config, clock)
+        self.history = self.open_history(config)
+        self.history_flush = None
+        self.history_task = None
+        self.apply_count = 0
+        self.stats_since = self.clock()
+        self.hourly_summary = ""
+        self.wake_event = None
+        self.metrics = self.create_metrics()
+        self.metrics_server = None
+        self.metrics_port = None
+        self.metrics_failed_port = None
+        self.relay = None
+        self.relay_key = None
+        self.relay_failed_key = None
+        # 本轮采样开始时刻；第一个超出阈值的读数的采样时刻（滤波尚未放行）；
+        # 已触发调节、等待最终目标送达的起始时刻
+        self.sample_start = None
+        self.reaction_start = None
+        self.pending_sample = None
+        self.adjust_status = ""
+        self.poll_status = ""
         
+    @staticmethod
+    def create_metrics():
+        """注册控制循环各环节的耗时直方图与计数器"""
+        metrics = Metrics()
+        metrics.histogram('sensor_read', "传感器读取总耗时")
+        metrics.histogram('sensor_resolve', "传感器主机名解析耗时")
+        metrics.histogram('sensor_connect', "传感器 TCP 建连耗时")
+        metrics.histogram('sensor_request', "传感器 HTTP 响应耗时")
+        metrics.histogram('sensor_parse', "传感器 JSON 解析耗时")
+        metrics.histogram('backend_apply', "亮度后端单次设置耗时")
+        metrics.histogram('backend_read', "亮度后端读回实际亮度的耗时")
+        metrics.histogram('transition', "平滑过渡从开始到完成的耗时")
+        metrics.histogram('reaction', "从读数超出阈值到最终目标亮度送达的耗时（含滤波与过渡）")
+        metrics.counter('sensor_errors', "传感器读取失败次数")
+        metrics.counter('breaker_trips', "传感器断路次数")
+        metrics.counter('apply_errors', "亮度设置失败次数")
+        metrics.counter('apply_skipped', "显示器已是目标亮度而省去的设置次数")
+        metrics.counter('external_changes', "读回发现亮度被其他程序修改的次数")
+        metrics.counter('commands_dropped', "超出每秒命令预算而推迟的亮度命令次数")
+        metrics.counter('commands_merged', "等待命令预算期间被更新目标替换的亮度命令次数")
+        metrics.counter('adjustments', "触发的亮度调节次数")
+        metrics.counter('adjustments_skipped', "滤波后无需调节的读数次数")
+        return metrics
+    
+    def metrics_summary(self):
+        """主窗口显示的耗时摘要"""
+        m = self.metrics
+        return (f"{m.format_quantiles('sensor_read', '读取')} / {m.format_quantiles('backend_apply', '设置')}\n"
+                f"{m.format_quantiles('reaction', '反应')} / 错误: 传感器 {m.value('sensor_errors')}"
+                f" 设置 {m.value('apply_errors')} / 调节 {m.value('adjustments')}"
+                f" 跳过 {m.value('adjustments_skipped')} / 命令限速 {m.value('commands_dropped')}"
+                f" 合并 {m.value('commands_merged')}"
+                + (f"\n{self.hourly_summary}" if self.hourly_summary else ""))
+    
+    @staticmethod
+    def open_history(config):
+        """按配置打开历史记录，未启用或无法打开时返回 None"""
+        if not config.get('history_enabled', True):
+            return None
+        try:
+            return HistoryStore(HISTORY_DIR, max_bytes=int(config.get('history_max_mb', 16) * 1024 * 1024))
+        except (OSError, ValueError) as e:
+            log.warning("打开历史记录失败: %s", e)
+            return None
+    
+    def schedule_history_flush(self):
+        """历史记录到了写盘时间时在工作线程中写盘，msync 不阻塞事件循环；上次写盘未完成时跳过"""
+        if not self.history or not self.history.flush_due():
+            return
+        if self.history_flush and not self.history_flush.done():
+            return
+        self.history_flush = self.loop.run_in_executor(self.io_executor, self.history.flush)
+        self.history_flush.add_done_callback(self.history_flushed)
+    
+    @staticmethod
+    def history_flushed(future):
+        """写盘在工作线程中失败时只记录，不影响控制循环"""
+        if not future.cancelled() and future.exception():
+            log.warning("写入历史记录失败: %s", future.exception())
+    
+    async def reopen_history(self, config):
+        """在工作线程中关闭旧的历史记录并按新配置重新打开，旧记录写完后才打开同一分段文件"""
+        history, self.history = self.history, None
+        self.history_flush = None
+        if history:
+            try:
+                await self.loop.run_in_executor(self.io_executor, history.close)
+            except OSError as e:
+                log.warning("关闭历史记录失败: %s", e)
+        self.history = await self.loop.run_in_executor(self.io_executor, self.open_history, config)
+    
     def set_status_callback(self, callback):
         """设置状态更新回调"""
         self.status_callback = callback
@@ -151,23 +1769,99 @@ class BrightnessController:
         if self.status_callback:
             self.status_callback(message)
     
-    def get_sensor_value(self):
+    async def run_io(self, func, *args):
+        """在工作线程中执行阻塞的 HTTP 调用，超时包含客户端内部的一次重连"""
+        future = self.loop.run_in_executor(self.io_executor, func, *args)
+        return await asyncio.wait_for(future, 2 * self.sensor_client.timeout + 1)
+    
+    async def get_sensor_value(self):
+        """经断路器读取传感器，断开期间直接返回 None"""
+        if not self.breaker.allow():
+            return None
+        val = await self.read_sensor()
+        if val is not None:
+            if self.breaker.record_success():
+                self.fallback_applied = None
+                # 恢复后的第一个读数无论大小都按读数调节一次
+                self.pipeline.stage(HysteresisFilter).output = None
+                self.update_status("传感器已恢复")
+        elif self.breaker.record_failure():
+            self.metrics.inc('breaker_trips')
+            if self.breaker.trips == 1:
+                self.fallback_applied = self.last_brightness if self.last_brightness >= 0 else None
+                self.update_status(f"传感器连续失败 {self.breaker.failures} 次，"
+                                   f"暂停读取，{self.breaker.retry_in():.0f} 秒后重试")
+            else:
+                self.update_status(f"传感器仍不可用，{self.breaker.retry_in():.0f} 秒后重试")
+        return val
+    
+    def sensor_url(self):
+        """本轮读取的传感器地址：订阅的中继组播中断时读取中继的 HTTP 接口，不直接访问 ESP32"""
+        url = self.config['sensor_url']
+        source = self.push_source
+        if self.push_fallback and isinstance(source, RelaySubscriber) and source.relay_url:
+            return source.relay_url + urlsplit(url).path
+        return url
+    
+    async def read_sensor(self):
         """获取传感器数据"""
+        if self.fusion:
+            return await self.get_fused_value()
+        self.sample_start = time.perf_counter()
         try:
-            response = requests.get(self.config['sensor_url'], timeout=3)
-            response.raise_for_status()
-            data = response.json()
+            data = await self.run_io(self.sensor_client.get_json, self.sensor_url())
+            self.metrics.observe('sensor_read', time.perf_counter() - self.sample_start)
+            for stage, seconds in self.sensor_client.last_timing.items():
+                self.metrics.observe(f'sensor_{stage}', seconds)
             
             if 'value' in data:
                 val = float(data['value'])
                 self.current_sensor_value = val
+                self.current_lux = await self.get_lux_value() if self.curve.needs_lux else None
+                self.current_voltage = None
+                self.source_info = self.sensor_client.format_timing()
                 return val
+        except asyncio.TimeoutError:
+            self.metrics.inc('sensor_errors')
+            self.update_status("传感器错误: 请求超时")
+            return None
         except Exception as e:
+            self.metrics.inc('sensor_errors')
             self.update_status(f"传感器错误: {str(e)[:50]}")
             return None
+        self.metrics.inc('sensor_errors')
         return None
     
-    def set_screen_brightness(self, level, smooth=None):
+    async def get_fused_value(self):
+        """并发读取多个传感器并融合"""
+        self.sample_start = time.perf_counter()
+        val = await self.fusion.read()
+        self.metrics.observe('sensor_read', time.perf_counter() - self.sample_start)
+        self.source_info = self.fusion.last_info
+        if val is None:
+            self.metrics.inc('sensor_errors')
+            self.update_status(f"传感器错误: 所有传感器均不可用 ({self.fusion.last_info})")
+            return None
+        self.current_sensor_value = val
+        self.current_lux = await self.get_lux_value() if self.curve.needs_lux else None
+        self.current_voltage = None
+        return val
+    
+    async def get_lux_value(self):
+        """从同一传感器获取 Lux 实体（复用连接池中的连接）"""
+        base, _, _ = self.sensor_url().rstrip('/').rpartition('/')
+        try:
+            data = await self.run_io(self.sensor_client.get_json,
+                                     f"{base}/{self.config.get('lux_entity', 'temt6000_lux')}")
+            return float(data['value'])
+        except asyncio.TimeoutError:
+            self.update_status("Lux 读取错误: 请求超时")
+            return None
+        except Exception as e:
+            self.update_status(f"Lux 读取错误: {str(e)[:50]}")
+            return None
+    
+    async def set_screen_brightness(self, level, smooth=None):
         """设置屏幕亮度"""
         safe_level = max(self.config['min_brightness'], 
                         min(self.config['max_brightness'], level))
@@ -177,113 +1871,569 @@ class BrightnessController:
         use_smooth = smooth if smooth is not None else self.config.get('smooth_transition', True)
         
         if use_smooth and self.last_brightness >= 0:
-            # 平滑过渡
+            # 平滑过渡，送达时由 ramp_done 记录反应时间
             return self._smooth_transition(safe_level)
         else:
-            # 直接设置
-            return self._set_brightness_direct(safe_level)
+            # 直接设置（被更新的目标合并时也返回 True，但没有送达）
+            ok = await self.transition.apply_now(safe_level)
+            if ok and self.transition.applied == safe_level:
+                self.observe_reaction()
+            return ok
+    
+    def ramp_done(self, seconds):
+        """平滑过渡完成"""
+        self.metrics.observe('transition', seconds)
+        self.observe_reaction()
     
-    def _set_brightness_direct(self, level):
+    def observe_reaction(self):
+        """最终目标已送达，记录反应时间"""
+        if self.pending_sample is not None:
+            self.metrics.observe('reaction', time.perf_counter() - self.pending_sample)
+            self.pending_sample = None
+    
+    async def _set_brightness_direct(self, level):
         """直接设置亮度（无过渡）"""
-        cmd = [self.config['tt_path'], "--All", f"--Set={level}"]
-        
+        if not self.monitors.monitors and self.readback.get() == level:
+            # 显示器已是这个亮度，不下发命令
+            self.metrics.inc('apply_skipped')
+            self.current_screen_value = level
+            return True
         try:
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            subprocess.run(cmd, startupinfo=startupinfo, timeout=2)
+            start = time.perf_counter()
+            if self.monitors.monitors:
+                await self.monitors.apply(self.backend, level)
+            else:
+                await self.backend.apply_async(level)
+                self.readback.store(None, level)
+            self.last_apply_time = time.perf_counter() - start
+            self.metrics.observe('backend_apply', self.last_apply_time)
+            self.apply_count += 1
             self.current_screen_value = level
             return True
         except FileNotFoundError:
-            self.update_status("错误: 找不到 Twinkle Tray")
+            self.metrics.inc('apply_errors')
+            self.update_status(f"错误: 找不到 {self.backend.name}")
             return False
         except Exception as e:
+            self.metrics.inc('apply_errors')
             self.update_status(f"亮度设置错误: {str(e)[:30]}")
             return False
     
+    async def read_display(self, display):
+        """在工作线程中读回一台显示器的亮度"""
+        start = time.perf_counter()
+        future = self.loop.run_in_executor(self.io_executor, self.backend.read, display)
+        level = await asyncio.wait_for(future, 10)
+        self.metrics.observe('backend_read', time.perf_counter() - start)
+        return level
+    
+    async def refresh_readback(self):
+        """到期时读回各显示器的实际亮度
+        
+        与记录的亮度不符说明被用户或其他程序修改过：之后以实际亮度为准，
+        下次调节会照常下发，过渡也从实际亮度开始。
+        """
+        if not self.readback.due() or self.transition.active:
+            return
+        self.readback.mark_refreshed()
+        displays = [monitor['id'] for monitor in self.monitors.monitors] or [None]
+        results = await asyncio.gather(*(self.read_display(d) for d in displays), return_exceptions=True)
+        for display, level in zip(displays, results):
+            if isinstance(level, BaseException) and not isinstance(level, Exception):
+                raise level
+            # 后端不支持读回或读取失败时不影响设置
+            if level is None or isinstance(level, Exception):
+                continue
+            self.readback.store(display, level)
+            if display is None:
+                known = self.transition.applied
+                self.transition.applied = level
+            else:
+                known = self.monitors.applied.get(display)
+                self.monitors.applied[display] = level
+            if known is not None and known != level:
+                self.metrics.inc('external_changes')
+                self.update_status(f"亮度已被外部修改为 {level}%" + (f" (显示器 {display})" if display else ""))
+    
     def _smooth_transition(self, target_level):
-        """平滑过渡到目标亮度"""
-        current = int(self.last_brightness)
-        step = self.config.get('transition_step', 2)
-        delay = self.config.get('transition_delay', 0.05)
-        
-        if current == target_level:
-            return True
-        
-        # 计算步进方向
-        direction = 1 if target_level > current else -1
-        
-        # 逐步调整
-        while abs(target_level - current) > 0:
-            if not self.running:  # 如果服务停止，中断过渡
-                break
-            
-            # 计算下一步的值
-            remaining = abs(target_level - current)
-            if remaining <= step:
-                current = target_level
+        """平滑过渡到目标亮度（交给过渡引擎，立即返回）"""
+        self.transition.set_target(target_level)
+        return True
+    
+    def push_source_key(self):
+        """当前配置对应的推送数据源标识，HTTP 轮询时为 None"""
+        source = self.config.get('sensor_source', 'http')
+        if source == 'udp':
+            return ('udp', self.config.get('udp_port', 8888))
+        if source == 'sse':
+            return ('sse', self.config['sensor_url'])
+        # 本机就是中继时直接读取传感器，不订阅自己
+        if source == 'relay' and not self.config.get('relay_enabled', False):
+            return ('relay', self.config.get('relay_group', DEFAULT_GROUP),
+                    self.config.get('relay_group_port', DEFAULT_GROUP_PORT))
+        return None
+    
+    async def sync_push_source(self):
+        """根据配置启动或停止推送数据源"""
+        key = self.push_source_key()
+        
+        if self.push_source and self.push_source.key != key:
+            self.push_source.stop()
+            self.push_source = None
+        
+        if key and not self.push_source:
+            if key[0] == 'udp':
+                source = UdpSensorListener(key[1])
+            elif key[0] == 'relay':
+                source = RelaySubscriber(key[1], key[2], self.config.get('relay_max_age', 10))
             else:
-                current += direction * step
-            
-            # 设置亮度
-            if not self._set_brightness_direct(current):
-                return False
-            
-            # 如果还没到目标值，短暂延迟
-            if current != target_level:
-                time.sleep(delay)
+                source = SseSensorStream(self.sensor_client, key[1])
+            try:
+                await source.start()
+            except OSError as e:
+                self.update_status(f"{source.label}启动失败: {str(e)[:30]}")
+                return
+            self.push_source = source
+            self.push_fallback = False
+    
+    async def wait_push_value(self):
+        """等待推送数据，长时间无数据时回退到 HTTP 轮询"""
+        source = self.push_source
+        if isinstance(source, UdpSensorListener):
+            push_timeout = self.config.get('udp_timeout', 5)
+        else:
+            push_timeout = self.config.get('sse_timeout', 15)
+        timeout = self.config['interval'] if self.push_fallback else push_timeout
         
-        return True
+        val = await source.get(timeout)
+        if not self.running:
+            return None
+        if val is not None or source.packet_age() < push_timeout:
+            if self.push_fallback:
+                self.push_fallback = False
+                self.update_status(f"{source.label}已恢复")
+            if val is not None:
+                self.sample_start = time.perf_counter()
+                self.current_sensor_value = val
+                self.current_lux = source.readings.get(self.config.get('lux_entity', 'temt6000_lux'))
+                self.current_voltage = source.readings.get('temt6000_voltage')
+                self.source_info = f"{source.label} ({source.latest_source})"
+            return val
+        
+        if not self.push_fallback:
+            self.push_fallback = True
+            self.update_status(f"{source.label}无数据，回退到 HTTP 轮询")
+        via_relay = self.sensor_url() != self.config['sensor_url']
+        errors = self.metrics.value('sensor_errors')
+        val = await self.get_sensor_value()
+        if via_relay and self.metrics.value('sensor_errors') > errors:
+            # 中继的 HTTP 接口也不可用（中继已离线），之后直接读取传感器，收到组播时重新发现中继
+            source.relay_url = None
+            self.update_status("中继离线，回退到直接读取传感器")
+        return val
+    
+    async def apply_sensor_value(self, sensor_val):
+        """根据传感器读数调整亮度"""
+        self.log_hourly_stats()
+        if self.curve.needs_lux:
+            if self.current_lux is None:
+                return
+            mapped = self.curve(self.current_lux)
+        else:
+            mapped = self.curve(sensor_val)
+        # 反应时间从第一个超出阈值的读数算起，中值、EMA 和最短间隔造成的延迟都计算在内
+        held = self.pipeline.stage(HysteresisFilter).output
+        crossed = held is not None and abs(mapped - held) > self.config['threshold']
+        if crossed and self.reaction_start is None:
+            self.reaction_start = self.sample_start or time.perf_counter()
+        target_brightness = self.pipeline.process(mapped)
+        if target_brightness is not None:
+            if self.pending_sample is None:
+                self.pending_sample = self.reaction_start or self.sample_start or time.perf_counter()
+            self.reaction_start = None
+        elif not crossed and self.pipeline.stage(MinIntervalGate).pending is None:
+            # 超出阈值的只是被滤掉的尖峰
+            self.reaction_start = None
+        
+        # 滤波后仍有足够变化时才调整
+        if target_brightness is None:
+            self.metrics.inc('adjustments_skipped')
+        else:
+            self.metrics.inc('adjustments')
+            if not await self.set_screen_brightness(target_brightness):
+                # 设置失败，下次读数重新尝试
+                self.pipeline.stage(HysteresisFilter).output = None
+            else:
+                self.last_brightness = target_brightness
+                mode = "平滑" if self.config.get('smooth_transition', True) else "直接"
+                extra = ""
+                if self.current_lux is not None:
+                    extra += f" {self.current_lux:.0f} lx"
+                if self.current_voltage is not None:
+                    extra += f" {self.current_voltage:.3f} V"
+                apply_info = ""
+                if self.last_apply_time is not None:
+                    apply_info = f" / {self.backend.name} {self.last_apply_time * 1000:.0f}ms"
+                if self.monitors.monitors:
+                    apply_info += f" ({self.monitors.last_info})"
+                self.adjust_status = (f"环境: {sensor_val:.1f}%{extra} → 屏幕: {int(target_brightness)}% [{mode}]\n"
+                                      f"{self.source_info}{apply_info}\n"
+                                      f"{self.pipeline.summary()} / 亮度命令 {self.apply_count}")
+                self.update_status((self.adjust_status + self.poll_status).strip())
+        
+        if self.history:
+            target = self.last_brightness if self.last_brightness >= 0 else None
+            self.history.append(time.time(), sensor_val, target, self.transition.applied)
+    
+    async def apply_fallback(self):
+        """传感器断开期间按回落曲线设置亮度，每变化一个灵敏度阈值才下发一次"""
+        last_level = self.last_brightness if self.last_brightness >= 0 else None
+        level = int(round(self.breaker.fallback_level(last_level)))
+        if level == self.fallback_applied:
+            return
+        if (self.fallback_applied is not None and level != self.breaker.fallback
+                and abs(level - self.fallback_applied) < self.config['threshold']):
+            return
+        if await self.set_screen_brightness(level):
+            self.fallback_applied = level
+            self.update_status(f"传感器{self.breaker.label}：亮度回落至 {level}%"
+                               f"（目标 {self.breaker.fallback}%），{self.breaker.retry_in():.0f} 秒后重试")
+    
+    def log_hourly_stats(self):
+        """每小时输出一次调节次数统计，便于比较滤波参数"""
+        elapsed = self.clock() - self.stats_since
+        if elapsed < 3600:
+            return
+        # 窗口版没有控制台：摘要同时显示在主窗口的耗时摘要中
+        self.hourly_summary = (f"过去 {elapsed / 3600:.1f} 小时: {self.pipeline.summary()}"
+                               f" / 亮度命令 {self.apply_count}")
+        log.info(self.hourly_summary)
+        self.pipeline.reset_stats()
+        self.apply_count = 0
+        self.stats_since = self.clock()
+    
+    def poll_delay(self, sensor_val):
+        """计算到下次 HTTP 轮询的等待时间"""
+        if self.breaker.state == SensorBreaker.OPEN:
+            # 断开期间按重试时间醒来，回落过程中至少每 interval_max 秒推进一次
+            return max(0.1, min(self.breaker.retry_in(), self.config.get('interval_max', 30)))
+        if not self.config.get('adaptive_interval', True) or not self.config.get('enabled', True):
+            delay = self.config['interval']
+        else:
+            old_kind = self.poller.reason.split()[0]
+            delay, reason = self.poller.next_interval(sensor_val)
+            self.poll_status = f"\n轮询间隔: {delay:.1f}s ({reason})"
+            # 原因类别变化时才刷新状态栏，避免每次轮询都重绘
+            if reason.split()[0] != old_kind:
+                self.update_status((self.adjust_status + self.poll_status).strip())
+        if self.relay:
+            # 中继只转发 relay_max_age 秒内的读数，光线稳定时也不能退避到超过它的一半
+            delay = min(delay, self.relay.max_age / 2)
+        return delay
+    
+    async def sleep(self, delay):
+        """等待 delay 秒，停止或配置变化时立即返回"""
+        try:
+            await asyncio.wait_for(self.wake_event.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+        self.wake_event.clear()
     
-    def run_loop(self):
+    async def run_loop(self):
         """主循环"""
         self.update_status("服务运行中...")
         
         while self.running:
-            if self.config.get('enabled', True):
-                sensor_val = self.get_sensor_value()
-                
+            await self.sync_push_source()
+            await self.sync_metrics_server()
+            await self.sync_relay()
+            
+            sensor_val = None
+            enabled = self.config.get('enabled', True)
+            # 中继为其他机器转发读数，暂停自动调节时也照常读取传感器
+            if enabled or self.relay:
+                if self.push_source:
+                    sensor_val = await self.wait_push_value()
+                else:
+                    sensor_val = await self.get_sensor_value()
+                if sensor_val is not None and self.relay:
+                    self.relay.publish(sensor_val, self.current_lux, self.current_voltage)
+            
+            if enabled:
                 if sensor_val is not None:
-                    target_brightness = sensor_val
-                    
-                    # 初次运行或超过阈值时调整
-                    if self.last_brightness < 0 or abs(target_brightness - self.last_brightness) > self.config['threshold']:
-                        if self.set_screen_brightness(target_brightness):
-                            self.last_brightness = target_brightness
-                            mode = "平滑" if self.config.get('smooth_transition', True) else "直接"
-                            self.update_status(f"环境: {sensor_val:.1f}% → 屏幕: {int(target_brightness)}% [{mode}]")
+                    await self.apply_sensor_value(sensor_val)
+                elif self.breaker.state == SensorBreaker.OPEN:
+                    await self.apply_fallback()
+                # 调节之后再读回，不推迟本轮的亮度设置
+                await self.refresh_readback()
+                self.schedule_history_flush()
             
-            time.sleep(self.config['interval'])
+            # 推送模式下由数据到达驱动，无需固定休眠
+            if not enabled and not self.relay:
+                await self.sleep(self.config['interval'])
+            elif not self.push_source:
+                await self.sleep(self.poll_delay(sensor_val))
+    
+    async def sync_metrics_server(self):
+        """根据配置启动或关闭本机指标端点"""
+        port = self.config.get('metrics_port', 9731) if self.config.get('metrics_enabled', False) else None
+        if self.metrics_server and self.metrics_port != port:
+            await self.close_metrics_server()
+        # 端口被占用时不在每一轮都重试，改端口后再尝试
+        if port and not self.metrics_server and port != self.metrics_failed_port:
+            try:
+                self.metrics_server = await serve_metrics(self.metrics, port)
+            except OSError as e:
+                self.metrics_failed_port = port
+                self.update_status(f"指标端点启动失败: {str(e)[:30]}")
+                return
+            self.metrics_port = port
+    
+    async def sync_relay(self):
+        """根据配置启动或关闭局域网中继"""
+        key = None
+        if self.config.get('relay_enabled', False):
+            key = (self.config.get('relay_port', DEFAULT_HTTP_PORT),
+                   self.config.get('relay_group', DEFAULT_GROUP),
+                   self.config.get('relay_group_port', DEFAULT_GROUP_PORT),
+                   self.config.get('relay_max_age', 10))
+        if self.relay and self.relay_key != key:
+            await self.close_relay()
+        if key and not self.relay and key != self.relay_failed_key:
+            http_port, group, group_port, max_age = key
+            relay = SensorRelay(max_age=max_age, group=group, group_port=group_port, http_port=http_port)
+            try:
+                await relay.start()
+            except OSError as e:
+                self.relay_failed_key = key
+                self.update_status(f"中继启动失败: {str(e)[:30]}")
+                return
+            self.relay = relay
+            self.relay_key = key
+    
+    async def close_relay(self):
+        """关闭局域网中继"""
+        relay, self.relay = self.relay, None
+        self.relay_key = None
+        if relay:
+            await relay.close()
+    
+    async def close_metrics_server(self):
+        """关闭指标端点"""
+        server, self.metrics_server = self.metrics_server, None
+        self.metrics_port = None
+        if server:
+            server.close()
+            await server.wait_closed()
+    
+    async def _main(self):
+        """事件循环入口：运行主循环直到被取消，然后清理所有任务"""
+        self.main_task = asyncio.current_task()
+        self.wake_event = asyncio.Event()
+        self.transition.start()
+        try:
+            await self.run_loop()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await self.transition.stop()
+            await self.close_metrics_server()
+            await self.close_relay()
+            if self.history_task:
+                await self.history_task
+                self.history_task = None
+            if self.history:
+                try:
+                    await self.loop.run_in_executor(self.io_executor, self.history.flush)
+                except OSError as e:
+                    log.warning("写入历史记录失败: %s", e)
+            if self.push_source:
+                self.push_source.stop()
+                self.push_source = None
+            self.main_task = None
+            self.wake_event = None
+    
+    def _run_thread(self, loop):
+        """控制器线程：运行事件循环"""
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._main())
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            loop.close()
+    
+    def call_in_loop(self, func, *args):
+        """从其他线程把调用投递到事件循环，循环未运行时返回 False"""
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return False
+        try:
+            loop.call_soon_threadsafe(func, *args)
+        except RuntimeError:
+            return False
+        return True
+    
+    def _cancel(self):
+        """在事件循环中取消主任务（正在进行的请求、过渡和子进程随之取消）"""
+        if self.main_task:
+            self.main_task.cancel()
     
     def start(self):
         """启动服务"""
         if not self.running:
             self.running = True
-            self.thread = threading.Thread(target=self.run_loop, daemon=True)
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self._run_thread, args=(self.loop,),
+                                           name="controller", daemon=True)
             self.thread.start()
             self.update_status("服务已启动")
     
     def stop(self):
         """停止服务"""
         self.running = False
+        self.call_in_loop(self._cancel)
         if self.thread:
             self.thread.join(timeout=2)
         self.update_status("服务已停止")
     
     def reload_config(self, new_config):
-        """重新加载配置"""
+        """重新加载配置（可在任意线程调用，服务运行时在事件循环中生效）"""
+        if not self.call_in_loop(self._apply_config, new_config):
+            self._apply_config(new_config)
+    
+    def _apply_config(self, new_config):
+        """按变化的配置项更新各组件"""
+        if new_config.get('sensor_url') != self.config.get('sensor_url'):
+            self.sensor_client.invalidate()
+            # 换了传感器地址，立即按新地址读取
+            self.breaker.reset()
+            self.fallback_applied = None
+        self.breaker.configure(new_config)
+        self.sensor_client.dns_ttl = new_config.get('dns_cache_ttl', 300)
+        backend_keys = ('backend', 'tt_path', 'sysfs_path', 'ddcutil_path')
+        if any(new_config.get(k) != self.config.get(k) for k in backend_keys):
+            self.backend = create_backend(new_config)
+            self.monitors.invalidate()
+            self.readback.invalidate()
+        monitor_keys = ('monitors', 'min_brightness', 'max_brightness')
+        if any(new_config.get(k) != self.config.get(k) for k in monitor_keys):
+            self.monitors.configure(new_config)
+        self.transition.configure(new_config)
+        self.poller.configure(new_config)
+        self.readback.configure(new_config)
+        filter_keys = ('threshold', 'filter_median_window', 'filter_ema_alpha',
+                       'filter_settle_time', 'min_change_interval')
+        if any(new_config.get(k) != self.config.get(k) for k in filter_keys):
+            self.pipeline.configure(new_config)
+        curve_keys = ('curve_mode', 'curve_gamma', 'curve_points', 'curve_lux_min', 'curve_lux_max')
+        if any(new_config.get(k) != self.config.get(k) for k in curve_keys):
+            self.curve = ResponseCurve(new_config)
+        # 映射变化后即使读数不变也要按新映射调节一次，清除迟滞输出让下一个读数通过
+        if any(new_config.get(k) != self.config.get(k)
+               for k in curve_keys + ('min_brightness', 'max_brightness')):
+            self.pipeline.stage(HysteresisFilter).output = None
+        fusion_keys = ('sensors', 'fusion_method', 'fusion_outlier', 'sensor_stale_after', 'dns_cache_ttl')
+        if any(new_config.get(k) != self.config.get(k) for k in fusion_keys):
+            if not new_config.get('sensors'):
+                if self.fusion:
+                    self.fusion.close()
+                self.fusion = None
+            elif self.fusion:
+                self.fusion.configure(new_config)
+            else:
+                self.fusion = SensorFusion(new_config)
+        history_keys = ('history_enabled', 'history_max_mb')
+        if any(new_config.get(k) != self.config.get(k) for k in history_keys):
+            # 控制器运行时本方法在事件循环中执行，关闭与打开交给工作线程
+            if self.main_task:
+                self.history_task = self.loop.create_task(self.reopen_history(new_config))
+            else:
+                if self.history:
+                    self.history.close()
+                self.history = self.open_history(new_config)
         self.config = new_config
+        # 立即按新配置进入下一轮，而不是等完本次休眠
+        if self.wake_event is not None:
+            self.wake_event.set()
+
+class BackgroundProbes:
+    """界面使用的后台探测（PowerShell 查询、网络测试、显示器枚举）
+    
+    探测在少量工作线程中执行并立即返回 Future，Tk 主线程不会被阻塞。
+    带 key 提交的探测结果按 ttl 缓存，进行中的同一探测直接复用；
+    操作改变了被探测的状态时调用 invalidate。结果由 deliver 通过 after
+    轮询交回 Tk 主线程，工作线程从不直接操作界面。
+    """
+    
+    POLL_MS = 50
+    
+    def __init__(self, max_workers=2):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="probe")
+        self.cache = {}  # key -> (完成时间或 None, Future)
+    
+    def submit(self, func, *args, key=None, ttl=0):
+        """提交探测，返回 Future"""
+        if key is not None and key in self.cache:
+            finished, future = self.cache[key]
+            if not future.done():
+                return future
+            if finished is not None and time.monotonic() - finished < ttl and future.exception() is None:
+                return future
+        future = self.executor.submit(func, *args)
+        if key is not None:
+            entry = [None, future]
+            self.cache[key] = entry
+            future.add_done_callback(lambda f: entry.__setitem__(0, time.monotonic()))
+        return future
+    
+    def invalidate(self, key):
+        """丢弃缓存的结果，下次提交时重新探测"""
+        self.cache.pop(key, None)
+    
+    def deliver(self, widget, future, callback):
+        """在 Tk 主线程中等 future 完成后调用 callback(future)，widget 已销毁时丢弃结果"""
+        def check():
+            if not widget.winfo_exists():
+                return
+            if future.done():
+                callback(future)
+            else:
+                widget.after(self.POLL_MS, check)
+        check()
+    
+    def shutdown(self):
+        """退出时不等待进行中的探测"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def probe_sensor(url):
+    """读取一次传感器（在工作线程中执行），返回数值，失败时抛出异常"""
+    import requests
+    response = requests.get(url, timeout=3)
+    response.raise_for_status()
+    data = response.json()
+    if 'value' not in data:
+        raise ValueError("无法解析传感器数据")
+    return float(data['value'])
 
 class SettingsWindow:
-    """设置窗口"""
+    """设置窗口
+    
+    PowerShell 与网络相关的操作都交给 BackgroundProbes 在后台执行，
+    窗口立即打开，结果返回前显示为进行中。
+    """
     
-    def __init__(self, parent, config, on_save):
+    # 开机自启动状态的缓存时长（秒），启用或禁用后立即失效
+    AUTOSTART_TTL = 60
+    
+    def __init__(self, parent, config, on_save, probes=None):
         self.window = tk.Toplevel(parent)
         self.window.title("自动亮度设置")
-        self.window.geometry("600x750")
+        self.window.geometry("600x620")
         self.window.resizable(False, False)
         
         self.config = config.copy()
         self.on_save = on_save
+        self.probes = probes or BackgroundProbes()
         
         self.create_widgets()
         
@@ -307,32 +2457,74 @@ class SettingsWindow:
         main_frame = ttk.Frame(self.window, padding="20")
         main_frame.pack(fill=tk.BOTH, expand=True)
         
+        # 分页
+        notebook = ttk.Notebook(main_frame)
+        notebook.pack(fill=tk.BOTH, expand=True)
+        general_tab = ttk.Frame(notebook, padding="10")
+        signal_tab = ttk.Frame(notebook, padding="10")
+        system_tab = ttk.Frame(notebook, padding="10")
+        notebook.add(general_tab, text="常规")
+        notebook.add(signal_tab, text="过渡与滤波")
+        curve_tab = ttk.Frame(notebook, padding="10")
+        notebook.add(curve_tab, text="亮度曲线")
+        multi_tab = ttk.Frame(notebook, padding="10")
+        notebook.add(multi_tab, text="多传感器")
+        monitor_tab = ttk.Frame(notebook, padding="10")
+        notebook.add(monitor_tab, text="显示器")
+        notebook.add(system_tab, text="系统")
+        
         # 传感器设置
-        sensor_frame = ttk.LabelFrame(main_frame, text="传感器设置", padding="10")
+        sensor_frame = ttk.LabelFrame(general_tab, text="传感器设置", padding="10")
         sensor_frame.pack(fill=tk.X, pady=(0, 10))
         
         ttk.Label(sensor_frame, text="传感器地址:").grid(row=0, column=0, sticky=tk.W, pady=5)
         self.sensor_url_var = tk.StringVar(value=self.config['sensor_url'])
-        ttk.Entry(sensor_frame, textvariable=self.sensor_url_var, width=50).grid(row=0, column=1, pady=5)
+        ttk.Entry(sensor_frame, textvariable=self.sensor_url_var, width=50).grid(row=0, column=1, columnspan=3, pady=5)
+        
+        ttk.Label(sensor_frame, text="数据来源:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        self.sensor_source_var = tk.StringVar(value=self.config.get('sensor_source', 'http'))
+        ttk.Combobox(sensor_frame, textvariable=self.sensor_source_var, values=["http", "udp", "sse", "relay"],
+                     state="readonly", width=8).grid(row=1, column=1, sticky=tk.W, pady=5)
+        
+        ttk.Label(sensor_frame, text="UDP 端口:").grid(row=1, column=2, sticky=tk.W, pady=5)
+        self.udp_port_var = tk.IntVar(value=self.config.get('udp_port', 8888))
+        ttk.Spinbox(sensor_frame, from_=1, to=65535, textvariable=self.udp_port_var, width=8).grid(row=1, column=3, sticky=tk.W, pady=5)
         
-        # Twinkle Tray 设置
-        tt_frame = ttk.LabelFrame(main_frame, text="Twinkle Tray 设置", padding="10")
+        # 亮度控制设置
+        tt_frame = ttk.LabelFrame(general_tab, text="亮度控制", padding="10")
         tt_frame.pack(fill=tk.X, pady=(0, 10))
         
-        ttk.Label(tt_frame, text="程序路径:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        ttk.Label(tt_frame, text="控制方式:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        self.backend_var = tk.StringVar(value=self.config.get('backend', 'twinkle_tray'))
+        ttk.Combobox(tt_frame, textvariable=self.backend_var, values=["twinkle_tray", "sysfs", "ddcutil"],
+                     state="readonly", width=15).grid(row=0, column=1, sticky=tk.W, pady=5)
+        
+        ttk.Label(tt_frame, text="Twinkle Tray 路径:").grid(row=1, column=0, sticky=tk.W, pady=5)
         self.tt_path_var = tk.StringVar(value=self.config['tt_path'])
         path_entry = ttk.Entry(tt_frame, textvariable=self.tt_path_var, width=40)
-        path_entry.grid(row=0, column=1, pady=5, padx=(0, 5))
-        ttk.Button(tt_frame, text="浏览...", command=self.browse_tt_path).grid(row=0, column=2, pady=5)
+        path_entry.grid(row=1, column=1, pady=5, padx=(0, 5))
+        ttk.Button(tt_frame, text="浏览...", command=self.browse_tt_path).grid(row=1, column=2, pady=5)
+        
+        ttk.Label(tt_frame, text="读回间隔 (秒):").grid(row=2, column=0, sticky=tk.W, pady=5)
+        self.readback_interval_var = tk.IntVar(value=self.config.get('readback_interval', 60))
+        ttk.Spinbox(tt_frame, from_=0, to=3600, increment=10, textvariable=self.readback_interval_var, width=10).grid(row=2, column=1, sticky=tk.W, pady=5)
+        ttk.Label(tt_frame, text="(读取实际亮度，已是目标值时不再设置；0 为关闭)", font=('', 8)).grid(row=3, column=1, columnspan=2, sticky=tk.W)
+        
+        ttk.Label(tt_frame, text="每秒最多命令数:").grid(row=4, column=0, sticky=tk.W, pady=5)
+        self.command_rate_var = tk.DoubleVar(value=self.config.get('command_rate', 5))
+        ttk.Spinbox(tt_frame, from_=0, to=50, increment=1, textvariable=self.command_rate_var, width=10).grid(row=4, column=1, sticky=tk.W, pady=5)
+        ttk.Label(tt_frame, text="(超出时只发送最新的目标亮度；0 为不限制)", font=('', 8)).grid(row=5, column=1, columnspan=2, sticky=tk.W)
         
         # 运行参数
-        params_frame = ttk.LabelFrame(main_frame, text="运行参数", padding="10")
+        params_frame = ttk.LabelFrame(general_tab, text="运行参数", padding="10")
         params_frame.pack(fill=tk.X, pady=(0, 10))
         
         # 刷新间隔
         ttk.Label(params_frame, text="刷新间隔 (秒):").grid(row=0, column=0, sticky=tk.W, pady=5)
         self.interval_var = tk.IntVar(value=self.config['interval'])
         ttk.Spinbox(params_frame, from_=1, to=60, textvariable=self.interval_var, width=10).grid(row=0, column=1, sticky=tk.W, pady=5)
+        self.adaptive_interval_var = tk.BooleanVar(value=self.config.get('adaptive_interval', True))
+        ttk.Checkbutton(params_frame, text="自适应间隔", variable=self.adaptive_interval_var).grid(row=0, column=2, sticky=tk.W, padx=(5, 0))
         
         # 最小亮度
         ttk.Label(params_frame, text="最小亮度 (%):").grid(row=1, column=0, sticky=tk.W, pady=5)
@@ -350,8 +2542,19 @@ class SettingsWindow:
         ttk.Spinbox(params_frame, from_=1, to=20, textvariable=self.threshold_var, width=10).grid(row=3, column=1, sticky=tk.W, pady=5)
         ttk.Label(params_frame, text="(变化超过此值才调节)", font=('', 8)).grid(row=3, column=2, sticky=tk.W, padx=(5, 0))
         
+        # 自适应间隔范围
+        ttk.Label(params_frame, text="自适应范围 (秒):").grid(row=4, column=0, sticky=tk.W, pady=5)
+        interval_range_frame = ttk.Frame(params_frame)
+        interval_range_frame.grid(row=4, column=1, columnspan=2, sticky=tk.W, pady=5)
+        self.interval_min_var = tk.DoubleVar(value=self.config.get('interval_min', 1))
+        ttk.Spinbox(interval_range_frame, from_=0.5, to=60, increment=0.5, textvariable=self.interval_min_var, width=6).pack(side=tk.LEFT)
+        ttk.Label(interval_range_frame, text=" - ").pack(side=tk.LEFT)
+        self.interval_max_var = tk.DoubleVar(value=self.config.get('interval_max', 30))
+        ttk.Spinbox(interval_range_frame, from_=1, to=600, textvariable=self.interval_max_var, width=6).pack(side=tk.LEFT)
+        ttk.Label(interval_range_frame, text="(变化时最短，稳定时逐步放慢到最长)", font=('', 8)).pack(side=tk.LEFT, padx=(5, 0))
+        
         # 平滑过渡设置
-        smooth_frame = ttk.LabelFrame(main_frame, text="平滑过渡", padding="10")
+        smooth_frame = ttk.LabelFrame(signal_tab, text="平滑过渡", padding="10")
         smooth_frame.pack(fill=tk.X, pady=(0, 10))
         
         self.smooth_transition_var = tk.BooleanVar(value=self.config.get('smooth_transition', True))
@@ -365,30 +2568,98 @@ class SettingsWindow:
         ttk.Label(smooth_params_frame, text="过渡步长 (%):").grid(row=0, column=0, sticky=tk.W, pady=5)
         self.transition_step_var = tk.IntVar(value=self.config.get('transition_step', 2))
         ttk.Spinbox(smooth_params_frame, from_=1, to=10, textvariable=self.transition_step_var, width=10).grid(row=0, column=1, sticky=tk.W, pady=5)
-        ttk.Label(smooth_params_frame, text="(每步调整的亮度)", font=('', 8)).grid(row=0, column=2, sticky=tk.W, padx=(5, 0))
+        ttk.Label(smooth_params_frame, text="(每帧最小变化)", font=('', 8)).grid(row=0, column=2, sticky=tk.W, padx=(5, 0))
         
         ttk.Label(smooth_params_frame, text="过渡延迟 (秒):").grid(row=1, column=0, sticky=tk.W, pady=5)
         self.transition_delay_var = tk.DoubleVar(value=self.config.get('transition_delay', 0.05))
         ttk.Spinbox(smooth_params_frame, from_=0.01, to=0.5, increment=0.01, 
                    textvariable=self.transition_delay_var, width=10, format="%.2f").grid(row=1, column=1, sticky=tk.W, pady=5)
-        ttk.Label(smooth_params_frame, text="(每步之间的间隔)", font=('', 8)).grid(row=1, column=2, sticky=tk.W, padx=(5, 0))
+        ttk.Label(smooth_params_frame, text="(帧之间的最小间隔)", font=('', 8)).grid(row=1, column=2, sticky=tk.W, padx=(5, 0))
+        
+        ttk.Label(smooth_params_frame, text="过渡时长 (秒):").grid(row=2, column=0, sticky=tk.W, pady=5)
+        self.transition_duration_var = tk.DoubleVar(value=self.config.get('transition_duration', 1.5))
+        ttk.Spinbox(smooth_params_frame, from_=0.1, to=10, increment=0.1,
+                   textvariable=self.transition_duration_var, width=10, format="%.1f").grid(row=2, column=1, sticky=tk.W, pady=5)
+        ttk.Label(smooth_params_frame, text="(0% → 100% 所需时间)", font=('', 8)).grid(row=2, column=2, sticky=tk.W, padx=(5, 0))
+        
+        ttk.Label(smooth_params_frame, text="最多帧数:").grid(row=3, column=0, sticky=tk.W, pady=5)
+        self.transition_max_frames_var = tk.IntVar(value=self.config.get('transition_max_frames', 10))
+        ttk.Spinbox(smooth_params_frame, from_=1, to=50, textvariable=self.transition_max_frames_var, width=10).grid(row=3, column=1, sticky=tk.W, pady=5)
+        ttk.Label(smooth_params_frame, text="(每次过渡最多设置几次亮度)", font=('', 8)).grid(row=3, column=2, sticky=tk.W, padx=(5, 0))
+        
+        ttk.Label(smooth_params_frame, text="缓动曲线:").grid(row=4, column=0, sticky=tk.W, pady=5)
+        self.transition_easing_var = tk.StringVar(value=self.config.get('transition_easing', 'ease_in_out'))
+        ttk.Combobox(smooth_params_frame, textvariable=self.transition_easing_var, values=list(EASINGS),
+                     state="readonly", width=12).grid(row=4, column=1, sticky=tk.W, pady=5)
         
         self.toggle_smooth_options()
         
+        # 信号滤波
+        filter_frame = ttk.LabelFrame(signal_tab, text="信号滤波", padding="10")
+        filter_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        ttk.Label(filter_frame, text="中值窗口:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        self.filter_median_window_var = tk.IntVar(value=self.config.get('filter_median_window', 3))
+        ttk.Spinbox(filter_frame, from_=1, to=15, textvariable=self.filter_median_window_var, width=10).grid(row=0, column=1, sticky=tk.W, pady=5)
+        ttk.Label(filter_frame, text="(剔除尖峰，1 为关闭)", font=('', 8)).grid(row=0, column=2, sticky=tk.W, padx=(5, 0))
+        
+        ttk.Label(filter_frame, text="EMA 系数:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        self.filter_ema_alpha_var = tk.DoubleVar(value=self.config.get('filter_ema_alpha', 0.5))
+        ttk.Spinbox(filter_frame, from_=0.05, to=1, increment=0.05, textvariable=self.filter_ema_alpha_var,
+                   width=10, format="%.2f").grid(row=1, column=1, sticky=tk.W, pady=5)
+        ttk.Label(filter_frame, text="(越小越平滑，1 为关闭)", font=('', 8)).grid(row=1, column=2, sticky=tk.W, padx=(5, 0))
+        
+        ttk.Label(filter_frame, text="漂移确认 (秒):").grid(row=2, column=0, sticky=tk.W, pady=5)
+        self.filter_settle_time_var = tk.DoubleVar(value=self.config.get('filter_settle_time', 30))
+        ttk.Spinbox(filter_frame, from_=0, to=600, increment=5, textvariable=self.filter_settle_time_var, width=10).grid(row=2, column=1, sticky=tk.W, pady=5)
+        ttk.Label(filter_frame, text="(持续超过半个阈值多久后也调节，0 为关闭)", font=('', 8)).grid(row=2, column=2, sticky=tk.W, padx=(5, 0))
+        
+        ttk.Label(filter_frame, text="最短调节间隔 (秒):").grid(row=3, column=0, sticky=tk.W, pady=5)
+        self.min_change_interval_var = tk.DoubleVar(value=self.config.get('min_change_interval', 1))
+        ttk.Spinbox(filter_frame, from_=0, to=300, textvariable=self.min_change_interval_var, width=10).grid(row=3, column=1, sticky=tk.W, pady=5)
+        ttk.Label(filter_frame, text="(两次调节之间至少间隔)", font=('', 8)).grid(row=3, column=2, sticky=tk.W, padx=(5, 0))
+        
+        self.create_curve_widgets(curve_tab)
+        self.create_multi_sensor_widgets(multi_tab)
+        self.create_monitor_widgets(monitor_tab)
+        
         # 界面选项
-        ui_frame = ttk.LabelFrame(main_frame, text="界面选项", padding="10")
+        ui_frame = ttk.LabelFrame(system_tab, text="界面选项", padding="10")
         ui_frame.pack(fill=tk.X, pady=(0, 10))
         
         self.start_minimized_var = tk.BooleanVar(value=self.config.get('start_minimized', True))
         ttk.Checkbutton(ui_frame, text="启动时最小化到托盘", variable=self.start_minimized_var).pack(anchor=tk.W)
         
+        # 性能指标
+        metrics_frame = ttk.LabelFrame(system_tab, text="性能指标", padding="10")
+        metrics_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        metrics_row = ttk.Frame(metrics_frame)
+        metrics_row.pack(fill=tk.X)
+        self.metrics_enabled_var = tk.BooleanVar(value=self.config.get('metrics_enabled', False))
+        ttk.Checkbutton(metrics_row, text="启用本机指标端点，端口:", variable=self.metrics_enabled_var).pack(side=tk.LEFT)
+        self.metrics_port_var = tk.IntVar(value=self.config.get('metrics_port', 9731))
+        ttk.Spinbox(metrics_row, from_=1024, to=65535, textvariable=self.metrics_port_var, width=8).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(metrics_frame, text="(Prometheus 文本格式，http://127.0.0.1:端口/metrics)", font=('', 8)).pack(anchor=tk.W)
+        
+        # 历史记录
+        history_frame = ttk.LabelFrame(system_tab, text="历史记录", padding="10")
+        history_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        history_row = ttk.Frame(history_frame)
+        history_row.pack(fill=tk.X)
+        self.history_enabled_var = tk.BooleanVar(value=self.config.get('history_enabled', True))
+        ttk.Checkbutton(history_row, text="记录传感器与亮度历史，最多占用 (MB):", variable=self.history_enabled_var).pack(side=tk.LEFT)
+        self.history_max_mb_var = tk.IntVar(value=self.config.get('history_max_mb', 16))
+        ttk.Spinbox(history_row, from_=2, to=1024, textvariable=self.history_max_mb_var, width=6).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(history_frame, text=f"(保存在 {HISTORY_DIR}，超出后删除最旧的记录)", font=('', 8)).pack(anchor=tk.W)
+        
         # 开机自启动
-        autostart_frame = ttk.LabelFrame(main_frame, text="开机自启动", padding="10")
+        autostart_frame = ttk.LabelFrame(system_tab, text="开机自启动", padding="10")
         autostart_frame.pack(fill=tk.X, pady=(0, 10))
         
         # 显示当前状态
         self.autostart_status_var = tk.StringVar()
-        self.update_autostart_status()
         status_label = ttk.Label(autostart_frame, textvariable=self.autostart_status_var)
         status_label.pack(anchor=tk.W, pady=(0, 5))
         
@@ -412,7 +2683,7 @@ class SettingsWindow:
         )
         self.disable_autostart_btn.pack(side=tk.LEFT)
         
-        self.update_autostart_buttons()
+        self.refresh_autostart()
         
         # 按钮
         button_frame = ttk.Frame(main_frame)
@@ -420,7 +2691,255 @@ class SettingsWindow:
         
         ttk.Button(button_frame, text="保存", command=self.save_settings, width=15).pack(side=tk.RIGHT, padx=(5, 0))
         ttk.Button(button_frame, text="取消", command=self.window.destroy, width=15).pack(side=tk.RIGHT)
-        ttk.Button(button_frame, text="测试连接", command=self.test_connection, width=15).pack(side=tk.LEFT)
+        self.test_button = ttk.Button(button_frame, text="测试连接", command=self.test_connection, width=15)
+        self.test_button.pack(side=tk.LEFT)
+    
+    def create_curve_widgets(self, parent):
+        """亮度曲线编辑与预览"""
+        curve_frame = ttk.LabelFrame(parent, text="映射曲线", padding="10")
+        curve_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        ttk.Label(curve_frame, text="曲线类型:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        self.curve_mode_var = tk.StringVar(value=self.config.get('curve_mode', 'gamma'))
+        ttk.Combobox(curve_frame, textvariable=self.curve_mode_var, values=["gamma", "points", "log_lux"],
+                     state="readonly", width=10).grid(row=0, column=1, sticky=tk.W, pady=5)
+        ttk.Label(curve_frame, text="(log_lux 使用 Lux 实体作为输入)", font=('', 8)).grid(row=0, column=2, columnspan=2, sticky=tk.W, padx=(5, 0))
+        
+        ttk.Label(curve_frame, text="Gamma:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        self.curve_gamma_var = tk.DoubleVar(value=self.config.get('curve_gamma', 1.0))
+        ttk.Spinbox(curve_frame, from_=0.1, to=5, increment=0.1, textvariable=self.curve_gamma_var,
+                   width=10, format="%.1f").grid(row=1, column=1, sticky=tk.W, pady=5)
+        
+        ttk.Label(curve_frame, text="控制点:").grid(row=2, column=0, sticky=tk.W, pady=5)
+        points = self.config.get('curve_points', [[0, 0], [100, 100]])
+        self.curve_points_var = tk.StringVar(value=", ".join(f"{x:g}:{y:g}" for x, y in points))
+        ttk.Entry(curve_frame, textvariable=self.curve_points_var, width=40).grid(row=2, column=1, columnspan=3, sticky=tk.W, pady=5)
+        ttk.Label(curve_frame, text="(环境%:屏幕%，逗号分隔，如 0:10, 50:60, 100:100)", font=('', 8)).grid(row=3, column=1, columnspan=3, sticky=tk.W)
+        
+        ttk.Label(curve_frame, text="Lux 范围:").grid(row=4, column=0, sticky=tk.W, pady=5)
+        self.curve_lux_min_var = tk.DoubleVar(value=self.config.get('curve_lux_min', 1))
+        ttk.Spinbox(curve_frame, from_=0.1, to=1000, textvariable=self.curve_lux_min_var, width=10).grid(row=4, column=1, sticky=tk.W, pady=5)
+        self.curve_lux_max_var = tk.DoubleVar(value=self.config.get('curve_lux_max', 10000))
+        ttk.Spinbox(curve_frame, from_=10, to=100000, increment=100, textvariable=self.curve_lux_max_var, width=10).grid(row=4, column=2, sticky=tk.W, pady=5)
+        
+        # 预览
+        preview_frame = ttk.LabelFrame(parent, text="预览", padding="10")
+        preview_frame.pack(fill=tk.BOTH, expand=True)
+        self.curve_canvas = tk.Canvas(preview_frame, width=520, height=220, background="white", highlightthickness=0)
+        self.curve_canvas.pack()
+        
+        for var in (self.curve_mode_var, self.curve_gamma_var, self.curve_points_var,
+                    self.curve_lux_min_var, self.curve_lux_max_var):
+            var.trace_add('write', lambda *_: self.draw_curve_preview())
+        self.draw_curve_preview()
+    
+    def create_multi_sensor_widgets(self, parent):
+        """多传感器融合设置"""
+        list_frame = ttk.LabelFrame(parent, text="传感器列表", padding="10")
+        list_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
+        
+        ttk.Label(list_frame, text="每行一个：地址 [权重] [超时秒数]，留空则只使用常规页的传感器地址",
+                  font=('', 8)).pack(anchor=tk.W, pady=(0, 5))
+        self.sensors_text = tk.Text(list_frame, height=5, width=60, wrap=tk.NONE)
+        self.sensors_text.pack(fill=tk.BOTH, expand=True)
+        for sensor in self.config.get('sensors', []):
+            self.sensors_text.insert(tk.END, f"{sensor['url']} {sensor.get('weight', 1.0):g} {sensor.get('timeout', 1.5):g}\n")
+        
+        fusion_frame = ttk.LabelFrame(parent, text="融合方式", padding="10")
+        fusion_frame.pack(fill=tk.X)
+        
+        ttk.Label(fusion_frame, text="融合方式:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        self.fusion_method_var = tk.StringVar(value=self.config.get('fusion_method', 'weighted_mean'))
+        ttk.Combobox(fusion_frame, textvariable=self.fusion_method_var, values=["weighted_mean", "median", "max"],
+                     state="readonly", width=15).grid(row=0, column=1, sticky=tk.W, pady=5)
+        
+        ttk.Label(fusion_frame, text="离群阈值 (%):").grid(row=1, column=0, sticky=tk.W, pady=5)
+        self.fusion_outlier_var = tk.DoubleVar(value=self.config.get('fusion_outlier', 20))
+        ttk.Spinbox(fusion_frame, from_=0, to=100, textvariable=self.fusion_outlier_var, width=10).grid(row=1, column=1, sticky=tk.W, pady=5)
+        ttk.Label(fusion_frame, text="(与中位数相差超过此值的读数被丢弃，0 为关闭)", font=('', 8)).grid(row=1, column=2, sticky=tk.W, padx=(5, 0))
+        
+        ttk.Label(fusion_frame, text="读数有效期 (秒):").grid(row=2, column=0, sticky=tk.W, pady=5)
+        self.sensor_stale_after_var = tk.DoubleVar(value=self.config.get('sensor_stale_after', 30))
+        ttk.Spinbox(fusion_frame, from_=0, to=600, textvariable=self.sensor_stale_after_var, width=10).grid(row=2, column=1, sticky=tk.W, pady=5)
+        ttk.Label(fusion_frame, text="(读取失败时沿用上次读数的时长)", font=('', 8)).grid(row=2, column=2, sticky=tk.W, padx=(5, 0))
+        
+        breaker_frame = ttk.LabelFrame(parent, text="传感器离线时", padding="10")
+        breaker_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        ttk.Label(breaker_frame, text="连续失败次数:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        self.breaker_failures_var = tk.IntVar(value=self.config.get('breaker_failures', 3))
+        ttk.Spinbox(breaker_frame, from_=1, to=20, textvariable=self.breaker_failures_var, width=10).grid(row=0, column=1, sticky=tk.W, pady=5)
+        ttk.Label(breaker_frame, text="(之后暂停读取，按指数退避重试)", font=('', 8)).grid(row=0, column=2, sticky=tk.W, padx=(5, 0))
+        
+        ttk.Label(breaker_frame, text="回落亮度 (%):").grid(row=1, column=0, sticky=tk.W, pady=5)
+        self.fallback_brightness_var = tk.IntVar(value=self.config.get('fallback_brightness', 50))
+        ttk.Spinbox(breaker_frame, from_=0, to=100, textvariable=self.fallback_brightness_var, width=10).grid(row=1, column=1, sticky=tk.W, pady=5)
+        
+        ttk.Label(breaker_frame, text="回落时长 (秒):").grid(row=2, column=0, sticky=tk.W, pady=5)
+        self.fallback_ramp_var = tk.IntVar(value=self.config.get('fallback_ramp', 900))
+        ttk.Spinbox(breaker_frame, from_=0, to=7200, increment=60, textvariable=self.fallback_ramp_var, width=10).grid(row=2, column=1, sticky=tk.W, pady=5)
+        ttk.Label(breaker_frame, text="(从最后有效亮度逐渐过渡到回落亮度)", font=('', 8)).grid(row=2, column=2, sticky=tk.W, padx=(5, 0))
+        
+        relay_frame = ttk.LabelFrame(parent, text="局域网中继", padding="10")
+        relay_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        self.relay_enabled_var = tk.BooleanVar(value=self.config.get('relay_enabled', False))
+        ttk.Checkbutton(relay_frame, text="本机作为中继，向局域网转发传感器读数", variable=self.relay_enabled_var).grid(row=0, column=0, columnspan=3, sticky=tk.W)
+        ttk.Label(relay_frame, text="HTTP 端口:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        self.relay_port_var = tk.IntVar(value=self.config.get('relay_port', DEFAULT_HTTP_PORT))
+        ttk.Spinbox(relay_frame, from_=1024, to=65535, textvariable=self.relay_port_var, width=10).grid(row=1, column=1, sticky=tk.W, pady=5)
+        ttk.Label(relay_frame, text="(其他机器的数据来源选 relay 即自动订阅)", font=('', 8)).grid(row=1, column=2, sticky=tk.W, padx=(5, 0))
+    
+    def create_monitor_widgets(self, parent):
+        """多显示器独立亮度设置"""
+        monitor_frame = ttk.LabelFrame(parent, text="显示器列表", padding="10")
+        monitor_frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(monitor_frame, text="每行一台：编号或 ID  偏移(%)  [控制点，如 0:0,100:80]\n"
+                                      "留空则所有显示器使用相同亮度；只有亮度变化的显示器会被设置",
+                  font=('', 8), justify=tk.LEFT).pack(anchor=tk.W, pady=(0, 5))
+        self.monitors_text = tk.Text(monitor_frame, height=10, width=60, wrap=tk.NONE)
+        self.monitors_text.pack(fill=tk.BOTH, expand=True)
+        for monitor in self.config.get('monitors', []):
+            line = f"{monitor['id']} {monitor.get('offset', 0):g}"
+            if monitor.get('points'):
+                line += " " + ",".join(f"{x:g}:{y:g}" for x, y in monitor['points'])
+            self.monitors_text.insert(tk.END, line + "\n")
+        
+        self.detect_button = ttk.Button(monitor_frame, text="检测显示器", command=self.detect_monitors, width=15)
+        self.detect_button.pack(anchor=tk.W, pady=(5, 0))
+    
+    def detect_monitors(self):
+        """在后台列出当前后端可控制的显示器"""
+        backend = create_backend({**self.config, 'backend': self.backend_var.get(), 'tt_path': self.tt_path_var.get()})
+        self.detect_button.config(state=tk.DISABLED, text="检测中...")
+        future = self.probes.submit(backend.list_displays)
+        self.probes.deliver(self.window, future, self.show_monitors)
+    
+    def show_monitors(self, future):
+        """显示显示器检测结果"""
+        self.detect_button.config(state=tk.NORMAL, text="检测显示器")
+        try:
+            displays = future.result()
+        except Exception as e:
+            messagebox.showerror("检测失败", f"错误: {e}", parent=self.window)
+            return
+        if displays:
+            messagebox.showinfo("检测结果", "可用的显示器:\n" + "\n".join(displays), parent=self.window)
+        else:
+            messagebox.showinfo("检测结果", "未检测到可单独控制的显示器", parent=self.window)
+    
+    def parse_monitor_list(self):
+        """解析显示器列表文本，格式错误时抛出 ValueError"""
+        return self.parse_monitors(self.monitors_text.get(1.0, tk.END))
+    
+    @staticmethod
+    def parse_monitors(text):
+        """解析 "编号 [偏移] [x:y,x:y,...]" 格式的显示器列表，格式错误时抛出 ValueError
+        
+        控制点在这里按控制器的方式编译一次，错误在保存时报告，而不是在控制器中出错。
+        """
+        monitors = []
+        for line in text.splitlines():
+            parts = line.split()
+            if not parts:
+                continue
+            if len(parts) > 3:
+                raise ValueError(f"{parts[0]}: 多余的内容 {' '.join(parts[3:])}")
+            monitor = {'id': parts[0], 'offset': float(parts[1]) if len(parts) > 1 else 0}
+            if len(parts) > 2:
+                points = []
+                for point in parts[2].split(','):
+                    values = point.split(':')
+                    if len(values) != 2:
+                        raise ValueError(f"{parts[0]}: 控制点应为 x:y，而不是 {point}")
+                    points.append([float(values[0]), float(values[1])])
+                if len(points) < 2:
+                    raise ValueError(f"{parts[0]}: 至少需要两个控制点")
+                ResponseCurve({'curve_mode': 'points', 'curve_points': points})
+                monitor['points'] = points
+            monitors.append(monitor)
+        return monitors
+    
+    def parse_sensor_list(self):
+        """解析传感器列表文本，格式错误时抛出 ValueError"""
+        sensors = []
+        for line in self.sensors_text.get(1.0, tk.END).splitlines():
+            parts = line.split()
+            if not parts:
+                continue
+            sensor = {'url': parts[0]}
+            if len(parts) > 1:
+                sensor['weight'] = float(parts[1])
+            if len(parts) > 2:
+                sensor['timeout'] = float(parts[2])
+            sensors.append(sensor)
+        return sensors
+    
+    def parse_curve_points(self):
+        """解析控制点文本，格式错误时抛出 ValueError"""
+        points = []
+        for part in self.curve_points_var.get().split(','):
+            if part.strip():
+                x, y = part.split(':')
+                points.append([float(x), float(y)])
+        if len(points) < 2:
+            raise ValueError("至少需要两个控制点")
+        return points
+    
+    def curve_config(self):
+        """当前界面上的曲线配置"""
+        return {
+            'curve_mode': self.curve_mode_var.get(),
+            'curve_gamma': self.curve_gamma_var.get(),
+            'curve_points': self.parse_curve_points(),
+            'curve_lux_min': self.curve_lux_min_var.get(),
+            'curve_lux_max': self.curve_lux_max_var.get(),
+        }
+    
+    def draw_curve_preview(self):
+        """绘制曲线预览"""
+        canvas = self.curve_canvas
+        canvas.delete("all")
+        width, height, margin = 520, 220, 30
+        try:
+            curve = ResponseCurve(self.curve_config())
+        except (ValueError, tk.TclError):
+            canvas.create_text(width // 2, height // 2, text="曲线参数无效", fill="red")
+            return
+        
+        # 坐标轴
+        canvas.create_line(margin, height - margin, width - 10, height - margin)
+        canvas.create_line(margin, 10, margin, height - margin)
+        canvas.create_text(margin - 5, 10, text="100", anchor=tk.E, font=('', 7))
+        canvas.create_text(margin - 5, height - margin, text="0", anchor=tk.E, font=('', 7))
+        
+        plot_w = width - 10 - margin
+        plot_h = height - margin - 10
+        if curve.needs_lux:
+            # 对数横轴
+            log_min, log_max = math.log10(curve.lux_min), math.log10(curve.lux_max)
+            to_input = lambda t: 10 ** (log_min + t * (log_max - log_min))
+            canvas.create_text(margin, height - 15, text=f"{curve.lux_min:g} lx", anchor=tk.W, font=('', 7))
+            canvas.create_text(width - 10, height - 15, text=f"{curve.lux_max:g} lx", anchor=tk.E, font=('', 7))
+        else:
+            to_input = lambda t: t * 100
+            canvas.create_text(margin, height - 15, text="0%", anchor=tk.W, font=('', 7))
+            canvas.create_text(width - 10, height - 15, text="环境 100%", anchor=tk.E, font=('', 7))
+        
+        coords = []
+        for i in range(plot_w + 1):
+            y = min(max(curve(to_input(i / plot_w)), 0), 100)
+            coords += [margin + i, height - margin - y / 100 * plot_h]
+        canvas.create_line(*coords, fill="darkorange", width=2)
+        
+        # 最小/最大亮度限制
+        for limit_var in (self.min_brightness_var, self.max_brightness_var):
+            try:
+                y = height - margin - limit_var.get() / 100 * plot_h
+            except tk.TclError:
+                continue
+            canvas.create_line(margin, y, width - 10, y, fill="gray", dash=(3, 3))
     
     def browse_tt_path(self):
         """浏览选择 Twinkle Tray 路径"""
@@ -432,74 +2951,150 @@ class SettingsWindow:
             self.tt_path_var.set(filename)
     
     def test_connection(self):
-        """测试传感器连接"""
-        url = self.sensor_url_var.get()
+        """在后台测试传感器连接"""
+        self.test_button.config(state=tk.DISABLED, text="测试中...")
+        future = self.probes.submit(probe_sensor, self.sensor_url_var.get())
+        self.probes.deliver(self.window, future, self.show_connection_result)
+    
+    def show_connection_result(self, future):
+        """显示连接测试结果"""
+        self.test_button.config(state=tk.NORMAL, text="测试连接")
         try:
-            response = requests.get(url, timeout=3)
-            response.raise_for_status()
-            data = response.json()
-            if 'value' in data:
-                val = float(data['value'])
-                messagebox.showinfo("连接成功", f"传感器当前值: {val:.2f}%")
-            else:
-                messagebox.showerror("连接失败", "无法解析传感器数据")
+            val = future.result()
         except Exception as e:
-            messagebox.showerror("连接失败", f"错误: {e}")
+            messagebox.showerror("连接失败", f"错误: {e}", parent=self.window)
+            return
+        messagebox.showinfo("连接成功", f"传感器当前值: {val:.2f}%", parent=self.window)
     
-    def update_autostart_status(self):
-        """更新开机自启动状态显示"""
-        if AutostartManager.is_enabled():
-            self.autostart_status_var.set("✅ 已启用开机自启动")
-        else:
-            self.autostart_status_var.set("❌ 未启用开机自启动")
+    def refresh_autostart(self):
+        """查询开机自启动状态（有缓存时立即显示），查询期间按钮不可用"""
+        future = self.probes.submit(AutostartManager.is_enabled, key='autostart', ttl=self.AUTOSTART_TTL)
+        if not future.done():
+            self.autostart_status_var.set("⏳ 正在检查开机自启动状态...")
+            self.enable_autostart_btn.config(state=tk.DISABLED)
+            self.disable_autostart_btn.config(state=tk.DISABLED)
+        self.probes.deliver(self.window, future, self.show_autostart)
     
-    def update_autostart_buttons(self):
-        """更新开机自启动按钮状态"""
-        is_enabled = AutostartManager.is_enabled()
-        if is_enabled:
+    def show_autostart(self, future):
+        """按查询结果更新开机自启动状态与按钮"""
+        try:
+            enabled = future.result()
+        except Exception as e:
+            # 状态未知时两个按钮都可用，由用户决定
+            self.autostart_status_var.set(f"⚠️ 无法检查开机自启动状态: {e}")
+            self.enable_autostart_btn.config(state=tk.NORMAL)
+            self.disable_autostart_btn.config(state=tk.NORMAL)
+            return
+        if enabled:
+            self.autostart_status_var.set("✅ 已启用开机自启动")
             self.enable_autostart_btn.config(state=tk.DISABLED)
             self.disable_autostart_btn.config(state=tk.NORMAL)
         else:
+            self.autostart_status_var.set("❌ 未启用开机自启动")
             self.enable_autostart_btn.config(state=tk.NORMAL)
             self.disable_autostart_btn.config(state=tk.DISABLED)
     
+    def change_autostart(self, func, pending, on_done):
+        """在后台启用或禁用开机自启动，完成后重新查询状态"""
+        self.autostart_status_var.set(pending)
+        self.enable_autostart_btn.config(state=tk.DISABLED)
+        self.disable_autostart_btn.config(state=tk.DISABLED)
+        
+        def done(future):
+            self.probes.invalidate('autostart')
+            try:
+                ok = future.result()
+            except Exception as e:
+                log.warning("修改开机自启动失败: %s", e)
+                ok = False
+            try:
+                on_done(ok)
+            finally:
+                # 无论结果如何都重新查询状态，恢复按钮
+                self.refresh_autostart()
+        self.probes.deliver(self.window, self.probes.submit(func), done)
+    
     def enable_autostart(self):
         """启用开机自启动"""
-        if AutostartManager.enable():
-            messagebox.showinfo("成功", "已启用开机自启动\n下次登录时程序将自动启动")
-            self.update_autostart_status()
-            self.update_autostart_buttons()
-        else:
-            messagebox.showerror("失败", "启用开机自启动失败\n请检查是否有足够的权限")
+        def done(ok):
+            if ok:
+                messagebox.showinfo("成功", "已启用开机自启动\n下次登录时程序将自动启动", parent=self.window)
+            else:
+                messagebox.showerror("失败", "启用开机自启动失败\n请检查是否有足够的权限", parent=self.window)
+        self.change_autostart(AutostartManager.enable, "⏳ 正在启用开机自启动...", done)
     
     def disable_autostart(self):
         """禁用开机自启动"""
-        if AutostartManager.disable():
-            messagebox.showinfo("成功", "已禁用开机自启动")
-            self.update_autostart_status()
-            self.update_autostart_buttons()
-        else:
-            messagebox.showerror("失败", "禁用开机自启动失败")
+        def done(ok):
+            if ok:
+                messagebox.showinfo("成功", "已禁用开机自启动", parent=self.window)
+            else:
+                messagebox.showerror("失败", "禁用开机自启动失败", parent=self.window)
+        self.change_autostart(AutostartManager.disable, "⏳ 正在禁用开机自启动...", done)
     
     def toggle_smooth_options(self):
         """切换平滑过渡选项的启用状态"""
         state = tk.NORMAL if self.smooth_transition_var.get() else tk.DISABLED
         for child in self.smooth_params_frame.winfo_children():
-            if isinstance(child, (ttk.Spinbox, ttk.Label)):
+            if isinstance(child, ttk.Combobox):
+                child.configure(state="readonly" if state == tk.NORMAL else state)
+            elif isinstance(child, (ttk.Spinbox, ttk.Label)):
                 child.configure(state=state)
     
     def save_settings(self):
         """保存设置"""
         self.config['sensor_url'] = self.sensor_url_var.get()
+        self.config['sensor_source'] = self.sensor_source_var.get()
+        self.config['udp_port'] = self.udp_port_var.get()
+        self.config['backend'] = self.backend_var.get()
         self.config['tt_path'] = self.tt_path_var.get()
+        self.config['readback_interval'] = self.readback_interval_var.get()
+        self.config['command_rate'] = self.command_rate_var.get()
         self.config['interval'] = self.interval_var.get()
+        self.config['adaptive_interval'] = self.adaptive_interval_var.get()
+        self.config['interval_min'] = self.interval_min_var.get()
+        self.config['interval_max'] = self.interval_max_var.get()
         self.config['min_brightness'] = self.min_brightness_var.get()
         self.config['max_brightness'] = self.max_brightness_var.get()
         self.config['threshold'] = self.threshold_var.get()
         self.config['smooth_transition'] = self.smooth_transition_var.get()
         self.config['transition_step'] = self.transition_step_var.get()
         self.config['transition_delay'] = self.transition_delay_var.get()
+        self.config['transition_duration'] = self.transition_duration_var.get()
+        self.config['transition_max_frames'] = self.transition_max_frames_var.get()
+        self.config['transition_easing'] = self.transition_easing_var.get()
+        self.config['filter_median_window'] = self.filter_median_window_var.get()
+        self.config['filter_ema_alpha'] = self.filter_ema_alpha_var.get()
+        self.config['filter_settle_time'] = self.filter_settle_time_var.get()
+        self.config['min_change_interval'] = self.min_change_interval_var.get()
+        try:
+            self.config.update(self.curve_config())
+        except ValueError as e:
+            messagebox.showerror("错误", f"亮度曲线控制点无效: {e}")
+            return
+        try:
+            self.config['sensors'] = self.parse_sensor_list()
+        except ValueError as e:
+            messagebox.showerror("错误", f"传感器列表格式无效: {e}")
+            return
+        try:
+            self.config['monitors'] = self.parse_monitor_list()
+        except ValueError as e:
+            messagebox.showerror("错误", f"显示器列表格式无效: {e}")
+            return
+        self.config['fusion_method'] = self.fusion_method_var.get()
+        self.config['fusion_outlier'] = self.fusion_outlier_var.get()
+        self.config['sensor_stale_after'] = self.sensor_stale_after_var.get()
+        self.config['breaker_failures'] = self.breaker_failures_var.get()
+        self.config['fallback_brightness'] = self.fallback_brightness_var.get()
+        self.config['fallback_ramp'] = self.fallback_ramp_var.get()
+        self.config['relay_enabled'] = self.relay_enabled_var.get()
+        self.config['relay_port'] = self.relay_port_var.get()
         self.config['start_minimized'] = self.start_minimized_var.get()
+        self.config['metrics_enabled'] = self.metrics_enabled_var.get()
+        self.config['metrics_port'] = self.metrics_port_var.get()
+        self.config['history_enabled'] = self.history_enabled_var.get()
+        self.config['history_max_mb'] = self.history_max_mb_var.get()
         
         if self.on_save(self.config):
             messagebox.showinfo("成功", "设置已保存")
@@ -507,50 +3102,161 @@ class SettingsWindow:
         else:
             messagebox.showerror("错误", "保存设置失败")
 
+class HistoryChart:
+    """主窗口中的历史曲线，每次只读取可见时间范围内的记录"""
+    
+    RANGES = {"1 小时": 3600, "24 小时": 86400, "7 天": 7 * 86400, "30 天": 30 * 86400}
+    
+    def __init__(self, parent, get_history):
+        self.get_history = get_history
+        frame = ttk.LabelFrame(parent, text="历史记录", padding="5")
+        frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
+        
+        top = ttk.Frame(frame)
+        top.pack(fill=tk.X)
+        self.range_var = tk.StringVar(value="24 小时")
+        range_combo = ttk.Combobox(top, textvariable=self.range_var, values=list(self.RANGES),
+                                   width=8, state='readonly')
+        range_combo.pack(side=tk.LEFT)
+        range_combo.bind('<<ComboboxSelected>>', lambda _: self.refresh())
+        ttk.Label(top, text="— 环境", foreground='gray').pack(side=tk.RIGHT)
+        ttk.Label(top, text="— 屏幕  ", foreground='darkorange').pack(side=tk.RIGHT)
+        
+        self.canvas = tk.Canvas(frame, height=110, background='white', highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True, pady=(5, 0))
+    
+    def refresh(self):
+        """重新读取可见范围并绘制"""
+        canvas = self.canvas
+        canvas.delete('all')
+        width = max(canvas.winfo_width(), 100)
+        height = max(canvas.winfo_height(), 50)
+        
+        history = self.get_history()
+        if history is None:
+            canvas.create_text(width / 2, height / 2, text="历史记录未启用", fill='gray')
+            return
+        span = self.RANGES[self.range_var.get()]
+        now = time.time()
+        try:
+            records = history.read_range(int(now - span), int(now))
+        except (OSError, ValueError):
+            return
+        
+        for level in (0, 50, 100):
+            y = height - 2 - level * (height - 4) / 100
+            canvas.create_line(0, y, width, y, fill='#eeeeee')
+        
+        # 每个像素列只保留最后一条记录
+        columns = {}
+        for record in records:
+            columns[int((record[0] - (now - span)) * (width - 1) / span)] = record
+        for index, color in ((1, 'gray'), (3, 'darkorange')):
+            points = []
+            for x in sorted(columns):
+                value = columns[x][index]
+                if value is None:
+                    self._draw(points, color)
+                    points = []
+                    continue
+                points += [x, height - 2 - value * (height - 4) / 100]
+            self._draw(points, color)
+    
+    def _draw(self, points, color):
+        if len(points) >= 4:
+            self.canvas.create_line(*points, fill=color, width=1.5)
+
+class StatusQueue:
+    """控制器到界面的状态队列
+    
+    任意线程都可以 put，队列有上限，满时丢弃最旧的消息；界面线程定时 drain，
+    一批消息只显示最后一条，因此传感器频繁报错时界面工作量保持不变。
+    """
+    
+    def __init__(self, maxsize=32):
+        self.lock = threading.Lock()
+        self.messages = deque(maxlen=maxsize)
+    
+    def put(self, message):
+        """放入一条状态消息（不阻塞）"""
+        with self.lock:
+            self.messages.append(message)
+    
+    def drain(self):
+        """取出最新一条消息，没有新消息时返回 None"""
+        with self.lock:
+            if not self.messages:
+                return None
+            message = self.messages[-1]
+            self.messages.clear()
+            return message
+
 class MainWindow:
     """主窗口"""
     
+    # 状态栏最快每隔多少毫秒刷新一次
+    STATUS_REFRESH_MS = 250
+    # Windows 托盘提示最多 127 个字符（szTip 为 WCHAR[128]），超出时 pystray 抛出 ValueError
+    TRAY_TITLE_MAX = 127
+    # 耗时摘要刷新间隔（毫秒）
+    METRICS_REFRESH_MS = 2000
+    # 历史曲线刷新间隔（毫秒）
+    HISTORY_REFRESH_MS = 10000
+    # 检查配置文件是否被外部修改的间隔（毫秒）
+    CONFIG_WATCH_MS = 2000
+    
     def __init__(self):
-        self.root = tk.Tk()
-        self.root.title("自动屏幕亮度调节")
-        self.root.geometry("500x350")
-        self.root.resizable(False, False)
-        
         # 加载配置
         self.config = ConfigManager.load()
+        self.config_watcher = ConfigWatcher()
         
         # 创建控制器
         self.controller = BrightnessController(self.config)
-        self.controller.set_status_callback(self.update_status)
-        
-        # 托盘图标
+        # 控制器在自己的线程中报告状态，只放入队列，由 Tk 主循环取出显示
+        self.status_queue = StatusQueue()
+        self.controller.set_status_callback(self.status_queue.put)
+        self.status_text = None
+        self.tray_title = None
+        # 设置窗口的后台探测，结果缓存在多次打开之间共享
+        self.probes = BackgroundProbes()
+        
+        # 先启动控制器和托盘图标，界面随后再加载，不推迟第一次亮度调节
+        if self.config.get('enabled', True):
+            self.controller.start()
         self.tray_icon = None
-        self.is_hidden = False
+        self.create_tray_icon()
         
-        self.create_widgets()
+        load_gui_modules()
+        self.root = tk.Tk()
+        self.root.title("自动屏幕亮度调节")
+        self.root.geometry("500x560")
+        self.root.resizable(False, False)
+        
+        # 启动时最小化则先不创建界面组件，第一次显示窗口时再创建
+        self.widgets_created = False
+        self.is_hidden = self.config.get('start_minimized', True)
+        if self.is_hidden:
+            self.root.withdraw()
+        else:
+            self.create_widgets()
         
         # 窗口关闭事件 - 最小化到托盘而不是退出
         self.root.protocol("WM_DELETE_WINDOW", self.hide_window)
         
-        # 如果配置启用，自动启动
-        if self.config.get('enabled', True):
-            self.start_service()
-        
-        # 创建托盘图标
-        self.create_tray_icon()
-        
-        # 如果设置了启动时最小化
-        if self.config.get('start_minimized', True):
-            self.root.after(100, self.hide_window)
+        self.root.after(self.STATUS_REFRESH_MS, self.drain_status)
+        self.root.after(self.METRICS_REFRESH_MS, self.refresh_metrics)
+        self.root.after(self.HISTORY_REFRESH_MS, self.refresh_history)
+        self.root.after(self.CONFIG_WATCH_MS, self.watch_config)
     
     def create_tray_icon(self):
         """创建系统托盘图标"""
+        load_tray_modules()
         # 创建图标图像
-        image = self.create_icon_image()
+        image = self.load_icon_image()
         
         # 创建菜单
         menu = pystray.Menu(
-            item('显示主窗口', self.show_window),
+            item('显示主窗口', self.show_window_from_tray),
             item('启动服务', self.start_service_from_tray, 
                  enabled=lambda _: not self.controller.running),
             item('停止服务', self.stop_service_from_tray,
@@ -572,8 +3278,24 @@ class MainWindow:
         # 在后台线程运行
         threading.Thread(target=self.tray_icon.run, daemon=True).start()
     
+    def load_icon_image(self):
+        """加载托盘图标，首次运行时绘制并缓存为 PNG"""
+        try:
+            image = Image.open(ICON_CACHE)
+            image.load()
+            return image
+        except OSError:
+            pass
+        image = self.create_icon_image()
+        try:
+            image.save(ICON_CACHE)
+        except OSError as e:
+            log.warning("缓存托盘图标失败: %s", e)
+        return image
+    
     def create_icon_image(self):
         """创建托盘图标图像"""
+        from PIL import ImageDraw
         # 创建一个简单的太阳图标
         width = 64
         height = 64
@@ -592,7 +3314,6 @@ class MainWindow:
         # 绘制光线
         center = width // 2
         for angle in range(0, 360, 45):
-            import math
             rad = math.radians(angle)
             x1 = center + int((width // 4) * math.cos(rad))
             y1 = center + int((height // 4) * math.sin(rad))
@@ -619,6 +3340,12 @@ class MainWindow:
         self.status_label = ttk.Label(status_frame, text="未启动", font=('', 10))
         self.status_label.pack()
         
+        self.metrics_label = ttk.Label(status_frame, text="", font=('', 8), foreground='gray')
+        self.metrics_label.pack(side=tk.BOTTOM, anchor=tk.W)
+        
+        # 历史曲线
+        self.history_chart = HistoryChart(main_frame, lambda: self.controller.history)
+        
         # 控制按钮
         control_frame = ttk.Frame(main_frame)
         control_frame.pack(fill=tk.X, pady=(0, 10))
@@ -640,19 +3367,79 @@ class MainWindow:
         self.info_text = tk.Text(info_frame, height=6, wrap=tk.WORD, state=tk.DISABLED)
         self.info_text.pack(fill=tk.X)
         
+        self.widgets_created = True
         self.update_info_display()
+        self.update_buttons()
+        if self.status_text is not None:
+            self.status_label.config(text=self.status_text)
+    
+    def drain_status(self):
+        """取出队列中最新的状态并显示（在 Tk 主线程中定时执行）"""
+        try:
+            message = self.status_queue.drain()
+            if message is not None:
+                self.update_status(message)
+        finally:
+            # 显示出错也不能中断之后的状态刷新
+            self.root.after(self.STATUS_REFRESH_MS, self.drain_status)
+    
+    def refresh_metrics(self):
+        """刷新耗时摘要"""
+        if not self.is_hidden and self.widgets_created:
+            self.metrics_label.config(text=self.controller.metrics_summary())
+        self.root.after(self.METRICS_REFRESH_MS, self.refresh_metrics)
+    
+    def refresh_history(self):
+        """窗口可见时刷新历史曲线"""
+        if not self.is_hidden and self.widgets_created:
+            self.history_chart.refresh()
+        self.root.after(self.HISTORY_REFRESH_MS, self.refresh_history)
+    
+    def watch_config(self):
+        """配置文件被外部修改（手工编辑或统一下发）时按新配置生效，无需重启"""
+        try:
+            new_config = self.config_watcher.poll()
+        except Exception as e:
+            self.update_status(f"配置文件有误，沿用当前配置: {str(e)[:40]}")
+            new_config = None
+        if new_config is not None and new_config != self.config:
+            self.apply_config(new_config)
+            self.update_status("已载入修改后的配置文件")
+        self.root.after(self.CONFIG_WATCH_MS, self.watch_config)
+    
+    def apply_config(self, new_config):
+        """新配置交给控制器按差异生效，并刷新界面"""
+        self.config = new_config
+        self.controller.reload_config(new_config)
+        if self.widgets_created:
+            self.update_info_display()
     
     def update_status(self, message):
-        """更新状态显示"""
-        self.status_label.config(text=message)
+        """更新状态显示，只在文本变化时重绘"""
+        if message != self.status_text:
+            self.status_text = message
+            if self.widgets_created:
+                self.status_label.config(text=message)
         # 更新托盘图标提示
         if self.tray_icon:
             status = "运行中" if self.controller.running else "已停止"
-            self.tray_icon.title = f"自动屏幕亮度调节 - {status}\n{message}"
+            if self.controller.running and self.controller.breaker.state != SensorBreaker.CLOSED:
+                status += f" / 传感器{self.controller.breaker.label}"
+            first_line = message.splitlines()[0] if message else ""
+            title = f"自动屏幕亮度调节 - {status}\n{first_line}"[:self.TRAY_TITLE_MAX]
+            if title != self.tray_title:
+                self.tray_title = title
+                self.tray_icon.title = title
+    
+    def update_buttons(self):
+        """按服务状态启用或禁用按钮"""
+        running = self.controller.running
+        self.start_button.config(state=tk.DISABLED if running else tk.NORMAL)
+        self.stop_button.config(state=tk.NORMAL if running else tk.DISABLED)
     
     def update_info_display(self):
         """更新配置信息显示"""
-        info = f"""传感器: {self.config['sensor_url']}
+        info = f"""传感器: {self.config['sensor_url']} [{self.config.get('sensor_source', 'http')}]
 刷新间隔: {self.config['interval']} 秒
 亮度范围: {self.config['min_brightness']}% - {self.config['max_brightness']}%
 灵敏度: {self.config['threshold']}%"""
@@ -665,14 +3452,14 @@ class MainWindow:
     def start_service(self):
         """启动服务"""
         self.controller.start()
-        self.start_button.config(state=tk.DISABLED)
-        self.stop_button.config(state=tk.NORMAL)
+        if self.widgets_created:
+            self.update_buttons()
     
     def stop_service(self):
         """停止服务"""
         self.controller.stop()
-        self.start_button.config(state=tk.NORMAL)
-        self.stop_button.config(state=tk.DISABLED)
+        if self.widgets_created:
+            self.update_buttons()
     
     def start_service_from_tray(self):
         """从托盘启动服务"""
@@ -686,13 +3473,12 @@ class MainWindow:
         """打开设置窗口"""
         def on_save(new_config):
             if ConfigManager.save(new_config):
-                self.config = new_config
-                self.controller.reload_config(new_config)
-                self.update_info_display()
+                self.config_watcher.mark_saved()
+                self.apply_config(new_config)
                 return True
             return False
         
-        SettingsWindow(self.root, self.config, on_save)
+        SettingsWindow(self.root, self.config, on_save, self.probes)
     
     def open_settings_from_tray(self):
         """从托盘打开设置"""
@@ -704,12 +3490,19 @@ class MainWindow:
         self.root.withdraw()
         self.is_hidden = True
     
+    def show_window_from_tray(self):
+        """从托盘显示主窗口"""
+        self.root.after(0, self.show_window)
+    
     def show_window(self):
         """显示窗口"""
+        if not self.widgets_created:
+            self.create_widgets()
         self.root.deiconify()
         self.root.lift()
         self.root.focus_force()
         self.is_hidden = False
+        self.root.after(100, self.history_chart.refresh)
     
     def quit_app(self):
         """退出应用"""
@@ -717,6 +3510,7 @@ class MainWindow:
             self.controller.stop()
         if self.tray_icon:
             self.tray_icon.stop()
+        self.probes.shutdown()
         self.root.quit()
     
     def run(self):
@@ -724,5 +3518,6 @@ class MainWindow:
         self.root.mainloop()
 
 if __name__ == "__main__":
+    setup_logging()
     app = MainWindow()
     app.run()
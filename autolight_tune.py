@@ -0,0 +1,383 @@
+"""离线参数自动调优
+
+在录制的或合成的环境亮度序列上，一次扫描整张参数网格（灵敏度阈值、轮询间隔、滤波参数、
+曲线 gamma），为每组参数打分：
+- 亮度命令数
+- 跟踪误差：屏幕亮度与按曲线直接映射的亮度之差的时间平均 (%)
+- 稳定时间：屏幕亮度偏离超过容差后回到容差以内的平均用时 (秒)
+
+三项都是越小越好，互相制约；输出 Pareto 最优（任一项都无法在不牺牲其他项的情况下改进）的参数，
+每组写成一份与 AutoDisplayLight_config.json 格式相同的配置文件。
+
+逐组参数运行控制器太慢（网格有数千组），这里把所有参数组的滤波状态放在 numpy 数组中，
+时间只循环一遍。模型与 autolight_replay.py 的回放有以下简化：
+- 平滑过渡在下一个目标到达前完成；命令数按过渡引擎的帧规划精确计算，但不计令牌桶限速
+- 读取失败只跳过本次读数，不模拟断路器
+- 读数按序列步长取样，轮询间隔不是步长的整数倍时向上取整
+因此模型的命令数与实际控制器有出入（合成的一天上平均约 4%，个别配置约 12%），
+--verify 用实际控制器回放选出的配置，列出每组的偏差。
+
+用法:
+    python autolight_tune.py --synthetic -o tuned                     # 合成的一天，默认网格
+    python autolight_tune.py trace.csv -o tuned --grid threshold=2,3,5 --grid curve_gamma=0.8,1,1.2
+    python autolight_tune.py --history 72 -c my.json -o tuned --verify
+
+需要 numpy（pip install numpy），托盘程序本身不依赖它。
+"""
+import argparse
+import itertools
+import json
+import sys
+import time
+from pathlib import Path
+
+from autolight_replay import Trace, replay
+from autolight_tray import EASINGS, ConfigManager, ResponseCurve
+
+np = None
+
+# 默认网格；--grid 指定的项替换对应的默认值。
+# 过渡时长与亮度差成正比，默认每帧约变化 100 / transition_max_frames = 10%，
+# 小于此值的 transition_step 不影响命令数，默认不扫描（可用 --grid 加入）
+DEFAULT_GRID = {
+    'threshold': [1, 2, 3, 5, 8],
+    'interval': [2, 5, 10],
+    'filter_median_window': [1, 3, 5],
+    'filter_ema_alpha': [0.3, 0.5, 1.0],
+    'filter_settle_time': [0, 30, 120],
+    'curve_gamma': [0.8, 1.0, 1.5],
+}
+
+# 模型支持扫描的配置项
+TUNABLE = ('threshold', 'interval', 'interval_min', 'interval_max', 'interval_backoff',
+           'transition_step', 'filter_median_window', 'filter_ema_alpha', 'filter_settle_time',
+           'min_change_interval', 'curve_gamma')
+
+
+def load_numpy():
+    """导入 numpy（调优前调用）"""
+    global np
+    if np is None:
+        try:
+            import numpy as np
+        except ImportError:
+            raise SystemExit("自动调优需要 numpy，请先安装: pip install numpy") from None
+
+
+def resample(trace, step):
+    """按 step 秒等间隔取样，返回 (时刻, 读数)，读取失败为 NaN"""
+    times = np.arange(trace.start, trace.end + step / 2, step)
+    index = np.searchsorted(np.asarray(trace.times), times, side='right') - 1
+    values = np.array([np.nan if v is None else v for v in trace.values])
+    return times, values[index]
+
+
+def map_readings(config, values, gammas):
+    """各 gamma 下每个读数映射后的亮度 [gamma, 时刻]，取整方式与 ResponseCurve 的查找表相同"""
+    mode = config.get('curve_mode', 'gamma')
+    gammas = np.maximum(0.1, np.asarray(gammas, float))
+    if mode == 'log_lux':
+        lux_min = max(0.1, config.get('curve_lux_min', 1))
+        lux_max = max(lux_min + 1, config.get('curve_lux_max', 10000))
+        last = ResponseCurve.LUX_ENTRIES - 1
+        scale = last / np.log10(lux_max / lux_min)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log = np.where(values > 0, np.log10(values) - np.log10(lux_min), -1.0)
+        index = np.clip(np.floor(log * scale + 0.5), 0, last)
+        x = np.where(np.isnan(values), np.nan, index / last)
+    else:
+        index = np.clip(np.floor(values * 10 + 0.5), 0, 1000)
+        points = sorted((float(x), float(y)) for x, y in config.get('curve_points', [[0, 0], [100, 100]]))
+        if mode == 'points' and len(points) >= 2:
+            # 控制点曲线与 gamma 无关
+            xs, ys = zip(*points)
+            return np.broadcast_to(np.interp(index / 10, xs, ys), (len(gammas), len(values)))
+        x = index / 1000
+    return 100 * x[None, :] ** gammas[:, None]
+
+
+def ramp_commands(config, steps):
+    """按过渡引擎的帧规划，计算从亮度 a 过渡到 b 发出的命令数 [步长, a, b] 和过渡时长 [a, b]"""
+    levels = np.arange(101)
+    a, b = levels[:, None], levels[None, :]
+    if not config.get('smooth_transition', True):
+        return np.broadcast_to((a != b).astype(int), (len(steps), 101, 101)), np.zeros((101, 101))
+    duration = config.get('transition_duration', 1.5)
+    max_frames = max(1, config.get('transition_max_frames', 10))
+    frame = max(config.get('transition_delay', 0.05), duration / max_frames)
+    easing = EASINGS.get(config.get('transition_easing', 'ease_in_out'), EASINGS['linear'])
+    length = np.maximum(frame, duration * np.abs(b - a) / 100)
+    counts = np.zeros((len(steps), 101, 101), int)
+    for i, step in enumerate(steps):
+        step = max(1, step)
+        applied = np.broadcast_to(a, (101, 101)).astype(float)
+        active = a != b
+        j = 0
+        while active.any():
+            now = j * frame
+            done = now >= length
+            value = np.where(done, b, a + (b - a) * easing(np.minimum(now / length, 1)))
+            level = np.round(value)
+            # 变化小于最小步长的中间帧不发送
+            send = active & (level != applied) & (done | (np.abs(level - applied) >= step))
+            counts[i] += send
+            applied = np.where(send, level, applied)
+            active &= ~done
+            j += 1
+    return counts, length
+
+
+def simulate(config, params, times, values, tolerance=5.0, block=1024):
+    """模拟各组参数，params 为 {配置项: 每组的取值}，返回 {指标: 每组的值}"""
+    n = len(next(iter(params.values())))
+
+    def param(key):
+        return np.broadcast_to(np.asarray(params.get(key, config[key]), float), (n,)).copy()
+
+    step = times[1] - times[0] if len(times) > 1 else 1.0
+    adaptive = config.get('adaptive_interval', True) and 'interval' not in params
+    threshold = param('threshold')
+    settle_time = param('filter_settle_time')
+    alpha = param('filter_ema_alpha')
+    min_change = param('min_change_interval')
+    window = np.maximum(1, param('filter_median_window').astype(int))
+    interval_min = param('interval_min')
+    interval_max = np.maximum(interval_min, param('interval_max'))
+    backoff = np.maximum(1.0, param('interval_backoff'))
+    interval = interval_min.copy() if adaptive else param('interval')
+    gammas, gamma_index = np.unique(param('curve_gamma'), return_inverse=True)
+    steps, step_index = np.unique(param('transition_step'), return_inverse=True)
+    mapped = map_readings(config, values, gammas)
+    ideal = np.clip(mapped, config['min_brightness'], config['max_brightness'])
+    ramp_counts, ramp_length = ramp_commands(config, steps)
+
+    nan = np.full(n, np.nan)
+    median_buffer = np.full((n, window.max()), np.nan)
+    median_pos = np.zeros(n, int)
+    median_count = np.zeros(n, int)
+    ema = nan.copy()
+    held = nan.copy()
+    drift_side = np.zeros(n)
+    drift_since = np.zeros(n)
+    pending = nan.copy()
+    last_change = nan.copy()
+    last_reading = nan.copy()
+    next_poll = np.full(n, times[0])
+    applied = nan.copy()
+    display = nan.copy()
+    display_next = nan.copy()
+    display_at = np.full(n, np.inf)
+    commands = np.zeros(n, int)
+
+    shown = np.empty((n, block))
+    error_sum = np.zeros(n)
+    error_count = np.zeros(n, int)
+    outside_ticks = np.zeros(n, int)
+    episodes = np.zeros(n, int)
+    was_outside = np.zeros(n, bool)
+
+    def score(start, count):
+        nonlocal was_outside
+        error = np.abs(shown[:, :count] - ideal[gamma_index, start:start + count])
+        valid = ~np.isnan(error)
+        error_sum[:] += np.where(valid, error, 0).sum(1)
+        error_count[:] += valid.sum(1)
+        outside = valid & (error > tolerance)
+        before = np.concatenate([was_outside[:, None], outside[:, :-1]], axis=1)
+        episodes[:] += (outside & ~before).sum(1)
+        outside_ticks[:] += outside.sum(1)
+        was_outside = outside[:, -1]
+
+    column = block_start = 0
+    for k, now in enumerate(times):
+        due = np.flatnonzero(next_poll <= now + 1e-9)
+        reading = values[k]
+        if due.size and not np.isnan(reading):
+            i = due
+            # 中值：缓冲区未满时只取已有读数，NaN 排在最后
+            v = mapped[gamma_index[i], k]
+            median_buffer[i, median_pos[i]] = v
+            median_pos[i] = (median_pos[i] + 1) % window[i]
+            median_count[i] = np.minimum(median_count[i] + 1, window[i])
+            v = np.sort(median_buffer[i], axis=1)[np.arange(i.size), median_count[i] // 2]
+            # EMA（alpha >= 1 时不启用）
+            e = ema[i]
+            e = np.where(np.isnan(e) | (alpha[i] >= 1), v, e + alpha[i] * (v - e))
+            ema[i] = v = e
+            # 迟滞
+            out = held[i]
+            band = threshold[i]
+            diff = np.abs(v - out)
+            emit = np.isnan(out) | (diff > band)
+            side = np.where(v > out, 1.0, -1.0)
+            drifting = ~emit & (settle_time[i] > 0) & (diff > band / 2)
+            restart = drifting & (drift_side[i] != side)
+            emit |= drifting & ~restart & (now - drift_since[i] >= settle_time[i])
+            drift_since[i] = np.where(restart, now, drift_since[i])
+            drift_side[i] = np.where(restart, side, np.where(drifting & ~emit, drift_side[i], 0))
+            held[i] = np.where(emit, v, out)
+            # 最短间隔
+            wait = np.where(emit, v, pending[i])
+            last = last_change[i]
+            release = ~np.isnan(wait) & (np.isnan(last) | (now - last >= min_change[i]))
+            pending[i] = np.where(release, np.nan, wait)
+            last_change[i] = np.where(release, now, last)
+            # 下发：第一次直接设置，之后按过渡命令表计数
+            j = i[release]
+            if j.size:
+                level = np.trunc(np.clip(wait[release], config['min_brightness'], config['max_brightness']))
+                first = np.isnan(applied[j])
+                a = np.where(first, level, applied[j]).astype(int)
+                b = level.astype(int)
+                commands[j] += np.where(first, 1, ramp_counts[step_index[j], a, b])
+                display_next[j] = level
+                display_at[j] = now + np.where(first, 0, ramp_length[a, b])
+                applied[j] = level
+            # 轮询间隔
+            if adaptive:
+                delta = np.abs(reading - last_reading[i])
+                interval[i] = np.where(np.isnan(last_reading[i]) | (delta > threshold[i]), interval_min[i],
+                                       np.where(delta > threshold[i] / 2, interval[i],
+                                                np.minimum(interval[i] * backoff[i], interval_max[i])))
+                last_reading[i] = reading
+        if due.size:
+            next_poll[due] = now + interval[due]
+
+        arrived = display_at <= now + 1e-9
+        if arrived.any():
+            display[arrived] = display_next[arrived]
+            display_at[arrived] = np.inf
+        shown[:, column] = display
+        column += 1
+        if column == block:
+            score(block_start, column)
+            block_start += column
+            column = 0
+    if column:
+        score(block_start, column)
+
+    return {
+        'commands': commands,
+        'error': error_sum / np.maximum(error_count, 1),
+        'settle': outside_ticks * step / np.maximum(episodes, 1),
+    }
+
+
+def pareto_front(scores, chunk=256):
+    """非支配解的下标（各列越小越好），得分完全相同的只保留一个"""
+    keep = np.ones(len(scores), bool)
+    for start in range(0, len(scores), chunk):
+        part = scores[start:start + chunk, None, :]
+        dominated = (scores[None] <= part).all(2) & (scores[None] < part).any(2)
+        keep[start:start + chunk] = ~dominated.any(1)
+    front = np.flatnonzero(keep)
+    _, first = np.unique(scores[front], axis=0, return_index=True)
+    return front[np.sort(first)]
+
+
+def parse_grid(items):
+    """解析 --grid 键=值1,值2,...，值按 JSON 解析"""
+    grid = {}
+    for item in items:
+        key, sep, values = item.partition('=')
+        if not sep or not values:
+            raise ValueError(f"应为 键=值1,值2,...: {item}")
+        if key not in TUNABLE:
+            raise ValueError(f"不支持调优的配置项: {key}（可选: {', '.join(TUNABLE)}）")
+        grid[key] = [json.loads(value) for value in values.split(',')]
+    return grid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="自动亮度离线参数调优（需要 numpy）")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('trace', nargs='?', help="CSV 序列：时间(秒),环境亮度(%%)")
+    source.add_argument('--synthetic', action='store_true', help="使用合成的一天")
+    source.add_argument('--history', type=float, metavar='HOURS', help="使用最近若干小时的历史记录")
+    parser.add_argument('--seed', type=int, default=0, help="合成序列的随机种子")
+    parser.add_argument('-c', '--config', help="基础配置文件（JSON），默认为程序当前配置")
+    parser.add_argument('--grid', action='append', default=[], metavar='KEY=V1,V2',
+                        help="扫描的取值，替换默认网格中的同名项（可重复）")
+    parser.add_argument('--step', type=float, default=1.0, help="取样步长（秒）")
+    parser.add_argument('--tolerance', type=float, default=5.0, help="稳定时间的容差 (%%)")
+    parser.add_argument('--limit', type=int, default=10, help="最多输出的配置数，从 Pareto 前沿中均匀选取")
+    parser.add_argument('-o', '--output', help="输出目录，每组配置一个 JSON 文件")
+    parser.add_argument('--verify', action='store_true', help="用实际控制器回放选出的配置，核对命令数")
+    args = parser.parse_args()
+    load_numpy()
+
+    if args.synthetic:
+        trace = Trace.synthetic_day(step=args.step, seed=args.seed)
+    elif args.history:
+        trace = Trace.from_history(args.history)
+    else:
+        trace = Trace.from_csv(args.trace)
+    base = ConfigManager.load(args.config)
+    grid = dict(DEFAULT_GRID)
+    if base.get('adaptive_interval', True):
+        # 自适应轮询时 interval 不起作用，改为扫描上限
+        grid['interval_max'] = [10, 30, 60]
+        del grid['interval']
+    try:
+        overrides = parse_grid(args.grid)
+    except ValueError as e:
+        parser.error(str(e))
+    if 'interval' in overrides:
+        grid.pop('interval_max', None)
+    grid.update(overrides)
+
+    keys = list(grid)
+    combos = list(itertools.product(*grid.values()))
+    params = {key: np.array([combo[n] for combo in combos], float) for n, key in enumerate(keys)}
+    times, values = resample(trace, args.step)
+    print(f"模拟 {len(combos)} 组参数 × {len(times)} 个时刻 ...", file=sys.stderr)
+    start = time.perf_counter()
+    result = simulate(base, params, times, values, args.tolerance)
+    print(f"用时 {time.perf_counter() - start:.1f} 秒", file=sys.stderr)
+
+    scores = np.column_stack([result['commands'], result['error'], result['settle']])
+    front = pareto_front(scores)
+    front = front[np.lexsort((scores[front, 1], scores[front, 0]))]
+    size = len(front)
+    if size > args.limit:
+        front = front[np.unique(np.linspace(0, size - 1, args.limit).round().astype(int))]
+    print(f"Pareto 前沿 {size} 组，输出 {len(front)} 组", file=sys.stderr)
+
+    varied = [key for key in keys if len(grid[key]) > 1]
+    output = Path(args.output) if args.output else None
+    if output:
+        try:
+            output.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            parser.error(f"无法创建输出目录: {e}")
+    deviations = []
+    failed = 0
+    print(f"{'#':>3} 命令数 跟踪误差 稳定时间  参数")
+    for rank, index in enumerate(front, 1):
+        tuned = dict(zip(keys, combos[index]))
+        config = {**base, **tuned}
+        if 'interval' in tuned:
+            config['adaptive_interval'] = False
+        line = (f"{rank:>3} {result['commands'][index]:>6} {result['error'][index]:>7.2f}% "
+                f"{result['settle'][index]:>7.1f}s  " + " ".join(f"{key}={tuned[key]}" for key in varied))
+        if args.verify:
+            commands, _ = replay(config, trace)
+            deviation = (result['commands'][index] - len(commands)) / max(len(commands), 1)
+            deviations.append(abs(deviation))
+            line += f"  [回放 {len(commands)} 条命令，模型偏差 {deviation:+.0%}]"
+        print(line)
+        if output and not ConfigManager.save(config, output / f"AutoDisplayLight_config_{rank:02d}.json"):
+            failed += 1
+    if deviations:
+        print(f"模型命令数与回放的偏差：平均 {sum(deviations) / len(deviations):.0%}，"
+              f"最大 {max(deviations):.0%}", file=sys.stderr)
+    if output:
+        if failed:
+            print(f"{failed} 份配置写入 {output} 失败", file=sys.stderr)
+            return 1
+        print(f"配置已写入 {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
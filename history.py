@@ -0,0 +1,244 @@
+"""传感器与亮度历史记录
+
+- 定长二进制记录：时间戳、环境亮度、目标亮度、实际亮度，每条 8 字节
+- 新记录先进入内存中的定长环形缓冲，定时批量写入内存映射的分段文件
+- 分段文件写满后滚动到下一个，总大小超过上限时删除最旧的分段
+- 读数不变时只按心跳间隔记录，长期稳定的读数几乎不占空间
+"""
+import bisect
+import mmap
+import struct
+import threading
+import time
+from pathlib import Path
+
+# 时间戳 (uint32 秒)、环境亮度 (uint16，百分比 × 100)、目标亮度 (uint8)、实际亮度 (uint8)
+RECORD = struct.Struct('<IHBB')
+NO_AMBIENT = 0xFFFF
+NO_LEVEL = 0xFF
+
+
+def encode(ambient, target, applied):
+    """把读数编码为记录字段，None 使用保留值"""
+    return (
+        NO_AMBIENT if ambient is None else int(round(max(0.0, min(100.0, ambient)) * 100)),
+        NO_LEVEL if target is None else int(max(0, min(100, round(target)))),
+        NO_LEVEL if applied is None else int(max(0, min(100, round(applied)))),
+    )
+
+
+def decode(record):
+    """记录解码为 (时间戳, 环境亮度, 目标亮度, 实际亮度)"""
+    ts, ambient, target, applied = record
+    return (
+        ts,
+        None if ambient == NO_AMBIENT else ambient / 100,
+        None if target == NO_LEVEL else target,
+        None if applied == NO_LEVEL else applied,
+    )
+
+
+class HistoryRing:
+    """内存中的定长环形缓冲，满时覆盖最旧的记录"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity * RECORD.size)
+        self.start = 0
+        self.count = 0
+
+    def append(self, record):
+        index = (self.start + self.count) % self.capacity
+        RECORD.pack_into(self.buffer, index * RECORD.size, *record)
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def latest(self, n):
+        """按时间顺序返回最新的 n 条记录"""
+        n = min(n, self.count)
+        first = self.start + self.count - n
+        return [RECORD.unpack_from(self.buffer, ((first + i) % self.capacity) * RECORD.size)
+                for i in range(n)]
+
+
+class _Segment:
+    """一个内存映射的分段文件，未写入的记录全为 0"""
+
+    def __init__(self, path, records, writable):
+        self.path = path
+        size = records * RECORD.size
+        if writable:
+            self.file = open(path, 'r+b' if path.exists() else 'w+b')
+            if self.file.seek(0, 2) < size:
+                self.file.truncate(size)
+            self.map = mmap.mmap(self.file.fileno(), size)
+        else:
+            self.file = open(path, 'rb')
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.records = len(self.map) // RECORD.size
+        self.length = self._find_end()
+
+    def timestamp(self, index):
+        return RECORD.unpack_from(self.map, index * RECORD.size)[0]
+
+    def _find_end(self):
+        """二分查找第一条空记录（时间戳为 0）"""
+        lo, hi = 0, self.records
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamp(mid):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def write(self, record):
+        RECORD.pack_into(self.map, self.length * RECORD.size, *record)
+        self.length += 1
+
+    def read_range(self, start, end):
+        """读取时间戳在 [start, end] 内的记录，只访问这一段数据"""
+        if not self.length or self.timestamp(0) > end or self.timestamp(self.length - 1) < start:
+            return []
+        keys = _TimestampView(self)
+        first = bisect.bisect_left(keys, start)
+        last = bisect.bisect_right(keys, end)
+        return [RECORD.unpack_from(self.map, i * RECORD.size) for i in range(first, last)]
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+class _TimestampView:
+    """把分段文件中的时间戳当作有序序列供 bisect 使用"""
+
+    def __init__(self, segment):
+        self.segment = segment
+
+    def __len__(self):
+        return self.segment.length
+
+    def __getitem__(self, index):
+        return self.segment.timestamp(index)
+
+
+class HistoryStore:
+    """追加式历史记录，可在任意线程读写"""
+
+    FLUSH_INTERVAL = 60
+
+    def __init__(self, directory, max_bytes=16 * 1024 * 1024, segment_bytes=1024 * 1024,
+                 ring_capacity=4096, heartbeat=60):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_records = segment_bytes // RECORD.size
+        self.max_segments = max(2, max_bytes // segment_bytes)
+        self.heartbeat = heartbeat
+        self.lock = threading.Lock()
+        # 串行化写盘与关闭；写盘期间只在复制记录时持有 lock，不阻塞 append
+        self.flush_lock = threading.Lock()
+        self.closed = False
+        self.ring = HistoryRing(ring_capacity)
+        self.unflushed = 0
+        self.last = None  # (时间戳, 编码后的读数)
+        self.last_flush = time.monotonic()
+        segments = self.segment_paths()
+        path = segments[-1] if segments else self.directory / "history-000001.bin"
+        self.segment = _Segment(path, self.segment_records, writable=True)
+        if self.segment.length:
+            ts, *values = RECORD.unpack_from(self.segment.map, (self.segment.length - 1) * RECORD.size)
+            self.last = (ts, tuple(values))
+
+    def segment_paths(self):
+        """按时间顺序列出所有分段文件"""
+        return sorted(self.directory.glob("history-*.bin"))
+
+    def append(self, timestamp, ambient, target, applied):
+        """追加一条记录，读数与上一条相同且未到心跳间隔时跳过，返回是否记录"""
+        values = encode(ambient, target, applied)
+        ts = int(timestamp)
+        with self.lock:
+            if self.last:
+                # 每秒最多一条记录，时间戳保持递增以便二分查找
+                if ts <= self.last[0]:
+                    return False
+                if self.last[1] == values and ts - self.last[0] < self.heartbeat:
+                    return False
+            self.ring.append((ts, *values))
+            self.unflushed = min(self.unflushed + 1, self.ring.capacity)
+            self.last = (ts, values)
+            return True
+
+    def flush_due(self):
+        """距上次写盘超过 FLUSH_INTERVAL 秒或缓冲将满"""
+        return bool(self.unflushed) and (time.monotonic() - self.last_flush >= self.FLUSH_INTERVAL
+                                         or self.unflushed >= self.ring.capacity // 2)
+
+    def maybe_flush(self):
+        """需要时写盘"""
+        if self.flush_due():
+            self.flush()
+
+    def flush(self):
+        """把缓冲中的新记录写入分段文件并同步到磁盘（阻塞，应在工作线程中调用）"""
+        with self.flush_lock:
+            if self.closed:
+                return
+            with self.lock:
+                for record in self.ring.latest(self.unflushed):
+                    if self.segment.length >= self.segment.records:
+                        self._rollover()
+                    self.segment.write(record)
+                self.unflushed = 0
+                segment = self.segment
+            # msync 可能要等磁盘，此时 append 和 read_range 照常进行
+            segment.map.flush()
+            self.last_flush = time.monotonic()
+
+    def _rollover(self):
+        """当前分段写满，换到下一个分段并删除超出上限的旧分段"""
+        number = int(self.segment.path.stem.split('-')[1]) + 1
+        self.segment.map.flush()
+        self.segment.close()
+        self.segment = _Segment(self.directory / f"history-{number:06d}.bin",
+                                self.segment_records, writable=True)
+        for path in self.segment_paths()[:-self.max_segments]:
+            path.unlink()
+
+    def read_range(self, start, end):
+        """读取时间范围内的记录（含尚未写盘的），返回解码后的列表
+
+        只在读取当前分段和环形缓冲时持有锁；已写满的分段在锁外打开和读取，
+        界面线程读取历史时不会阻塞事件循环追加记录。
+        """
+        paths = self.segment_paths()
+        with self.lock:
+            current = self.segment.path
+            tail = self.segment.read_range(start, end)
+            tail += [r for r in self.ring.latest(self.unflushed) if start <= r[0] <= end]
+        records = []
+        for path in paths:
+            # 当前分段已在锁内读过；列出文件之后才滚动出来的分段也不会比它新
+            if path >= current:
+                continue
+            try:
+                segment = _Segment(path, self.segment_records, writable=False)
+            except (OSError, ValueError):
+                # 读取期间超出上限被删除
+                continue
+            try:
+                records += segment.read_range(start, end)
+            finally:
+                segment.close()
+        return [decode(r) for r in records + tail]
+
+    def close(self):
+        """写盘并关闭（阻塞，应在工作线程中调用）"""
+        self.flush()
+        with self.flush_lock, self.lock:
+            if not self.closed:
+                self.closed = True
+                self.segment.close()
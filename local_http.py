@@ -0,0 +1,50 @@
+"""极简 HTTP/1.1 服务（指标端点与局域网中继共用）
+
+每个连接只处理一个请求，请求头读完即丢弃，响应后关闭连接；读取超时或客户端
+断开时直接关闭，不影响事件循环中的其他任务。
+"""
+import asyncio
+
+# 读取请求行和每一行请求头的超时（秒）
+REQUEST_TIMEOUT = 5
+
+
+async def read_request(reader, timeout=REQUEST_TIMEOUT):
+    """读取请求行并丢弃请求头，返回 (方法, 不含查询串的路径)；请求行无效时为 (None, None)"""
+    request_line = await asyncio.wait_for(reader.readline(), timeout)
+    while True:
+        line = await asyncio.wait_for(reader.readline(), timeout)
+        if line in (b'\r\n', b'\n', b''):
+            break
+    parts = request_line.decode('latin-1').split()
+    if len(parts) < 2:
+        return None, None
+    return parts[0], parts[1].split('?')[0]
+
+
+async def write_response(writer, status, content_type, body):
+    """写出完整响应，响应后连接即关闭"""
+    writer.write(f"HTTP/1.1 {status}\r\n"
+                 f"Content-Type: {content_type}\r\n"
+                 f"Content-Length: {len(body)}\r\n"
+                 f"Cache-Control: no-store\r\n"
+                 f"Connection: close\r\n\r\n".encode('latin-1') + body)
+    await writer.drain()
+
+
+async def start_server(respond, host, port):
+    """在当前事件循环中启动服务
+
+    respond(方法, 路径) 在事件循环中调用，返回 (状态, 内容类型, 内容字节)。
+    """
+
+    async def handle(reader, writer):
+        try:
+            method, path = await read_request(reader)
+            await write_response(writer, *respond(method, path))
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,134 @@
+"""控制循环耗时统计
+
+- 固定桶的耗时直方图，内存占用与运行时长无关
+- 错误与跳过次数计数器
+- 可选的本机 HTTP 端点，以 Prometheus 文本格式输出
+"""
+import threading
+
+from local_http import start_server
+
+# 直方图桶上限（秒），覆盖从 sysfs 写入到 mDNS 超时的范围
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """固定桶耗时直方图"""
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个桶为 +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        """记录一次耗时"""
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """按桶上限估算分位数，没有数据时返回 None"""
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float('inf')
+
+    def render(self, prefix):
+        """输出 Prometheus 文本格式"""
+        name = f"{prefix}_{self.name}_seconds"
+        lines = [f"# HELP {name} {self.help_text}", f"# TYPE {name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum {self.sum:.6f}")
+        lines.append(f"{name}_count {self.count}")
+        return lines
+
+
+class Metrics:
+    """直方图与计数器的集合，可在任意线程读写"""
+
+    def __init__(self, prefix="autolight"):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}  # 名称 -> [说明, 数值]
+
+    def histogram(self, name, help_text):
+        """注册直方图"""
+        self.histograms[name] = Histogram(name, help_text)
+
+    def counter(self, name, help_text):
+        """注册计数器"""
+        self.counters[name] = [help_text, 0]
+
+    def observe(self, name, seconds):
+        """向直方图记录一次耗时"""
+        with self.lock:
+            self.histograms[name].observe(seconds)
+
+    def inc(self, name, amount=1):
+        """计数器加一"""
+        with self.lock:
+            self.counters[name][1] += amount
+
+    def value(self, name):
+        """读取计数器"""
+        with self.lock:
+            return self.counters[name][1]
+
+    def quantile(self, name, q):
+        """读取直方图分位数估计"""
+        with self.lock:
+            return self.histograms[name].quantile(q)
+
+    def render(self):
+        """输出全部指标的 Prometheus 文本"""
+        lines = []
+        with self.lock:
+            for histogram in self.histograms.values():
+                lines += histogram.render(self.prefix)
+            for name, (help_text, value) in self.counters.items():
+                full = f"{self.prefix}_{name}_total"
+                lines += [f"# HELP {full} {help_text}", f"# TYPE {full} counter", f"{full} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def format_quantiles(self, name, label):
+        """格式化一个直方图的 p50 / p95，如 "读取 p50 12ms p95 40ms" """
+        p50, p95 = self.quantile(name, 0.5), self.quantile(name, 0.95)
+        if p50 is None:
+            return f"{label} -"
+        return f"{label} p50 {_format_ms(p50)} p95 {_format_ms(p95)}"
+
+
+def _format_ms(seconds):
+    if seconds == float('inf'):
+        return f">{DEFAULT_BUCKETS[-1]:.0f}s"
+    return f"≤{seconds * 1000:.0f}ms" if seconds < 1 else f"≤{seconds:.1f}s"
+
+
+async def serve_metrics(metrics, port, host="127.0.0.1"):
+    """在当前事件循环中启动指标端点，GET /metrics 返回全部指标"""
+
+    def respond(method, path):
+        if method == 'GET' and path in ('/', '/metrics'):
+            return "200 OK", PROMETHEUS_TYPE, metrics.render().encode('utf-8')
+        return "404 Not Found", PROMETHEUS_TYPE, b"not found\n"
+
+    return await start_server(respond, host, port)
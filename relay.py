@@ -0,0 +1,147 @@
+"""局域网传感器中继
+
+一台机器读取 ESP32（轮询、事件流或 UDP 均可），把最新读数转发给同一网段的其他实例：
+
+- UDP 组播：新读数立即发送，空闲时按心跳重发，格式与 esp32c3.yaml 的 UDP 广播相同，
+  另带 seq、启动标识 boot、时间戳 ts、读数年龄 age 和 HTTP 端口，客户端据此发现中继；
+  中继重启后 seq 从头开始，boot 随之改变
+- HTTP：与 ESPHome web_server 相同的 /sensor/<实体> 接口，另有 /relay 返回全部读数
+
+读数超过 max_age 秒未更新时不再发送，HTTP 返回 503，客户端不会拿到过期数据。
+无论有多少客户端，ESP32 只被中继读取一次。
+"""
+import asyncio
+import json
+import random
+import socket
+import time
+
+from local_http import start_server
+
+DEFAULT_GROUP = "239.255.42.99"
+DEFAULT_GROUP_PORT = 8898
+DEFAULT_HTTP_PORT = 8899
+
+
+class SensorRelay:
+    """中继最新读数，在当前事件循环中运行"""
+
+    HEARTBEAT = 2.0
+    FIELDS = ('percentage', 'lux', 'voltage')
+
+    def __init__(self, device="temt6000", max_age=10, group=DEFAULT_GROUP,
+                 group_port=DEFAULT_GROUP_PORT, http_port=DEFAULT_HTTP_PORT, multicast_ttl=1):
+        self.device = device
+        self.max_age = max_age
+        self.group = group
+        self.group_port = group_port
+        self.http_port = http_port
+        self.multicast_ttl = multicast_ttl
+        self.readings = {}
+        self.updated = None  # 最新读数的 monotonic 时刻
+        self.timestamp = None  # 最新读数的 Unix 时间
+        self.seq = 0
+        # 每次启动随机生成，客户端据此判断中继重启、重新开始计序号
+        self.boot = random.getrandbits(32)
+        self.sent = 0
+        self.requests = 0
+        self.server = None
+        self.transport = None
+        self.heartbeat_task = None
+
+    async def start(self, host="0.0.0.0"):
+        """启动 HTTP 接口、组播发送和心跳任务"""
+        loop = asyncio.get_running_loop()
+        self.server = await start_server(self.respond, host, self.http_port)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        try:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self.multicast_ttl)
+            # 中继所在机器上的客户端也能收到
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+            self.transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, sock=sock)
+        except OSError:
+            sock.close()
+            await self.close()
+            raise
+        self.heartbeat_task = loop.create_task(self._heartbeat())
+
+    async def close(self):
+        """停止中继"""
+        task, self.heartbeat_task = self.heartbeat_task, None
+        if task:
+            task.cancel()
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+        server, self.server = self.server, None
+        if server:
+            server.close()
+            await server.wait_closed()
+
+    def publish(self, percentage, lux=None, voltage=None):
+        """更新最新读数并立即组播"""
+        self.readings = {'percentage': percentage, 'lux': lux, 'voltage': voltage}
+        self.updated = time.monotonic()
+        self.timestamp = time.time()
+        self.seq += 1
+        self.send()
+
+    def age(self):
+        """最新读数的年龄（秒），没有读数时为 None"""
+        return None if self.updated is None else time.monotonic() - self.updated
+
+    def fresh(self):
+        age = self.age()
+        return age is not None and age <= self.max_age
+
+    def packet(self):
+        """当前读数的组播 / HTTP 内容"""
+        data = {'device': self.device}
+        data.update((field, value) for field, value in self.readings.items() if value is not None)
+        data.update(seq=self.seq, boot=self.boot, ts=round(self.timestamp, 3), age=round(self.age(), 3),
+                    http_port=self.http_port)
+        return data
+
+    def send(self):
+        """组播最新读数，读数过期时不发送"""
+        if self.transport is None or not self.fresh():
+            return
+        payload = json.dumps(self.packet(), separators=(',', ':')).encode('utf-8')
+        try:
+            self.transport.sendto(payload, (self.group, self.group_port))
+            self.sent += 1
+        except OSError:
+            pass
+
+    async def _heartbeat(self):
+        """空闲时重发最新读数，客户端据此确认中继在线并发现它"""
+        while True:
+            await asyncio.sleep(self.HEARTBEAT)
+            self.send()
+
+    def response(self, path):
+        """按请求路径返回 (状态, 内容)"""
+        path = path.split('?')[0].rstrip('/')
+        if path == '/relay':
+            if not self.fresh():
+                return "503 Service Unavailable", {'error': "stale", 'age': self.age()}
+            return "200 OK", self.packet()
+        prefix = f"/sensor/{self.device}_"
+        field = path[len(prefix):] if path.startswith(prefix) else None
+        if field not in self.FIELDS:
+            return "404 Not Found", {'error': "not found"}
+        value = self.readings.get(field)
+        if value is None or not self.fresh():
+            return "503 Service Unavailable", {'error': "stale", 'age': self.age()}
+        return "200 OK", {'id': f"sensor-{self.device}_{field}", 'value': value,
+                          'state': f"{value:g}", 'ts': round(self.timestamp, 3),
+                          'age': round(self.age(), 3)}
+
+    def respond(self, method, path):
+        """HTTP 请求：GET 按路径返回 JSON"""
+        if method == 'GET':
+            self.requests += 1
+            status, data = self.response(path)
+        else:
+            status, data = "405 Method Not Allowed", {'error': "method not allowed"}
+        return status, "application/json", json.dumps(data, ensure_ascii=False).encode('utf-8')
@@ -0,0 +1,309 @@
+"""传感器 HTTP 客户端
+
+autolight.py 与 autolight_tray.py 共用：
+- 复用 keep-alive 连接池，避免每次轮询重新握手
+- 缓存 .local 主机名的解析结果（带 TTL），避免每次都走 mDNS
+- 请求失败时自动重新解析并重建连接
+- 记录解析 / 连接 / 请求各阶段耗时
+- 支持 ESPHome web_server 的 /events 事件流（SSE）
+- requests 在第一次请求时才导入，不拖慢程序启动
+"""
+import ipaddress
+import socket
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+# 当前线程中新建 TCP 连接的累计耗时（连接池复用时为 0）
+_timing = threading.local()
+
+_adapter_class = None
+
+
+def _timed_adapter_class():
+    """导入 requests 并定义使用计时连接的 HTTP 适配器（只在第一次调用时执行）"""
+    global _adapter_class
+    if _adapter_class is not None:
+        return _adapter_class
+
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection
+    from urllib3.connectionpool import HTTPConnectionPool
+
+    class _TimedHTTPConnection(HTTPConnection):
+        """记录 TCP 建连耗时的连接"""
+
+        def connect(self):
+            start = time.perf_counter()
+            try:
+                super().connect()
+            finally:
+                _timing.connect = getattr(_timing, 'connect', 0.0) + time.perf_counter() - start
+
+    class _TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = _TimedHTTPConnection
+
+    class _TimedAdapter(HTTPAdapter):
+        """使用计时连接的 HTTP 适配器"""
+
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                **self.poolmanager.pool_classes_by_scheme,
+                'http': _TimedHTTPConnectionPool,
+            }
+
+    _adapter_class = _TimedAdapter
+    return _adapter_class
+
+
+def _network_errors():
+    """需要重新解析并重连的异常类型"""
+    import requests
+    return (requests.ConnectionError, requests.Timeout, socket.gaierror)
+
+
+class SensorClient:
+    """带连接池和解析缓存的传感器客户端"""
+
+    def __init__(self, dns_ttl=300, timeout=3, pool_size=4):
+        self.dns_ttl = dns_ttl
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._dns_cache = {}  # (host, port) -> (ip, 过期时间)
+        # 第一次请求时才创建会话
+        self.session = None
+        # 最近一次请求各阶段耗时（秒）
+        self.last_timing = {'resolve': 0.0, 'connect': 0.0, 'request': 0.0, 'parse': 0.0}
+
+    def _new_session(self):
+        """创建带连接池的会话"""
+        import requests
+        session = requests.Session()
+        adapter = _timed_adapter_class()(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount('http://', adapter)
+        return session
+
+    def _get_session(self):
+        """返回当前会话，尚未创建时创建"""
+        with self._lock:
+            if self.session is None:
+                self.session = self._new_session()
+            return self.session
+
+    def resolve(self, host, port):
+        """解析主机名，命中缓存时不发起 mDNS 查询"""
+        try:
+            ipaddress.ip_address(host)
+            return host
+        except ValueError:
+            pass
+
+        key = (host, port)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._dns_cache.get(key)
+            if cached and cached[1] > now:
+                return cached[0]
+
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        # 优先使用 IPv4，ESP32 的 mDNS 通常只应答 A 记录
+        infos.sort(key=lambda info: info[0] != socket.AF_INET)
+        ip = infos[0][4][0]
+        with self._lock:
+            self._dns_cache[key] = (ip, now + self.dns_ttl)
+        return ip
+
+    def invalidate(self, host=None, port=None):
+        """清除解析缓存并关闭连接
+
+        指定 host（和 port）时只清除该主机的解析结果和连接池，同一会话中其他主机的
+        keep-alive 连接和进行中的请求不受影响；不指定时重建整个会话。
+        """
+        if host is None:
+            with self._lock:
+                self._dns_cache.clear()
+                old_session, self.session = self.session, None
+            if old_session is not None:
+                old_session.close()
+            return
+
+        targets = {(host, port)}
+        with self._lock:
+            for key in [k for k in self._dns_cache if k[0] == host and port in (None, k[1])]:
+                ip, _ = self._dns_cache.pop(key)
+                targets.add((ip, key[1]))
+            session = self.session
+        if session is not None:
+            self._close_pools(session, targets)
+
+    @staticmethod
+    def _close_pools(session, targets):
+        """关闭指向 targets 中 (地址, 端口) 的连接池，端口为 None 时匹配所有端口"""
+        for adapter in session.adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                if any(key.key_host == host and port in (None, key.key_port) for host, port in targets):
+                    try:
+                        # 移出时关闭该连接池的连接
+                        del pools[key]
+                    except KeyError:
+                        pass
+
+    def _request(self, url, stream=False, timeout=None):
+        """按缓存的地址发起一次请求"""
+        parts = urlsplit(url)
+        host = parts.hostname
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        headers = {}
+
+        start = time.perf_counter()
+        if parts.scheme == 'http' and host:
+            ip = self.resolve(host, port)
+            netloc = f"[{ip}]" if ':' in ip else ip
+            if parts.port:
+                netloc += f":{parts.port}"
+            url = urlunsplit((parts.scheme, netloc, parts.path, parts.query, parts.fragment))
+            # 保留原始主机名，供 ESPHome 的 web_server 识别
+            headers['Host'] = parts.netloc
+        resolve_time = time.perf_counter() - start
+
+        _timing.connect = 0.0
+        start = time.perf_counter()
+        response = self._get_session().get(url, headers=headers, stream=stream,
+                                           timeout=timeout or self.timeout)
+        total = time.perf_counter() - start
+        connect_time = _timing.connect
+
+        self.last_timing = {
+            'resolve': resolve_time,
+            'connect': connect_time,
+            'request': total - connect_time,
+            'parse': 0.0,
+        }
+        return response
+
+    def _invalidate_url(self, url):
+        parts = urlsplit(url)
+        self.invalidate(parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+
+    def get(self, url, timeout=None):
+        """GET 请求，网络错误时重新解析并重连
+
+        使用默认超时时重试一次；调用方指定了自己的超时（如多传感器融合）时不重试，
+        离线的传感器不会占用工作线程超过一个超时。
+        """
+        try:
+            response = self._request(url, timeout=timeout)
+        except _network_errors():
+            self._invalidate_url(url)
+            if timeout is not None:
+                raise
+            response = self._request(url)
+        response.raise_for_status()
+        return response
+
+    def open_stream(self, url, read_timeout=30):
+        """打开长连接流式响应，read_timeout 秒无数据视为断开"""
+        try:
+            response = self._request(url, stream=True, timeout=(self.timeout, read_timeout))
+        except _network_errors():
+            self._invalidate_url(url)
+            raise
+        response.raise_for_status()
+        return response
+
+    def get_json(self, url, timeout=None):
+        """GET 并解析 JSON"""
+        response = self.get(url, timeout=timeout)
+        start = time.perf_counter()
+        data = response.json()
+        self.last_timing['parse'] = time.perf_counter() - start
+        return data
+
+    def format_timing(self):
+        """格式化最近一次请求的耗时"""
+        t = self.last_timing
+        return (f"解析 {t['resolve'] * 1000:.0f}ms / 连接 {t['connect'] * 1000:.0f}ms"
+                f" / 请求 {t['request'] * 1000:.0f}ms")
+
+    def close(self):
+        """关闭所有连接"""
+        if self.session is not None:
+            self.session.close()
+
+
+class SseParser:
+    """增量解析 Server-Sent Events 数据流"""
+
+    def __init__(self):
+        self._buffer = b''
+        self._event = ''
+        self._data = []
+        self.retry = None
+
+    def feed(self, chunk):
+        """输入任意长度的字节块，返回解析出的 (event, data) 列表"""
+        self._buffer += chunk
+        events = []
+        while True:
+            end = self._find_line_end()
+            if end is None:
+                break
+            line, sep_len = self._buffer[:end], 1
+            if self._buffer[end:end + 2] == b'\r\n':
+                sep_len = 2
+            self._buffer = self._buffer[end + sep_len:]
+            event = self._process_line(line.decode('utf-8', errors='replace'))
+            if event:
+                events.append(event)
+        return events
+
+    def _find_line_end(self):
+        """查找行结束位置，CR 位于末尾时等待下一块以区分 CRLF"""
+        for i, byte in enumerate(self._buffer):
+            if byte == 0x0A:
+                return i
+            if byte == 0x0D:
+                if i + 1 == len(self._buffer):
+                    return None
+                return i
+        return None
+
+    def _process_line(self, line):
+        """处理一行，遇到空行时派发事件"""
+        if not line:
+            if not self._data:
+                self._event = ''
+                return None
+            event = (self._event or 'message', '\n'.join(self._data))
+            self._event, self._data = '', []
+            return event
+        if line.startswith(':'):
+            return None
+
+        field, _, value = line.partition(':')
+        if value.startswith(' '):
+            value = value[1:]
+        if field == 'event':
+            self._event = value
+        elif field == 'data':
+            self._data.append(value)
+        elif field == 'retry' and value.isdigit():
+            self.retry = int(value) / 1000
+        return None
+
+
+def iter_stream_chunks(response, chunk_size=4096):
+    """逐块读取流式响应，收到多少数据就返回多少"""
+    raw = response.raw
+    if hasattr(raw, 'read1'):
+        while True:
+            chunk = raw.read1(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        # urllib3 1.x 没有 read1，只能逐字节读取
+        yield from response.iter_content(chunk_size=1)
@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+# 程序模块都在仓库根目录
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+class FakeClock:
+    """手动推进的时钟"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
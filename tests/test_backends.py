@@ -0,0 +1,83 @@
+import asyncio
+import subprocess
+
+import pytest
+
+import autolight_tray
+from autolight_tray import SysfsBacklightBackend, TwinkleTrayBackend
+
+
+@pytest.fixture
+def backlight(tmp_path):
+    """两个背光设备：intel_backlight 带 actual_brightness，acpi_video0 只有 brightness"""
+    for name, maximum in (('intel_backlight', 19200), ('acpi_video0', 15)):
+        device = tmp_path / name
+        device.mkdir()
+        (device / "max_brightness").write_text(f"{maximum}\n")
+        (device / "brightness").write_text("0\n")
+    (tmp_path / "intel_backlight" / "actual_brightness").write_text("9600\n")
+    # 没有 brightness 文件的目录不是可控制的设备
+    (tmp_path / "not_a_device").mkdir()
+    return tmp_path
+
+
+def test_sysfs_lists_devices(backlight, tmp_path):
+    assert SysfsBacklightBackend(backlight).list_displays() == ['acpi_video0', 'intel_backlight']
+    assert SysfsBacklightBackend(tmp_path / "missing").list_displays() == []
+
+
+def test_sysfs_apply_scales_to_max_brightness(backlight):
+    backend = SysfsBacklightBackend(backlight)
+    backend.apply(50)
+    assert (backlight / "intel_backlight" / "brightness").read_text() == "9600"
+    assert (backlight / "acpi_video0" / "brightness").read_text() == "8"
+
+    asyncio.run(backend.apply_async(100, 'acpi_video0'))
+    assert (backlight / "acpi_video0" / "brightness").read_text() == "15"
+    assert (backlight / "intel_backlight" / "brightness").read_text() == "9600"
+
+
+def test_sysfs_read_prefers_actual_brightness(backlight):
+    backend = SysfsBacklightBackend(backlight)
+    backend.apply(20, 'intel_backlight')
+    # actual_brightness 仍为硬件报告的 50%
+    assert backend.read('intel_backlight') == 50
+    backend.apply(20, 'acpi_video0')
+    assert backend.read('acpi_video0') == 20
+    assert backend.read() == 20
+
+
+def test_sysfs_without_devices(tmp_path):
+    backend = SysfsBacklightBackend(tmp_path)
+    assert backend.read() is None
+    with pytest.raises(FileNotFoundError):
+        backend.apply(50)
+
+
+TWINKLE_LIST = '''MonitorNum: 1
+MonitorID: "\\\\?\\DISPLAY#DEL4321#5&1a2b3c&0&UID4353"
+Name: "DELL U2720Q"
+Brightness: 35
+
+MonitorNum: 2
+MonitorID: "\\\\?\\DISPLAY#GSM5B7F#5&1a2b3c&0&UID4354"
+Name: "LG HDR 4K"
+Brightness: 70
+'''
+
+
+def test_twinkle_tray_reads_by_number_or_id(monkeypatch):
+    def run(args, **kwargs):
+        assert args == ["tt.exe", "--List"]
+        return subprocess.CompletedProcess(args, 0, stdout=TWINKLE_LIST, stderr='')
+
+    monkeypatch.setattr(autolight_tray.subprocess, 'run', run)
+    backend = TwinkleTrayBackend("tt.exe")
+    monitor_id = "\\\\?\\DISPLAY#GSM5B7F#5&1a2b3c&0&UID4354"
+    assert backend.list_displays() == ['1', '2']
+    assert backend.read() == 35
+    assert backend.read('2') == 70
+    assert backend.read(monitor_id) == 70
+    assert backend.read('UNKNOWN') is None
+    assert backend._set_args(50, monitor_id) == ["tt.exe", f"--MonitorID={monitor_id}", "--Set=50"]
+    assert backend._set_args(50, '2') == ["tt.exe", "--MonitorNum=2", "--Set=50"]
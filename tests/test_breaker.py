@@ -0,0 +1,58 @@
+import pytest
+
+from autolight_tray import SensorBreaker
+from conftest import FakeClock
+
+
+def make_breaker(clock, **config):
+    config = {'breaker_failures': 3, 'breaker_backoff_min': 5, 'breaker_backoff_max': 30,
+              'fallback_brightness': 20, 'fallback_ramp': 100, **config}
+    # 抖动固定取上限，退避时长可预期
+    return SensorBreaker(config, clock, rng=lambda: 1.0)
+
+
+def test_breaker_opens_after_consecutive_failures():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    assert not breaker.record_failure()
+    assert not breaker.record_failure()
+    assert breaker.record_failure()
+    assert breaker.state == SensorBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.retry_in() == 5
+
+
+def test_breaker_half_open_probe_doubles_backoff():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.advance(5)
+    assert breaker.allow()
+    assert breaker.state == SensorBreaker.HALF_OPEN
+    # 试探失败立即再次断开，退避加倍直到上限
+    for expected in (10, 20, 30, 30):
+        assert breaker.record_failure()
+        assert breaker.retry_in() == expected
+        clock.advance(expected)
+        assert breaker.allow()
+    assert breaker.record_success()
+    assert breaker.state == SensorBreaker.CLOSED
+    assert not breaker.record_success()
+
+
+def test_breaker_jitter_stays_within_half_delay():
+    clock = FakeClock()
+    breaker = SensorBreaker({'breaker_failures': 1, 'breaker_backoff_min': 8}, clock, rng=lambda: 0.0)
+    breaker.record_failure()
+    assert breaker.retry_in() == 4
+
+
+def test_breaker_fallback_ramps_to_fallback_brightness():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    assert breaker.fallback_level(None) == 20
+    clock.advance(50)
+    assert breaker.fallback_level(80) == pytest.approx(50)
+    clock.advance(500)
+    assert breaker.fallback_level(80) == 20
@@ -0,0 +1,23 @@
+import pytest
+
+from autolight_tray import ResponseCurve
+
+
+def test_gamma_curve():
+    curve = ResponseCurve({'curve_mode': 'gamma', 'curve_gamma': 2.0})
+    assert curve(50) == pytest.approx(25, abs=0.01)
+    assert curve(-5) == 0
+    assert curve(150) == 100
+
+
+def test_log_lux_resolves_dark_end():
+    curve = ResponseCurve({'curve_mode': 'log_lux', 'curve_lux_min': 1, 'curve_lux_max': 10000})
+    assert curve(1.49) == pytest.approx(curve.shape(1.49), abs=0.05)
+    assert curve(0) == 0
+    assert curve(20000) == 100
+
+
+def test_log_lux_table_size_independent_of_range():
+    curve = ResponseCurve({'curve_mode': 'log_lux', 'curve_lux_min': 0.1, 'curve_lux_max': 100000})
+    assert len(curve.table) == ResponseCurve.LUX_ENTRIES
+    assert curve(0.5) < curve(1.0) < curve(1.5)
@@ -0,0 +1,61 @@
+import history
+from history import RECORD, HistoryStore
+
+
+def test_history_rolls_over_and_drops_oldest_segments(tmp_path):
+    # 每个分段 10 条记录，最多保留 3 个分段
+    store = HistoryStore(tmp_path, max_bytes=30 * RECORD.size, segment_bytes=10 * RECORD.size,
+                         ring_capacity=64, heartbeat=60)
+    for i in range(45):
+        assert store.append(1000 + i, i, i, i)
+        if i % 7 == 6:
+            store.flush()
+    store.flush()
+    assert [p.name for p in store.segment_paths()] == [
+        "history-000003.bin", "history-000004.bin", "history-000005.bin"]
+    records = store.read_range(0, 2000)
+    assert [r[0] for r in records] == list(range(1020, 1045))
+    assert records[-1] == (1044, 44.0, 44, 44)
+    store.close()
+
+    # 重新打开时接着最后一个分段写
+    store = HistoryStore(tmp_path, max_bytes=30 * RECORD.size, segment_bytes=10 * RECORD.size)
+    assert not store.append(1044, 44, 44, 44)
+    assert store.append(1045, 45, 45, 45)
+    assert store.read_range(1044, 1045) == [(1044, 44.0, 44, 44), (1045, 45.0, 45, 45)]
+    store.close()
+
+
+def test_history_skips_unchanged_readings_until_heartbeat(tmp_path):
+    store = HistoryStore(tmp_path, heartbeat=60)
+    assert store.append(100, 30, 40, None)
+    assert not store.append(130, 30, 40, None)
+    assert store.append(160, 30, 40, None)
+    assert store.append(161, 31, 40, None)
+    # 未写盘的记录也能读到
+    assert store.read_range(0, 200) == [(100, 30.0, 40, None), (160, 30.0, 40, None), (161, 31.0, 40, None)]
+    assert store.flush_due() is False
+    store.close()
+    # 关闭后工作线程中迟到的写盘不会访问已关闭的映射
+    store.flush()
+
+
+def test_history_reads_full_segments_without_holding_the_lock(tmp_path, monkeypatch):
+    store = HistoryStore(tmp_path, max_bytes=30 * RECORD.size, segment_bytes=10 * RECORD.size)
+    for i in range(25):
+        store.append(1000 + i, i, i, i)
+    store.flush()
+
+    opened = []
+    original = history._Segment.__init__
+
+    def segment_init(self, path, records, writable):
+        if not writable:
+            # 在锁内打开文件会阻塞事件循环中的 append
+            opened.append(store.lock.locked())
+        original(self, path, records, writable)
+
+    monkeypatch.setattr(history._Segment, '__init__', segment_init)
+    assert [r[0] for r in store.read_range(0, 2000)] == list(range(1000, 1025))
+    assert opened == [False, False]
+    store.close()
@@ -0,0 +1,45 @@
+import asyncio
+
+from metrics import Metrics, serve_metrics
+from relay import SensorRelay
+
+
+async def request(port, raw):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(raw)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return head.split(b"\r\n")[0].decode(), body
+
+
+def test_metrics_and_relay_share_request_handling():
+    async def scenario():
+        metrics = Metrics()
+        metrics.counter('sensor_errors', "传感器读取失败次数")
+        metrics.inc('sensor_errors')
+        metrics_server = await serve_metrics(metrics, 0)
+        relay = SensorRelay(http_port=0, group_port=0)
+        await relay.start("127.0.0.1")
+        relay.publish(42.0)
+        metrics_port = metrics_server.sockets[0].getsockname()[1]
+        relay_port = relay.server.sockets[0].getsockname()[1]
+        try:
+            return [
+                await request(metrics_port, b"GET /metrics?x=1 HTTP/1.1\r\nHost: a\r\n\r\n"),
+                await request(metrics_port, b"GET /other HTTP/1.1\r\n\r\n"),
+                await request(relay_port, b"GET /sensor/temt6000_percentage HTTP/1.1\r\n\r\n"),
+                await request(relay_port, b"POST /relay HTTP/1.1\r\n\r\n"),
+                await request(relay_port, b"\r\n\r\n"),
+            ]
+        finally:
+            metrics_server.close()
+            await metrics_server.wait_closed()
+            await relay.close()
+
+    (ok, body), (missing, _), (relay_ok, relay_body), (post, _), (empty, _) = asyncio.run(scenario())
+    assert ok == "HTTP/1.1 200 OK" and b"autolight_sensor_errors_total 1" in body
+    assert missing == "HTTP/1.1 404 Not Found"
+    assert relay_ok == "HTTP/1.1 200 OK" and b'"value": 42.0' in relay_body
+    assert post == empty == "HTTP/1.1 405 Method Not Allowed"
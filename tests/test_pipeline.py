@@ -0,0 +1,69 @@
+from autolight_tray import (DEFAULT_CONFIG, EmaFilter, HysteresisFilter, MedianFilter, MinIntervalGate,
+                            SignalPipeline)
+from conftest import FakeClock
+
+
+def test_hysteresis_follows_outside_band():
+    hysteresis = HysteresisFilter(band=5, settle_time=0)
+    assert hysteresis.process(50, 0) == 50
+    assert hysteresis.process(54, 1) is None
+    assert hysteresis.process(56, 2) == 56
+    assert hysteresis.process(None, 3) is None
+    assert hysteresis.held == 1
+
+
+def test_hysteresis_settles_on_slow_drift():
+    hysteresis = HysteresisFilter(band=10, settle_time=30)
+    hysteresis.process(50, 0)
+    # 偏离超过半个带宽但未超出带宽，持续 settle_time 后才跟随
+    assert hysteresis.process(56, 10) is None
+    assert hysteresis.process(57, 39) is None
+    assert hysteresis.process(57, 40) == 57
+    # 回到半个带宽以内时重新计时
+    assert hysteresis.process(63, 50) is None
+    assert hysteresis.process(58, 60) is None
+    assert hysteresis.process(63, 85) is None
+    assert hysteresis.process(63, 115) == 63
+
+
+def test_min_interval_gate_keeps_latest_value():
+    gate = MinIntervalGate(5)
+    assert gate.process(10, 0) == 10
+    assert gate.process(20, 1) is None
+    assert gate.process(30, 2) is None
+    assert gate.deferred == 1
+    # 没有新读数时，到期后送出最新的待定值
+    assert gate.process(None, 5) == 30
+    assert gate.process(None, 6) is None
+
+
+def test_pipeline_with_fake_clock():
+    clock = FakeClock()
+    config = {**DEFAULT_CONFIG, 'threshold': 5, 'filter_median_window': 3, 'filter_ema_alpha': 1,
+              'filter_settle_time': 0, 'min_change_interval': 5}
+    pipeline = SignalPipeline(config, clock)
+    assert [type(stage) for stage in pipeline.stages] == [MedianFilter, HysteresisFilter, MinIntervalGate]
+
+    outputs = []
+    for value in (50, 50, 90, 50, 70, 70, 70):
+        outputs.append(pipeline.process(value))
+        clock.advance(1)
+    # 单个尖峰 90 被中值滤除；70 的阶跃在第 4 秒通过迟滞，等到距上次调节满 5 秒才送出
+    assert outputs == [50, None, None, None, None, 70, None]
+    assert pipeline.stage(MedianFilter).rejected == 1
+    assert pipeline.stage(MinIntervalGate).deferred == 0
+    assert pipeline.summary().startswith("采样 7 / 调节 2")
+
+
+def test_pipeline_configure_keeps_state():
+    clock = FakeClock()
+    config = {**DEFAULT_CONFIG, 'threshold': 5, 'filter_median_window': 1, 'filter_ema_alpha': 0.5,
+              'min_change_interval': 0}
+    pipeline = SignalPipeline(config, clock)
+    assert pipeline.process(40) == 40
+    ema = pipeline.stage(EmaFilter)
+    pipeline.configure({**config, 'threshold': 10, 'filter_ema_alpha': 0.25})
+    assert pipeline.stage(EmaFilter) is ema and ema.alpha == 0.25
+    assert pipeline.stage(HysteresisFilter).output == 40
+    assert pipeline.process(60) is None
+    assert ema.value == 45
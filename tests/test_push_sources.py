@@ -0,0 +1,85 @@
+import json
+
+from autolight_tray import RelaySubscriber, UdpSensorListener
+
+
+def packet(value, seq=None, **fields):
+    data = {'device': 'temt6000', 'percentage': value, **fields}
+    if seq is not None:
+        data['seq'] = seq
+    return json.dumps(data).encode()
+
+
+def test_parse_packet_drops_duplicate_and_reordered_seq():
+    listener = UdpSensorListener(0)
+    assert listener.parse_packet(packet(10, 1, lux=120.5), 'a') == 10
+    assert listener.readings['temt6000_lux'] == 120.5
+    # 重复与乱序的包
+    assert listener.parse_packet(packet(10, 1), 'a') is None
+    assert listener.parse_packet(packet(20, 3), 'a') == 20
+    assert listener.parse_packet(packet(15, 2), 'a') is None
+    assert listener.dropped == 2
+    # 序号按来源分别记录
+    assert listener.parse_packet(packet(30, 1), 'b') == 30
+
+
+def test_parse_packet_seq_reset_after_sensor_reboot():
+    listener = UdpSensorListener(0)
+    assert listener.parse_packet(packet(10, 5000), 'a') == 10
+    assert listener.parse_packet(packet(11, 1), 'a') == 11
+    assert listener.parse_packet(packet(12, 2), 'a') == 12
+
+
+def test_parse_packet_seq_restart_after_silence():
+    listener = UdpSensorListener(0)
+    assert listener.parse_packet(packet(10, 300), 'a', now=100.0) == 10
+    # 开机几分钟内重启：序号只回退了几百，但之后隔了几秒才有新包
+    assert listener.parse_packet(packet(11, 0), 'a', now=105.0) == 11
+    assert listener.parse_packet(packet(12, 1), 'a', now=106.0) == 12
+    assert listener.parse_packet(packet(9, 0), 'a', now=106.1) is None
+
+
+def test_datagram_only_accepted_packets_keep_source_fresh():
+    listener = UdpSensorListener(0)
+    published = []
+    listener.publish = lambda value, source: published.append(value)
+    listener.touch = lambda: published.append('touch')
+    listener.datagram_received(b'not json', ('10.0.0.5', 8888))
+    listener.datagram_received(json.dumps({'device': 'bh1750', 'percentage': 5}).encode(), ('10.0.0.5', 8888))
+    listener.datagram_received(packet(10, 1), ('10.0.0.5', 8888))
+    listener.datagram_received(packet(10, 1), ('10.0.0.5', 8888))
+    assert published == [10]
+
+
+def test_parse_packet_without_seq_drops_identical_payloads():
+    listener = UdpSensorListener(0)
+    assert listener.parse_packet(packet(10), 'a') == 10
+    assert listener.parse_packet(packet(10), 'a') is None
+    assert listener.parse_packet(packet(11), 'a') == 11
+
+
+def test_parse_packet_rejects_malformed_and_other_devices():
+    listener = UdpSensorListener(0)
+    assert listener.parse_packet(b'not json', 'a') is None
+    assert listener.parse_packet(json.dumps({'device': 'temt6000'}).encode(), 'a') is None
+    assert listener.dropped == 2
+    assert listener.parse_packet(json.dumps({'device': 'bh1750', 'percentage': 5}).encode(), 'a') is None
+
+
+def test_relay_subscriber_skips_heartbeats_and_stale_readings():
+    subscriber = RelaySubscriber('239.255.77.77', 0, max_age=10)
+    assert subscriber.parse_packet(packet(40, 1, age=0.1, http_port=8899), '10.0.0.2') == 40
+    assert subscriber.relay_url == "http://10.0.0.2:8899"
+    # 心跳重发同一序号
+    assert subscriber.parse_packet(packet(40, 1, age=2.1), '10.0.0.2') is None
+    assert subscriber.parse_packet(packet(41, 2, age=30), '10.0.0.2') is None
+    assert subscriber.stale == 1
+
+
+def test_relay_subscriber_resets_seq_when_relay_restarts():
+    subscriber = RelaySubscriber('239.255.77.77', 0, max_age=10)
+    assert subscriber.parse_packet(packet(40, 500, age=0.1, boot=1), '10.0.0.2', now=10.0) == 40
+    # 中继重启后立即恢复发送，序号从 1 开始
+    assert subscriber.parse_packet(packet(45, 1, age=0.1, boot=2), '10.0.0.2', now=10.2) == 45
+    assert subscriber.parse_packet(packet(46, 2, age=0.1, boot=2), '10.0.0.2', now=10.4) == 46
+    assert subscriber.parse_packet(packet(46, 2, age=1.0, boot=2), '10.0.0.2', now=11.0) is None
@@ -0,0 +1,87 @@
+import asyncio
+import socket
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from autolight_replay import RecordingBackend
+from autolight_tray import DEFAULT_CONFIG, BrightnessController, RelaySubscriber
+from relay import SensorRelay
+
+
+def free_port(kind=socket.SOCK_STREAM):
+    with socket.socket(socket.AF_INET, kind) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class SteadyController(BrightnessController):
+    """光线不变的传感器"""
+
+    async def read_sensor(self):
+        self.current_sensor_value = 40.0
+        return 40.0
+
+
+def relay_status(port):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/relay", timeout=2) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+@pytest.mark.parametrize('enabled', [True, False])
+def test_relay_stays_fresh_on_steady_light(enabled):
+    port = free_port()
+    config = {**DEFAULT_CONFIG, 'enabled': enabled, 'history_enabled': False, 'metrics_enabled': False,
+              'relay_enabled': True, 'relay_port': port, 'relay_group_port': free_port(socket.SOCK_DGRAM),
+              'relay_max_age': 0.6, 'interval': 5, 'interval_min': 0.1, 'interval_max': 30,
+              'interval_backoff': 4}
+    controller = SteadyController(config)
+    controller.backend = RecordingBackend(time.monotonic)
+    controller.start()
+    try:
+        time.sleep(0.3)
+        # 自适应轮询在稳定读数下会退避到 30 秒，远超 relay_max_age
+        statuses = []
+        for _ in range(10):
+            statuses.append(relay_status(port))
+            time.sleep(0.25)
+    finally:
+        controller.stop()
+    assert statuses == [200] * len(statuses)
+
+
+def test_relay_packet_carries_boot_id():
+    first, second = SensorRelay(), SensorRelay()
+    first.publish(40.0)
+    assert first.packet()['boot'] == first.boot != second.boot
+
+
+def test_multicast_fallback_reads_relay_http():
+    port = free_port()
+
+    async def scenario():
+        relay = SensorRelay(http_port=port, group_port=free_port(socket.SOCK_DGRAM))
+        await relay.start("127.0.0.1")
+        relay.publish(42.0)
+        controller = BrightnessController({**DEFAULT_CONFIG, 'sensor_source': 'relay', 'history_enabled': False,
+                                           'sensor_url': "http://192.0.2.1/sensor/temt6000_percentage"})
+        controller.loop = asyncio.get_running_loop()
+        controller.push_source = RelaySubscriber('239.255.77.77', 0)
+        controller.push_source.relay_url = f"http://127.0.0.1:{port}"
+        try:
+            # 组播中断时读取中继的 HTTP 接口，而不是 sensor_url 中的 ESP32
+            controller.push_fallback = True
+            assert controller.sensor_url() == f"http://127.0.0.1:{port}/sensor/temt6000_percentage"
+            assert await controller.read_sensor() == 42.0
+            controller.push_fallback = False
+            assert controller.sensor_url() == controller.config['sensor_url']
+        finally:
+            await relay.close()
+            controller.io_executor.shutdown(wait=False)
+
+    asyncio.run(scenario())
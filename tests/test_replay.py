@@ -0,0 +1,29 @@
+from autolight_replay import Trace, replay
+
+
+def test_synthetic_day_is_deterministic():
+    assert Trace.synthetic_day(step=60, seed=3).values == Trace.synthetic_day(step=60, seed=3).values
+    assert Trace.synthetic_day(step=60, seed=3).values != Trace.synthetic_day(step=60, seed=4).values
+
+
+def test_replay_is_deterministic():
+    # 上午 6 小时的每秒读数，覆盖日出和云层变化
+    trace = Trace.synthetic_day(seed=1)
+    config = {'interval': 1, 'adaptive_interval': False}
+    first, stats = replay(config, trace, start=6 * 3600, end=12 * 3600)
+    second, _ = replay(config, trace, start=6 * 3600, end=12 * 3600)
+    assert first == second
+    assert stats['commands'] == len(first) > 0
+    assert stats['simulated_seconds'] == 6 * 3600
+    assert all(0 <= level <= 100 for _, _, level in first)
+    assert [t for t, _, _ in first] == sorted(t for t, _, _ in first)
+
+
+def test_replay_handles_sensor_gaps():
+    trace = Trace([(0, 50), (60, None), (600, 80)])
+    commands, stats = replay({'interval': 1, 'breaker_failures': 3}, trace, end=900)
+    assert stats['sensor_errors'] > 0
+    assert commands[0] == (0, None, 50)
+    # 断路期间没有新读数，恢复后跟上新的环境亮度
+    assert all(t > 600 for t, _, _ in commands[1:])
+    assert commands[-1][2] == stats['final_level'] >= 75
@@ -0,0 +1,75 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from sensor_client import SensorClient
+
+
+class SensorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = json.dumps({'value': 42.0}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def sensor_url():
+    servers = []
+
+    def start():
+        server = ThreadingHTTPServer(("127.0.0.1", 0), SensorHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}/sensor/temt6000_percentage"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_invalidate_host_keeps_other_connections(sensor_url):
+    healthy, other = sensor_url(), sensor_url()
+    client = SensorClient()
+    assert client.get_json(healthy)['value'] == 42.0
+    assert client.get_json(other)['value'] == 42.0
+
+    port = int(other.split(':')[2].split('/')[0])
+    client.invalidate('127.0.0.1', port)
+
+    # 健康传感器的 keep-alive 连接仍可复用，不需要重新建连
+    client.get_json(healthy)
+    assert client.last_timing['connect'] == 0.0
+    client.get_json(other)
+    assert client.last_timing['connect'] > 0.0
+    client.close()
+
+
+def test_caller_timeout_skips_retry(monkeypatch):
+    client = SensorClient()
+    calls = []
+
+    def refuse(url, stream=False, timeout=None):
+        calls.append(timeout)
+        raise requests.ConnectionError("refused")
+
+    monkeypatch.setattr(client, '_request', refuse)
+    with pytest.raises(requests.ConnectionError):
+        client.get("http://127.0.0.1:9/sensor", timeout=0.5)
+    assert calls == [0.5]
+
+    calls.clear()
+    with pytest.raises(requests.ConnectionError):
+        client.get("http://127.0.0.1:9/sensor")
+    assert len(calls) == 2
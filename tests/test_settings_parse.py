@@ -0,0 +1,27 @@
+import pytest
+
+from autolight_tray import DEFAULT_CONFIG, MonitorDispatcher, SettingsWindow
+
+
+def test_parse_monitors():
+    monitors = SettingsWindow.parse_monitors("1\n2 -10\n\n3 0 0:10,50:40,100:90\n")
+    assert monitors == [
+        {'id': '1', 'offset': 0},
+        {'id': '2', 'offset': -10.0},
+        {'id': '3', 'offset': 0.0, 'points': [[0.0, 10.0], [50.0, 40.0], [100.0, 90.0]]},
+    ]
+    dispatcher = MonitorDispatcher({**DEFAULT_CONFIG, 'monitors': monitors})
+    assert dispatcher.levels_for(50) == {'1': 50, '2': 40, '3': 40}
+
+
+@pytest.mark.parametrize('text', [
+    "1 0 0:0:1,100:100",
+    "1 0 50",
+    "1 0 0:0",
+    "1 0 0:a,100:100",
+    "1 abc",
+    "1 0 0:0,100:100 extra",
+])
+def test_parse_monitors_rejects_bad_points(text):
+    with pytest.raises(ValueError):
+        SettingsWindow.parse_monitors(text)
@@ -0,0 +1,21 @@
+from sensor_client import SseParser
+
+
+def test_sse_parser_handles_split_chunks():
+    stream = (b'retry: 5000\r\n: keep-alive\r\n\r\n'
+              b'event: state\r\ndata: {"id": "sensor-temt6000_percentage", "value": 42.5}\r\n\r\n'
+              b'data: line one\ndata: line two\n\n')
+    expected = [('state', '{"id": "sensor-temt6000_percentage", "value": 42.5}'),
+                ('message', 'line one\nline two')]
+
+    whole = SseParser()
+    assert whole.feed(stream) == expected
+    assert whole.retry == 5.0
+
+    # 逐字节输入时 CRLF 被拆在两块之间，不能多出空行提前派发
+    parser = SseParser()
+    events = []
+    for i in range(len(stream)):
+        events += parser.feed(stream[i:i + 1])
+    assert events == expected
+    assert parser.retry == 5.0
@@ -0,0 +1,123 @@
+import asyncio
+
+from autolight_replay import RecordingBackend, VirtualClock, VirtualEventLoop
+from autolight_tray import DEFAULT_CONFIG, MonitorDispatcher, TokenBucket, TransitionEngine
+from conftest import FakeClock
+
+
+def run_virtual(coro_func):
+    """在虚拟时间中运行 coro_func(clock)"""
+    clock = VirtualClock()
+    loop = VirtualEventLoop(clock)
+    try:
+        return loop.run_until_complete(coro_func(clock))
+    finally:
+        loop.close()
+
+
+def test_token_bucket_refills_at_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(2, 3, clock)
+    for _ in range(3):
+        assert bucket.delay() == 0
+        bucket.take()
+    assert bucket.delay() == 0.5
+    clock.advance(0.5)
+    assert bucket.delay() == 0
+    # 一次取多个令牌，超过 burst 时按 burst 计
+    clock.advance(10)
+    assert bucket.delay(5) == 0
+    bucket.take(5)
+    assert bucket.delay(2) == 1.0
+
+
+def test_token_bucket_unlimited():
+    bucket = TokenBucket(0, 1, FakeClock())
+    for _ in range(100):
+        assert bucket.delay() == 0
+        bucket.take()
+
+
+def test_retarget_without_budget_pressure_is_not_merged():
+    async def scenario(clock):
+        applied = []
+
+        async def apply(level):
+            applied.append(level)
+            return True
+
+        engine = TransitionEngine(apply, clock)
+        engine.configure({**DEFAULT_CONFIG, 'command_rate': 0})
+        engine.start()
+        engine.applied = 0
+        engine.set_target(80)
+        await asyncio.sleep(0.3)
+        engine.set_target(20)
+        await asyncio.sleep(3)
+        await engine.stop()
+        return engine, applied
+
+    engine, applied = run_virtual(scenario)
+    assert applied[-1] == 20
+    assert engine.commands_merged == 0
+
+
+def test_monitor_commands_respect_budget():
+    monitors = [{'id': str(i)} for i in range(3)]
+    config = {**DEFAULT_CONFIG, 'monitors': monitors, 'command_rate': 5, 'command_burst': 5}
+
+    async def scenario(clock):
+        backend = RecordingBackend(clock)
+        dispatcher = MonitorDispatcher(config)
+
+        async def apply(level):
+            await dispatcher.apply(backend, level)
+            return True
+
+        engine = TransitionEngine(apply, clock)
+        engine.configure(config)
+        engine.command_cost = dispatcher.pending_count
+        engine.start()
+        for target in (10, 90, 30, 70, 50):
+            await engine.apply_now(target)
+        await asyncio.sleep(1)
+        await engine.stop()
+        return backend.commands
+
+    commands = run_virtual(scenario)
+    assert [level for _, _, level in commands[-3:]] == [50, 50, 50]
+    # 任意时刻，已发出的后端命令数不超过 burst + rate × 时间
+    for t, _, _ in commands:
+        sent = sum(1 for when, _, _ in commands if when <= t)
+        assert sent <= 5 + 5 * t + 1e-9
+
+
+def test_failed_final_frame_is_retried():
+    async def scenario(clock):
+        applied = []
+        failures = iter([False, False])
+
+        async def apply(level):
+            # 过渡的最后一帧连续失败两次
+            if level == 80:
+                ok = next(failures, True)
+                if not ok:
+                    return False
+            applied.append((clock(), level))
+            return True
+
+        engine = TransitionEngine(apply, clock)
+        engine.configure({**DEFAULT_CONFIG, 'command_rate': 0})
+        engine.start()
+        engine.applied = 40
+        engine.set_target(80)
+        await asyncio.sleep(10)
+        await engine.stop()
+        return engine, applied
+
+    engine, applied = run_virtual(scenario)
+    assert engine.applied == 80
+    assert not engine.active
+    # 重试间隔 0.5 秒后加倍为 1 秒
+    assert applied[-1][0] < engine.duration + 0.5 + 1 + 0.2
+    assert engine.retry_delay is None